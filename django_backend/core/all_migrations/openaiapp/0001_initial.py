@@ -0,0 +1,64 @@
+# Generated by Django 4.2.6 on 2026-10-17 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=500)),
+                ("text", models.TextField()),
+                ("n_tokens", models.PositiveIntegerField()),
+                ("digest", models.CharField(max_length=64)),
+                ("engine", models.CharField(max_length=100)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("locked_by", models.CharField(blank=True, default="", max_length=100)),
+                ("locked_at", models.DateTimeField(blank=True, null=True)),
+                ("error", models.TextField(blank=True, default="")),
+                ("embedding", models.BinaryField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("modified_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "embedding job",
+                "verbose_name_plural": "Embedding jobs",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "id"], name="openaiapp_e_status_b75fb1_idx"
+                    ),
+                    models.Index(
+                        fields=["engine", "source"],
+                        name="openaiapp_e_engine_d2f59e_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -64,4 +64,5 @@ MIGRATION_MODULES = {
     "users": "core.all_migrations.users",
     "news_feed": "core.all_migrations.news_feed",
     "articles": "core.all_migrations.articles",
+    "openaiapp": "core.all_migrations.openaiapp",
 }
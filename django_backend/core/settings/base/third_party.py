@@ -19,3 +19,23 @@ GRAPHENE = {
 # TODO. Maybe need to obtain differently for dev. and prod. in future.
 # OpenAI API key.
 OPENAI_API_KEY = get_env_value("OPENAI_API_KEY")
+
+# Tokenizer encodings loaded when the OpenAI app starts.
+OPENAI_TOKENIZER_PRELOAD_ENCODINGS = ["cl100k_base"]
+
+# Persistent cache of text embeddings used by the OpenAI app, disabled when the path is None.
+OPENAI_EMBEDDING_CACHE_PATH = os.path.join(
+    BASE_DIR, "sqlite3", "embeddings_cache.sqlite3"
+)
+OPENAI_EMBEDDING_CACHE_MAX_SIZE = 1000000
+
+# Per-process cache of question embeddings: the number of questions and seconds kept.
+OPENAI_QUESTION_CACHE_SIZE = 1024
+OPENAI_QUESTION_CACHE_TTL = 600
+
+# Background embedding jobs: whether article saves queue their chunks, and the engine used.
+OPENAI_EMBEDDING_JOBS_ON_SAVE = True
+OPENAI_EMBEDDING_JOBS_ENGINE = "text-embedding-ada-002"
+
+# On-disk vector database of embedded chunks searched by question answering.
+OPENAI_VECTOR_DB_PATH = os.path.join(BASE_DIR, "sqlite3", "vector_db")
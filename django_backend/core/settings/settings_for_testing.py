@@ -21,6 +21,13 @@ DATABASES = get_multi_databases_config_for_tests()
 # Database routers for which of our DBs to use for what.
 DATABASE_ROUTERS = get_db_routers()
 
+# Tests must not share embeddings through the persistent or question caches.
+OPENAI_EMBEDDING_CACHE_PATH = None
+OPENAI_QUESTION_CACHE_SIZE = 0
+
+# Article saves in tests must not queue embedding jobs.
+OPENAI_EMBEDDING_JOBS_ON_SAVE = False
+
 # Media Files.
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
@@ -81,6 +81,7 @@ def get_db_routers():
     return [
         "core.utils.routers.AuthRouter",
         "core.utils.routers.NewsFeedRouter",
+        "core.utils.routers.OpenAIAppRouter",
         "core.utils.routers.ArticleRouter",
     ]
 
@@ -68,6 +68,16 @@ class NewsFeedRouter(BaseRouter):
     db_alias = NEWS_FEED_DB_ALIAS
 
 
+class OpenAIAppRouter(BaseRouter):
+    """
+    Router for OpenAI-app-related operations.
+    Keeps the embedding job queue next to the news feed data it is crawled for.
+    """
+
+    route_app_labels = {"openaiapp"}
+    db_alias = NEWS_FEED_DB_ALIAS
+
+
 class ArticleRouter(BaseRouter):
     """
     Router for article-related operations with sharding logic.
@@ -1,10 +1,18 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
 import openai
-from openai.embeddings_utils import distances_from_embeddings
 
+from openaiapp.caches import LRUCache
+from openaiapp.embedding_stores import (
+    AbstractEmbeddingStore,
+    AbstractProjection,
+    IVFFlatIndex,
+)
 from openaiapp.embeddings import AbstractEmbeddings
+from openaiapp.retrieval import RetrievalIndex
 from openaiapp.text_preparators import AbstractTextPreparatory
+from openaiapp.vector_db import VectorDBReader
 
 
 class AbstractAIQuestionAnswering(ABC):
@@ -40,9 +48,32 @@ class AIQuestionAnsweringBasedOnContext(AbstractAIQuestionAnswering):
         max_tokens: int,
         context_max_len: int,
         stop_sequence: str,
+        fill_context: bool = False,
+        embedding_store: AbstractEmbeddingStore = None,
+        question_cache: LRUCache = None,
+        projection: AbstractProjection = None,
+        vector_db: VectorDBReader = None,
+        ann_threshold: int = None,
+        ann_n_probe: int = IVFFlatIndex.N_PROBE,
+        retrieval_index: RetrievalIndex = None,
     ):
         """
         Initialize the AIQuestionAnsweringBasedOnContext object.
+
+        With `fill_context` the first text that no longer fits the context is cut
+        on a token boundary to fill the remaining room, instead of being dropped.
+        The texts are searched through `embedding_store`, one row per prepared text;
+        without it an EmbeddingStore is built from the prepared embeddings on first use,
+        reduced to fewer dimensions with `projection` when given.
+        With `vector_db` the texts and embeddings are read from the on-disk vector database
+        instead, kept open between questions and reopened only when a new version is committed.
+        A built store or vector database version of at least `ann_threshold` texts is
+        searched through an approximate IVFFlatIndex probing `ann_n_probe` lists;
+        smaller corpora are searched exactly.
+        Question embeddings are reused from `question_cache`, keyed by the embedding engine
+        and the normalized question.
+        The texts, token counts and store are frozen into `retrieval_index`,
+        loaded on the first question when not given, and only read while answering.
         """
         self.text_embeddings_object = text_embeddings_object
         self.text_preparatory = text_preparatory
@@ -50,25 +81,99 @@ class AIQuestionAnsweringBasedOnContext(AbstractAIQuestionAnswering):
         self.max_tokens = max_tokens
         self._context_max_len = context_max_len
         self.stop_sequence = stop_sequence
+        self.fill_context = fill_context
+        self.embedding_store = embedding_store
+        self.question_cache = question_cache
+        self.projection = projection
+        self.vector_db = vector_db
+        self.ann_threshold = ann_threshold
+        self.ann_n_probe = ann_n_probe
+        self.retrieval_index = retrieval_index
 
     def create_context(self, question: str) -> str:
         """
         Create a context for a question by finding the most similar context from the data frame.
+        The question reads only the retrieval index it starts with and local arrays,
+        so concurrent questions share one object without locks.
         """
-        df_prepared = self.text_preparatory.generate_tokens_amount()
-        q_embeddings = self.text_embeddings_object.create_embeddings(input=question)
-        df_prepared["distances"] = distances_from_embeddings(
-            q_embeddings, df_prepared["embeddings"].values, distance_metric="cosine"
+        index = self.get_retrieval_index()
+        order = index.search(
+            self._embed_question(question),
+            k=index.candidates_needed(self._context_max_len),
         )
+        return self._join_context(order, index)
 
-        context_texts = []
-        current_length = 0
+    def get_retrieval_index(self) -> RetrievalIndex:
+        """
+        Get the retrieval index, loading it on first use. With `vector_db` the index
+        follows the latest committed version of the vector database.
+        A new index replaces the old one in a single assignment, never in place.
+        """
+        index = self.retrieval_index
+        if self.vector_db is None:
+            return index if index is not None else self.load_index()
+
+        reader = (self.vector_db if index is None else index.source).refresh()
+        if index is None or index.source is not reader:
+            index = RetrievalIndex.from_vector_db(
+                reader, ann_threshold=self.ann_threshold, ann_n_probe=self.ann_n_probe
+            )
+            self.retrieval_index = index
+        return index
 
-        for _, row in df_prepared.sort_values("distances", ascending=True).iterrows():
-            current_length += row["n_tokens"]
-            if current_length > self._context_max_len:
-                break
-            context_texts.append(row["text"])
+    def load_index(self) -> RetrievalIndex:
+        """
+        Load the retrieval index from the prepared texts, or the vector database,
+        freezing their token counts and embeddings. Call it again to pick up
+        changed texts; questions already running keep the index they started with.
+        """
+        if self.vector_db is not None:
+            index = RetrievalIndex.from_vector_db(
+                self.vector_db.refresh(),
+                ann_threshold=self.ann_threshold,
+                ann_n_probe=self.ann_n_probe,
+            )
+        else:
+            index = RetrievalIndex.from_prepared(
+                self.text_preparatory.generate_tokens_amount(),
+                embedding_store=self.embedding_store,
+                projection=self.projection,
+                ann_threshold=self.ann_threshold,
+                ann_n_probe=self.ann_n_probe,
+            )
+        self.retrieval_index = index
+        return index
+
+    def _embed_question(self, question: str):
+        """
+        Get the embedding of the question, from the question cache when there is one.
+        """
+        if self.question_cache is None:
+            return self.text_embeddings_object.create_embeddings(input=question)
+        key = (
+            getattr(self.text_embeddings_object, "embedding_engine", None),
+            normalize_question(question),
+        )
+        return self.question_cache.get_or_compute(
+            key, lambda: self.text_embeddings_object.create_embeddings(input=question)
+        )
+
+    def _join_context(self, order: np.ndarray, index: RetrievalIndex) -> str:
+        """
+        Join the most similar texts, in order, while their tokens fit the context max length.
+        The cut-off is found in one pass over the running token total of the candidates.
+        """
+        total = np.cumsum(index.n_tokens[order])
+        fitting = int(np.searchsorted(total, self._context_max_len, side="right"))
+        context_texts = [index.get_text(idx) for idx in order[:fitting]]
+
+        room = self._context_max_len - (int(total[fitting - 1]) if fitting else 0)
+        if self.fill_context and fitting < len(order) and room > 0:
+            context_texts.append(
+                self.text_preparatory.tokenizer.truncate_to_tokens(
+                    index.get_text(order[fitting]), room
+                )
+            )
 
         return "\n\n###\n\n".join(context_texts)
 
@@ -109,3 +214,10 @@ class AIQuestionAnsweringBasedOnContext(AbstractAIQuestionAnswering):
         if length < 0:
             raise ValueError("Context max length must be non-negative.")
         self._context_max_len = length
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question for cache lookups: case folded and whitespace collapsed.
+    """
+    return " ".join(question.casefold().split())
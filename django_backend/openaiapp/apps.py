@@ -1,6 +1,32 @@
+import warnings
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class OpenaiappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "openaiapp"
+
+    def ready(self):
+        # Load the BPE ranks at start-up, so the first request does not pay for it.
+        from openaiapp.tokenizers import TokenizerRegistry
+
+        try:
+            TokenizerRegistry.warm_up(
+                getattr(settings, "OPENAI_TOKENIZER_PRELOAD_ENCODINGS", [])
+            )
+        except ValueError as e:
+            warnings.warn(f"Tokenizer warm-up failed: {e}", RuntimeWarning)
+
+        # Article saves only queue their chunks; the embedding_worker command embeds them.
+        if getattr(settings, "OPENAI_EMBEDDING_JOBS_ON_SAVE", False):
+            from django.db.models.signals import post_delete, post_save
+
+            from openaiapp.signals import (
+                delete_article_embeddings,
+                enqueue_article_embeddings,
+            )
+
+            post_save.connect(enqueue_article_embeddings, sender="articles.Article")
+            post_delete.connect(delete_article_embeddings, sender="articles.Article")
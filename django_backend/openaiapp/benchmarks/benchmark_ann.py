@@ -0,0 +1,59 @@
+"""
+Recall@k and time per search of the IVF-flat index against exact search,
+for a range of probed lists, and the time to build the index.
+
+Run from the django_backend directory:
+    python -m openaiapp.benchmarks.benchmark_ann --rows 100000 --dim 1536 --probes 1 4 8 16 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from openaiapp.embedding_stores import EmbeddingStore, IVFFlatIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    # Clustered embeddings, closer to real text embeddings than uniform noise.
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(256, args.dim))
+    embeddings = centers[rng.integers(0, 256, size=args.rows)]
+    embeddings += rng.normal(scale=0.5, size=embeddings.shape)
+    queries = embeddings[rng.integers(0, args.rows, size=args.queries)]
+    queries = queries + rng.normal(scale=0.3, size=queries.shape)
+
+    store = EmbeddingStore.from_embeddings(embeddings)
+    start = time.perf_counter()
+    expected = [set(store.search(query, k=args.k).tolist()) for query in queries]
+    elapsed = (time.perf_counter() - start) / args.queries
+    print(f"  exact: {elapsed * 1000:7.2f} ms/search")
+
+    start = time.perf_counter()
+    index = IVFFlatIndex.from_store(store, n_lists=args.lists)
+    print(f"  build: {time.perf_counter() - start:7.2f} s, {index.n_lists} lists")
+
+    for n_probe in args.probes:
+        index.n_probe = n_probe
+        start = time.perf_counter()
+        results = [index.search(query, k=args.k).tolist() for query in queries]
+        elapsed = (time.perf_counter() - start) / args.queries
+        hits = sum(
+            len(ids.intersection(found)) for ids, found in zip(expected, results)
+        )
+        print(
+            f"probe {n_probe:3d}: {elapsed * 1000:7.2f} ms/search, "
+            f"recall@{args.k} {hits / (args.k * args.queries):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark of greedy chunk packing: the previous per-sentence loop vs. the
+cumulative-sum packing engine, on documents with thousands of sentences.
+
+Run from the django_backend directory:
+    python -m openaiapp.benchmarks.benchmark_chunkers --sentences 5000 --repeat 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+from openaiapp.chunkers import SentenceChunker
+
+
+def loop_pack(sentences: list, sizes: list, max_tokens: int) -> list:
+    """
+    The previous packing loop of TextPreparatory.split_text_into_chunks.
+    """
+    sentence_token_counts = list(zip(sentences, sizes))
+    chunks, current_chunk, current_chunk_size = [], "", 0
+
+    for idx, (sentence, size) in enumerate(sentence_token_counts):
+        next_size = (
+            sentence_token_counts[idx + 1][1]
+            if idx < len(sentence_token_counts) - 1
+            else -1
+        )
+        current_chunk += (" " + sentence) if current_chunk else sentence
+        current_chunk_size += size
+
+        if next_size == -1 or current_chunk_size + next_size > max_tokens:
+            chunks.append(current_chunk)
+            current_chunk, current_chunk_size = "", 0
+
+    return chunks
+
+
+def cumsum_pack(sentences: list, sizes: list, max_tokens: int) -> list:
+    return [chunk.text for chunk in SentenceChunker._pack(sentences, sizes, max_tokens)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sentences", type=int, default=5000)
+    parser.add_argument("--max-tokens", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(5, 40, size=args.sentences).tolist()
+    sentences = ["word " * (size - 1) + "end." for size in sizes]
+
+    results = {}
+    for name, func in (("loop", loop_pack), ("cumsum", cumsum_pack)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            results[name] = func(sentences, sizes, args.max_tokens)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(
+            f"{name:>7}: {elapsed * 1000:8.3f} ms/document  "
+            f"{args.sentences / elapsed:12.0f} sentences/sec"
+        )
+
+    assert results["loop"] == results["cumsum"], "Chunks differ."
+
+
+if __name__ == "__main__":
+    main()
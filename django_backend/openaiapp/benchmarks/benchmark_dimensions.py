@@ -0,0 +1,54 @@
+"""
+Recall@k lost and memory saved by reducing embeddings to fewer dimensions,
+with PCA fitted on the corpus and with prefix truncation, against full-dimension exact search.
+
+Run from the django_backend directory:
+    python -m openaiapp.benchmarks.benchmark_dimensions --rows 20000 --dim 1536 --dims 64 128 256 512
+or on real embeddings saved as an (n, d) `.npy` matrix, holding out queries from them:
+    python -m openaiapp.benchmarks.benchmark_dimensions --embeddings embeddings.npy
+"""
+import argparse
+
+import numpy as np
+
+from openaiapp.embedding_stores import PROJECTIONS, dimension_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--embeddings", default=None)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256, 512])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.embeddings:
+        embeddings = np.load(args.embeddings)
+    else:
+        # Clustered embeddings, closer to real text embeddings than uniform noise.
+        centers = rng.normal(size=(64, args.dim))
+        embeddings = centers[rng.integers(0, 64, size=args.rows)]
+        embeddings += rng.normal(scale=0.5, size=embeddings.shape)
+
+    # Queries are held out, so PCA is not fitted on them.
+    query_rows, rows = np.split(rng.permutation(len(embeddings)), [args.queries])
+    queries = embeddings[query_rows]
+    embeddings = embeddings[rows]
+
+    for method in PROJECTIONS:
+        for report in dimension_report(
+            embeddings, queries, dims=args.dims, k=args.k, method=method
+        ):
+            print(
+                f"{method:>6} {report.dim:5d}: "
+                f"{report.reduced_nbytes / 2**20:8.1f} MiB "
+                f"({report.memory_saved:.0%} saved), "
+                f"recall@{args.k} {report.recall_at_k:.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
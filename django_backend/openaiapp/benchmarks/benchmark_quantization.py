@@ -0,0 +1,60 @@
+"""
+Memory and recall@k of int8 and float16 embedding storage against the float32 baseline,
+with and without exact rescoring of the best candidates, and the time per search.
+
+Run from the django_backend directory:
+    python -m openaiapp.benchmarks.benchmark_quantization --rows 20000 --dim 1536 --queries 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from openaiapp.embedding_stores import (
+    EmbeddingStore,
+    QuantizedEmbeddingStore,
+    quantization_report,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    # Clustered embeddings, closer to real text embeddings than uniform noise.
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(64, args.dim))
+    embeddings = centers[rng.integers(0, 64, size=args.rows)]
+    embeddings += rng.normal(scale=0.5, size=embeddings.shape)
+    queries = embeddings[rng.integers(0, args.rows, size=args.queries)]
+    queries = queries + rng.normal(scale=0.3, size=queries.shape)
+
+    store = EmbeddingStore.from_embeddings(embeddings)
+    start = time.perf_counter()
+    for query in queries:
+        store.search(query, k=args.k)
+    elapsed = (time.perf_counter() - start) / args.queries
+    print(f"float32: {store.nbytes / 2**20:8.1f} MiB, {elapsed * 1000:7.2f} ms/search")
+
+    for dtype in (QuantizedEmbeddingStore.FLOAT16, QuantizedEmbeddingStore.INT8):
+        quantized = QuantizedEmbeddingStore.from_store(store, dtype=dtype)
+        start = time.perf_counter()
+        for query in queries:
+            quantized.search(query, k=args.k)
+        elapsed = (time.perf_counter() - start) / args.queries
+
+        report = quantization_report(quantized, queries, k=args.k)
+        print(
+            f"{dtype:>7}: {report.quantized_nbytes / 2**20:8.1f} MiB "
+            f"({report.memory_saved:.0%} saved), {elapsed * 1000:7.2f} ms/search, "
+            f"recall@{args.k} {report.recall_at_k:.3f} quantized, "
+            f"{report.rescored_recall_at_k:.3f} rescored"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Time per question of exact similarity search over 10k, 100k and 1M synthetic vectors:
+the per-pair `distances_from_embeddings` of the OpenAI utilities against the blocked
+BLAS kernel of EmbeddingStore, one query at a time and batched.
+
+Run from the django_backend directory:
+    python -m openaiapp.benchmarks.benchmark_similarity --sizes 10000 100000 1000000 --dim 256
+The matrix takes sizes x dim x 4 bytes, 6 GiB for 1M vectors of 1536 dimensions.
+"""
+import argparse
+import time
+
+import numpy as np
+from openai.embeddings_utils import distances_from_embeddings
+
+from openaiapp.embedding_stores import EmbeddingStore
+
+
+def timed(func, repeats: int) -> float:
+    """
+    Get the mean time of a call in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--baseline-max",
+        type=int,
+        default=100000,
+        help="The largest size timed with distances_from_embeddings, which is slow.",
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    for size in args.sizes:
+        # Generated and normalized in place, so no float64 copy of the matrix is made.
+        matrix = rng.standard_normal((size, args.dim), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        store = EmbeddingStore(matrix)
+        query = queries[0]
+
+        print(f"{size} vectors of {args.dim} dimensions:")
+        if size <= args.baseline_max:
+            embeddings = matrix.tolist()
+            elapsed = timed(
+                lambda: distances_from_embeddings(query.tolist(), embeddings), 1
+            )
+            print(f"  distances_from_embeddings: {elapsed:9.2f} ms/question")
+            del embeddings
+        print(
+            f"  blocked similarities:      "
+            f"{timed(lambda: store.similarities(query), args.queries):9.2f} ms/question"
+        )
+        print(
+            f"  search top {args.k}:             "
+            f"{timed(lambda: store.search(query, k=args.k), args.queries):9.2f} ms/question"
+        )
+        elapsed = timed(lambda: store.search_batch(queries, k=args.k), 1)
+        print(
+            f"  batched search top {args.k}:     "
+            f"{elapsed / args.queries:9.2f} ms/question"
+        )
+
+
+if __name__ == "__main__":
+    main()
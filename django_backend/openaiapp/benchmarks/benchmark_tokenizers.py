@@ -0,0 +1,60 @@
+"""
+Benchmark of per-row vs. batch token counting over a DataFrame.
+
+Run from the django_backend directory:
+    python -m openaiapp.benchmarks.benchmark_tokenizers --rows 20000 --threads 8
+"""
+import argparse
+import time
+
+from pandas import DataFrame
+
+from openaiapp.tokenizers import Tokenizer
+
+
+SAMPLE_TEXT = (
+    "Fact-based news, exclusive video footage, photos and updated maps. "
+    "Abra kadabra abra kadabra YEAH. "
+)
+
+
+def make_df(rows: int, sentences_per_row: int) -> DataFrame:
+    """
+    Build a DataFrame with `rows` synthetic texts of roughly equal length.
+    """
+    return DataFrame(
+        {"text": [f"{idx} " + SAMPLE_TEXT * sentences_per_row for idx in range(rows)]}
+    )
+
+
+def count_per_row(tokenizer: Tokenizer, df: DataFrame) -> list:
+    return df["text"].apply(lambda x: len(tokenizer.tokenize_text(x))).tolist()
+
+
+def count_batch(tokenizer: Tokenizer, df: DataFrame) -> list:
+    return tokenizer.count_tokens_batch(df["text"].tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--sentences", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=Tokenizer.NUM_THREADS)
+    parser.add_argument("--encoding", default="cl100k_base")
+    args = parser.parse_args()
+
+    tokenizer = Tokenizer(encoding=args.encoding, num_threads=args.threads)
+    df = make_df(args.rows, args.sentences)
+
+    results = {}
+    for name, func in (("per-row", count_per_row), ("batch", count_batch)):
+        start = time.perf_counter()
+        results[name] = func(tokenizer, df)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8}: {elapsed:8.3f}s  {args.rows / elapsed:12.0f} rows/sec")
+
+    assert results["per-row"] == results["batch"], "Token counts differ."
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, List, NamedTuple, Sequence, Union
+
+import numpy as np
+
+
+# Marks a cache miss where None may be a cached value.
+_MISSING = object()
+
+
+class CacheInfo(NamedTuple):
+    """
+    Snapshot of cache statistics.
+    """
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded least-recently-used cache with hit/miss counters.
+    A cache with `maxsize` of 0 stores nothing and only counts misses.
+    """
+
+    def __init__(self, maxsize: int):
+        """
+        Initialize the cache.
+
+        :param maxsize: The maximum number of entries to keep.
+        :raises ValueError: If the maximum size is negative.
+        """
+        if maxsize < 0:
+            raise ValueError(f"Cache max size must be ≥ 0. Given: {maxsize}.")
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._in_flight = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get the value stored under the key and mark it as recently used.
+
+        :param key: The key to look up.
+        :param default: The value returned on a miss.
+        :return: The cached value or the default.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Store the value under the key, evicting the least recently used entry when full.
+
+        :param key: The key to store the value under.
+        :param value: The value to store.
+        """
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Get the value stored under the key, computing and storing it on a miss.
+        Concurrent misses on the same key share a single computation:
+        the first caller computes, the others wait for its result or exception.
+
+        :param key: The key to look up.
+        :param compute: Computes the value on a miss.
+        :return: The cached or computed value.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def clear(self):
+        """
+        Remove all entries and reset the hit/miss counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def info(self) -> CacheInfo:
+        """
+        Get the cache statistics.
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """
+    LRU cache whose entries also expire `ttl` seconds after they were stored.
+    Expired entries count as misses and are dropped when looked up.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = None):
+        """
+        Initialize the cache.
+
+        :param maxsize: The maximum number of entries to keep.
+        :param ttl: The number of seconds an entry stays valid.
+        :param clock: Returns the current time in seconds, `time.monotonic` by default.
+        :raises ValueError: If the maximum size is negative or the TTL is not positive.
+        """
+        if ttl <= 0:
+            raise ValueError(f"Cache TTL must be > 0. Given: {ttl}.")
+        super().__init__(maxsize=maxsize)
+        self.ttl = ttl
+        self._clock = clock or time.monotonic
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get the unexpired value stored under the key and mark it as recently used.
+
+        :param key: The key to look up.
+        :param default: The value returned on a miss.
+        :return: The cached value or the default.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._data[key]
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Store the value under the key until the TTL passes.
+
+        :param key: The key to store the value under.
+        :param value: The value to store.
+        """
+        super().set(key, (self._clock() + self.ttl, value))
+
+
+def text_digest(text: str) -> bytes:
+    """
+    Get a compact digest of the text, used as a cache key instead of the text itself.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of embeddings in a local SQLite file.
+    Embeddings are keyed by the engine and the SHA-256 digest of the text and stored
+    as float32 blobs. When over `maxsize` entries, the least recently used are evicted.
+    The number of entries is counted when the cache is opened and kept up to date
+    from the rows each write inserts or deletes, so writes never scan the table;
+    entries written by other processes since are only counted when it is reopened.
+    Safe to share between threads; hit/miss counters are kept per process.
+    """
+
+    MAXSIZE = 1000000
+    # Keeps the number of bound parameters per statement under SQLite's limit.
+    QUERY_BATCH_SIZE = 500
+
+    def __init__(self, path: str, maxsize: int = MAXSIZE):
+        """
+        Open the cache, creating the database file when it does not exist.
+
+        :param path: The path to the SQLite file, or ":memory:".
+        :param maxsize: The maximum number of embeddings to keep.
+        :raises ValueError: If the maximum size is negative.
+        """
+        if maxsize < 0:
+            raise ValueError(f"Cache max size must be ≥ 0. Given: {maxsize}.")
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "engine TEXT NOT NULL, digest BLOB NOT NULL, vector BLOB NOT NULL, "
+                "accessed INTEGER NOT NULL, PRIMARY KEY (engine, digest))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)"
+            )
+            (self._clock,) = self._connection.execute(
+                "SELECT COALESCE(MAX(accessed), 0) FROM embeddings"
+            ).fetchone()
+            self._count = self._size()
+
+    def get(self, engine: str, text: str) -> Union[np.ndarray, None]:
+        """
+        Get the cached embedding of the text.
+
+        :param engine: The engine the embedding was created with.
+        :param text: The embedded text.
+        :return: The float32 embedding or None on a miss.
+        """
+        return self.get_many(engine, [text])[0]
+
+    def set(self, engine: str, text: str, embedding: Sequence[float]):
+        """
+        Store the embedding of the text.
+
+        :param engine: The engine the embedding was created with.
+        :param text: The embedded text.
+        :param embedding: The embedding to store.
+        """
+        self.put_many(engine, [text], [embedding])
+
+    def get_many(
+        self, engine: str, texts: Sequence[str]
+    ) -> List[Union[np.ndarray, None]]:
+        """
+        Get the cached embeddings of many texts with a few queries, marking them as recently used.
+
+        :param engine: The engine the embeddings were created with.
+        :param texts: The embedded texts.
+        :return: A float32 embedding or None for each text, in the order of the texts.
+        """
+        digests = [content_digest(text) for text in texts]
+        found = {}
+        with self._lock, self._connection:
+            for start in range(0, len(digests), self.QUERY_BATCH_SIZE):
+                end = start + self.QUERY_BATCH_SIZE
+                batch = list(set(digests[start:end]))
+                rows = self._connection.execute(
+                    "SELECT digest, vector FROM embeddings "
+                    f"WHERE engine = ? AND digest IN ({', '.join('?' * len(batch))})",
+                    [engine, *batch],
+                ).fetchall()
+                found.update(rows)
+            if found and self.maxsize:
+                self._clock += 1
+                self._connection.executemany(
+                    "UPDATE embeddings SET accessed = ? WHERE engine = ? AND digest = ?",
+                    [(self._clock, engine, digest) for digest in found],
+                )
+            hits = sum(digest in found for digest in digests)
+            self._hits += hits
+            self._misses += len(digests) - hits
+
+        return [
+            np.frombuffer(found[digest], dtype=np.float32) if digest in found else None
+            for digest in digests
+        ]
+
+    def put_many(
+        self, engine: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]
+    ):
+        """
+        Store the embeddings of many texts in one transaction, then evict down to the size cap.
+
+        :param engine: The engine the embeddings were created with.
+        :param texts: The embedded texts.
+        :param embeddings: The embedding of each text.
+        """
+        if self.maxsize == 0 or not texts:
+            return
+        with self._lock, self._connection:
+            self._clock += 1
+            rows = [
+                (
+                    np.asarray(embedding, dtype=np.float32).tobytes(),
+                    self._clock,
+                    engine,
+                    content_digest(text),
+                )
+                for text, embedding in zip(texts, embeddings)
+            ]
+            # Existing entries are updated first, so the insert only counts new ones.
+            self._connection.executemany(
+                "UPDATE embeddings SET vector = ?, accessed = ? "
+                "WHERE engine = ? AND digest = ?",
+                rows,
+            )
+            self._count += self._connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (vector, accessed, engine, digest) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            ).rowcount
+            if self._count > self.maxsize:
+                self._count -= self._connection.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY accessed LIMIT ?)",
+                    (self._count - self.maxsize,),
+                ).rowcount
+
+    def clear(self):
+        """
+        Remove all embeddings and reset the hit/miss counters.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM embeddings")
+            self._count = 0
+            self._hits = 0
+            self._misses = 0
+
+    def info(self) -> CacheInfo:
+        """
+        Get the cache statistics.
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, self._size())
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._connection.close()
+
+    def _size(self) -> int:
+        (size,) = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return size
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._size()
+
+
+def content_digest(text: str) -> bytes:
+    """
+    Get the SHA-256 digest of the text, used to address persistent cache entries.
+    """
+    return hashlib.sha256(text.encode("utf-8")).digest()
@@ -0,0 +1,219 @@
+import re
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import List, NamedTuple
+
+import numpy as np
+
+from openaiapp.tokenizers import AbstractTokenizer
+
+
+class TextChunk(NamedTuple):
+    """
+    A chunk of text together with its token count and, optionally, its tokens.
+    """
+
+    text: str
+    n_tokens: int
+    tokens: np.ndarray = None
+
+
+class AbstractChunker(ABC):
+    """
+    Abstract base class for chunkers.
+    Defines the structure for cutting a text into chunks with a token limit.
+    """
+
+    @abstractmethod
+    def chunk_text(
+        self, text: str, max_tokens: int, tokens: List[int] = None
+    ) -> List[TextChunk]:
+        """
+        Cut the text into chunks of at most `max_tokens` tokens.
+
+        :param text: Text to be chunked.
+        :param max_tokens: The maximum number of tokens per chunk.
+        :param tokens: Token IDs of the text, if it is already encoded.
+        :return: A list of chunks with their token counts.
+        """
+        pass
+
+
+class SentenceChunker(AbstractChunker):
+    """
+    Packs whole sentences into chunks.
+    The text is encoded once and sentence boundaries are mapped onto token offsets,
+    so sentences are never tokenized separately.
+    """
+
+    SENTENCE_SEPARATOR = re.compile(r"(?<=[.!?])\s+")
+
+    def __init__(self, tokenizer: AbstractTokenizer):
+        self.tokenizer = tokenizer
+
+    def chunk_text(
+        self, text: str, max_tokens: int, tokens: List[int] = None
+    ) -> List[TextChunk]:
+        """
+        Cut the text into chunks of whole sentences with at most `max_tokens` tokens.
+        Sentences longer than `max_tokens` are cut into token windows.
+
+        :param text: Text to be chunked.
+        :param max_tokens: The maximum number of tokens per chunk.
+        :param tokens: Token IDs of the text, if it is already encoded.
+        :return: A list of chunks with their token counts.
+        :raises ValueError: If the maximum number of tokens is not positive.
+        """
+        if max_tokens < 1:
+            raise ValueError(f"Max tokens must be ≥ 1. Given: {max_tokens}.")
+
+        if tokens is None:
+            tokens, offsets = self.tokenizer.tokenize_text_with_offsets(text)
+        else:
+            offsets = self.tokenizer.token_offsets(text, tokens)
+
+        pieces, piece_sizes = [], []
+        for start, end, first_token, last_token in self._sentence_spans(text, offsets):
+            size = last_token - first_token
+            if size <= max_tokens:
+                pieces.append(text[start:end])
+                piece_sizes.append(size)
+                continue
+            # Cut an oversized sentence on token windows instead of giving up on it.
+            for window_start in range(first_token, last_token, max_tokens):
+                window_end = min(window_start + max_tokens, last_token)
+                piece_start = max(offsets[window_start], start)
+                piece_end = offsets[window_end] if window_end < len(offsets) else end
+                piece_end = min(piece_end, end)
+                pieces.append(text[piece_start:piece_end].strip())
+                piece_sizes.append(window_end - window_start)
+
+        return self._pack(pieces, piece_sizes, max_tokens)
+
+    def _sentence_spans(self, text: str, offsets: List[int]):
+        """
+        Yield the character span and token range of each non-empty sentence.
+        Whitespace between sentences is attributed to the following sentence.
+        """
+        boundaries = [(0, 0)]
+        for match in self.SENTENCE_SEPARATOR.finditer(text):
+            boundaries.append((match.start(), match.end()))
+        boundaries.append((len(text), len(text)))
+
+        token_boundaries = [bisect_left(offsets, end) for end, _ in boundaries]
+        token_boundaries[0], token_boundaries[-1] = 0, len(offsets)
+
+        for idx in range(len(boundaries) - 1):
+            start, end = boundaries[idx][1], boundaries[idx + 1][0]
+            if start < end:
+                yield start, end, token_boundaries[idx], token_boundaries[idx + 1]
+
+    @staticmethod
+    def _pack(
+        pieces: List[str], piece_sizes: List[int], max_tokens: int
+    ) -> List[TextChunk]:
+        """
+        Greedily pack consecutive pieces into chunks of at most `max_tokens` tokens,
+        joining the pieces of each chunk once.
+        """
+        if not pieces:
+            return []
+        sizes = np.asarray(piece_sizes, dtype=np.int64)
+        boundaries = pack_token_counts(sizes, max_tokens)
+        chunk_sizes = np.add.reduceat(sizes, boundaries[:-1]).tolist()
+        return [
+            TextChunk(" ".join(pieces[start:end]), size)
+            for start, end, size in zip(boundaries, boundaries[1:], chunk_sizes)
+        ]
+
+
+def pack_token_counts(sizes: np.ndarray, max_tokens: int) -> List[int]:
+    """
+    Find the boundaries of a greedy packing of consecutive items into chunks of at most
+    `max_tokens` tokens. One vectorized binary search over the cumulative token counts
+    finds where a chunk starting at each item would end; the packing then only follows
+    those pointers, so the Python work grows with the number of chunks, not items.
+    An item larger than `max_tokens` gets a chunk of its own.
+
+    :param sizes: The token count of each item.
+    :param max_tokens: The maximum number of tokens per chunk.
+    :return: Chunk boundaries, chunk `i` spans items `boundaries[i]:boundaries[i + 1]`.
+    """
+    n_items = len(sizes)
+    if not n_items:
+        return []
+
+    cumulative = np.zeros(n_items + 1, dtype=np.int64)
+    np.cumsum(sizes, out=cumulative[1:])
+    # The last position not exceeding the limit, but always at least one item.
+    ends = np.searchsorted(cumulative, cumulative[:-1] + max_tokens, side="right") - 1
+    ends = np.maximum(ends, np.arange(1, n_items + 1)).tolist()
+
+    boundaries, start = [0], 0
+    while start < n_items:
+        start = ends[start]
+        boundaries.append(start)
+    return boundaries
+
+
+class SlidingWindowChunker(AbstractChunker):
+    """
+    Cuts fixed-size token windows that overlap by a configurable number of tokens.
+    The text is encoded once into a contiguous uint32 buffer and every window's
+    tokens are a view into that buffer, so overlapping text is never re-encoded or copied.
+    """
+
+    def __init__(self, tokenizer: AbstractTokenizer, overlap_tokens: int = 0):
+        """
+        Initialize the chunker.
+
+        :param tokenizer: The tokenizer to encode texts with.
+        :param overlap_tokens: The number of tokens shared by consecutive windows.
+        :raises ValueError: If the overlap is negative.
+        """
+        if overlap_tokens < 0:
+            raise ValueError(f"Overlap tokens must be ≥ 0. Given: {overlap_tokens}.")
+        self.tokenizer = tokenizer
+        self.overlap_tokens = overlap_tokens
+
+    def chunk_text(
+        self, text: str, max_tokens: int, tokens: List[int] = None
+    ) -> List[TextChunk]:
+        """
+        Cut the text into windows of `max_tokens` tokens, the last one may be shorter.
+
+        :param text: Text to be chunked.
+        :param max_tokens: The number of tokens per window.
+        :param tokens: Token IDs of the text, if it is already encoded.
+        :return: A list of chunks with their token counts and uint32 token views.
+        :raises ValueError: If the window is not larger than the overlap.
+        """
+        if max_tokens <= self.overlap_tokens:
+            raise ValueError(
+                f"Max tokens must be > overlap tokens ({self.overlap_tokens}). Given: {max_tokens}."
+            )
+
+        if tokens is None:
+            tokens, offsets = self.tokenizer.tokenize_text_with_offsets(text)
+        else:
+            offsets = self.tokenizer.token_offsets(text, tokens)
+
+        buffer = np.asarray(tokens, dtype=np.uint32)
+        n_tokens = len(buffer)
+        stride = max_tokens - self.overlap_tokens
+
+        chunks = []
+        for start in range(0, n_tokens, stride):
+            end = min(start + max_tokens, n_tokens)
+            text_start = offsets[start]
+            text_end = offsets[end] if end < n_tokens else len(text)
+            chunks.append(
+                TextChunk(
+                    text=text[text_start:text_end].strip(),
+                    n_tokens=end - start,
+                    tokens=buffer[start:end],
+                )
+            )
+            if end == n_tokens:
+                break
+        return chunks
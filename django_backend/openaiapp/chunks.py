@@ -0,0 +1,411 @@
+import json
+from array import array
+from typing import Iterable, Iterator, List, Sequence, Union
+
+import numpy as np
+from pandas import DataFrame
+
+
+class Chunk:
+    """
+    A lightweight view of one chunk stored in a ChunkCollection.
+    Holds no data of its own, every attribute is read from the collection's arrays.
+    """
+
+    __slots__ = ("_collection", "_index")
+
+    def __init__(self, collection: "ChunkCollection", index: int):
+        self._collection = collection
+        self._index = index
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def text(self) -> str:
+        return self._collection.get_text(self._index)
+
+    @property
+    def n_tokens(self) -> int:
+        return int(self._collection.n_tokens[self._index])
+
+    @property
+    def url(self) -> str:
+        return self._collection.urls[self._collection.url_ids[self._index]]
+
+    @property
+    def tokens(self) -> Union[np.ndarray, None]:
+        return self._collection.get_tokens(self._index)
+
+    @property
+    def embedding(self) -> Union[np.ndarray, None]:
+        embeddings = self._collection.embeddings
+        return None if embeddings is None else embeddings[self._index]
+
+    def __repr__(self) -> str:
+        return f"Chunk(index={self._index}, n_tokens={self.n_tokens}, url={self.url!r})"
+
+
+class ChunkCollection:
+    """
+    Columnar store of prepared chunks kept in a few contiguous arrays:
+    one UTF-8 text blob with offsets, an int32 token count column,
+    int32 source URL ids, and optionally a uint32 token buffer with offsets
+    and a float32 embedding matrix.
+    """
+
+    def __init__(
+        self,
+        text_blob: bytes,
+        text_offsets: np.ndarray,
+        n_tokens: np.ndarray,
+        url_ids: np.ndarray,
+        urls: List[str],
+        tokens: np.ndarray = None,
+        token_offsets: np.ndarray = None,
+        embeddings: np.ndarray = None,
+    ):
+        """
+        Initialize the collection from its arrays.
+
+        :param text_blob: UTF-8 encoded texts of all chunks, back to back.
+        :param text_offsets: int64 byte offsets of the texts, one more than there are chunks.
+        :param n_tokens: int32 token count of each chunk.
+        :param url_ids: int32 index of each chunk's source URL in `urls`.
+        :param urls: The distinct source URLs.
+        :param tokens: Optional uint32 tokens of all chunks, back to back.
+        :param token_offsets: int64 offsets into `tokens`, required with `tokens`.
+        :param embeddings: Optional (n, d) float32 embedding matrix.
+        :raises ValueError: If the arrays do not describe the same number of chunks.
+        """
+        size = len(n_tokens)
+        if len(text_offsets) != size + 1 or len(url_ids) != size:
+            raise ValueError("Chunk arrays must describe the same number of chunks.")
+        if (tokens is None) != (token_offsets is None):
+            raise ValueError("Tokens and token offsets must be given together.")
+        if token_offsets is not None and len(token_offsets) != size + 1:
+            raise ValueError("Chunk arrays must describe the same number of chunks.")
+
+        self.text_blob = text_blob
+        self.text_offsets = np.asarray(text_offsets, dtype=np.int64)
+        self.n_tokens = np.asarray(n_tokens, dtype=np.int32)
+        self.url_ids = np.asarray(url_ids, dtype=np.int32)
+        self.urls = list(urls)
+        self.tokens = None if tokens is None else np.asarray(tokens, dtype=np.uint32)
+        self.token_offsets = (
+            None if token_offsets is None else np.asarray(token_offsets, np.int64)
+        )
+        self.embeddings = None
+        if embeddings is not None:
+            self.set_embeddings(embeddings)
+
+    @classmethod
+    def from_records(
+        cls, records: Iterable[dict], keep_tokens: bool = False
+    ) -> "ChunkCollection":
+        """
+        Build a collection from chunk records, such as those yielded by `TextPreparatory.iter_chunks`.
+        Records are consumed one at a time and only their packed form is kept.
+
+        :param records: Dicts with `text`, `n_tokens` and optionally `url` and `tokens`.
+        :param keep_tokens: Whether to keep the records' tokens.
+        :return: A new ChunkCollection.
+        """
+        text_blob = bytearray()
+        text_offsets, n_tokens, url_ids = array("q", [0]), array("i"), array("i")
+        tokens, token_offsets = [], array("q", [0])
+        url_index = {}
+
+        for record in records:
+            text_blob += record["text"].encode("utf-8")
+            text_offsets.append(len(text_blob))
+            n_tokens.append(record["n_tokens"])
+            url_ids.append(url_index.setdefault(record.get("url"), len(url_index)))
+            if keep_tokens:
+                record_tokens = np.asarray(record["tokens"], dtype=np.uint32)
+                tokens.append(record_tokens)
+                token_offsets.append(token_offsets[-1] + len(record_tokens))
+
+        if keep_tokens:
+            tokens = np.concatenate(tokens) if tokens else np.empty(0, np.uint32)
+            token_offsets = np.frombuffer(token_offsets, dtype=np.int64)
+        else:
+            tokens = token_offsets = None
+
+        return cls(
+            text_blob=bytes(text_blob),
+            text_offsets=np.frombuffer(text_offsets, dtype=np.int64),
+            n_tokens=np.frombuffer(n_tokens, dtype=np.int32),
+            url_ids=np.frombuffer(url_ids, dtype=np.int32),
+            urls=list(url_index),
+            tokens=tokens,
+            token_offsets=token_offsets,
+        )
+
+    @classmethod
+    def from_dataframe(cls, df: DataFrame) -> "ChunkCollection":
+        """
+        Build a collection from a DataFrame with `text` and `n_tokens` columns
+        and optional `url`, `tokens` and `embeddings` columns.
+
+        :param df: The DataFrame to pack.
+        :return: A new ChunkCollection.
+        """
+        keep_tokens = "tokens" in df.columns
+        collection = cls.from_records(
+            (
+                {
+                    "text": text,
+                    "n_tokens": n_tokens,
+                    "url": url,
+                    "tokens": tokens,
+                }
+                for text, n_tokens, url, tokens in zip(
+                    df["text"],
+                    df["n_tokens"],
+                    df["url"] if "url" in df.columns else [None] * len(df),
+                    df["tokens"] if keep_tokens else [None] * len(df),
+                )
+            ),
+            keep_tokens=keep_tokens,
+        )
+        if "embeddings" in df.columns and len(df):
+            collection.set_embeddings(np.vstack(df["embeddings"].tolist()))
+        return collection
+
+    def to_dataframe(self) -> DataFrame:
+        """
+        Unpack the collection into a DataFrame with one row per chunk.
+        """
+        df = DataFrame(
+            {
+                "url": [chunk.url for chunk in self],
+                "text": list(self.iter_texts()),
+                "n_tokens": self.n_tokens,
+            }
+        )
+        if self.tokens is not None:
+            df["tokens"] = [self.get_tokens(idx) for idx in range(len(self))]
+        if self.embeddings is not None:
+            df["embeddings"] = list(self.embeddings)
+        return df
+
+    @classmethod
+    def concat(cls, collections: Sequence["ChunkCollection"]) -> "ChunkCollection":
+        """
+        Join collections into a new one, in order.
+        The arrays are joined as they are, with the offsets shifted and the URL ids
+        remapped, so no chunk is unpacked.
+        Tokens and embeddings are kept only when every collection has them.
+
+        :param collections: The collections to join.
+        :return: A new ChunkCollection.
+        """
+        if not collections:
+            return cls.from_records([])
+
+        text_offsets, token_offsets, url_ids = [np.zeros(1, np.int64)], [], []
+        text_shift = token_shift = 0
+        url_index = {}
+        for c in collections:
+            text_offsets.append(c.text_offsets[1:] + text_shift)
+            text_shift += len(c.text_blob)
+            if c.token_offsets is not None:
+                token_offsets.append(c.token_offsets[1:] + token_shift)
+                token_shift += len(c.tokens)
+            mapping = [url_index.setdefault(url, len(url_index)) for url in c.urls]
+            url_ids.append(np.asarray(mapping, dtype=np.int32)[c.url_ids])
+
+        tokens = None
+        if all(c.tokens is not None for c in collections):
+            tokens = np.concatenate([c.tokens for c in collections])
+            token_offsets = np.concatenate([np.zeros(1, np.int64)] + token_offsets)
+        url_ids, urls = _used_urls(np.concatenate(url_ids), list(url_index))
+
+        collection = cls(
+            text_blob=b"".join(bytes(c.text_blob) for c in collections),
+            text_offsets=np.concatenate(text_offsets),
+            n_tokens=np.concatenate([c.n_tokens for c in collections]),
+            url_ids=url_ids,
+            urls=urls,
+            tokens=tokens,
+            token_offsets=None if tokens is None else token_offsets,
+        )
+        embeddings = [c.embeddings for c in collections if len(c)]
+        if embeddings and all(emb is not None for emb in embeddings):
+            collection.set_embeddings(np.vstack(embeddings))
+        return collection
+
+    def take(self, indices: Sequence[int]) -> "ChunkCollection":
+        """
+        Copy the chunks at the indices into a new collection, in the order of the indices.
+        Texts and tokens are gathered from their buffers with array indexing.
+
+        :param indices: The indices of the chunks to copy.
+        :return: A new ChunkCollection.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        text_blob = np.frombuffer(self.text_blob, dtype=np.uint8)
+        text_blob, text_offsets = _gather(text_blob, self.text_offsets, indices)
+        tokens = token_offsets = None
+        if self.tokens is not None:
+            tokens, token_offsets = _gather(self.tokens, self.token_offsets, indices)
+        url_ids, urls = _used_urls(self.url_ids[indices], self.urls)
+
+        return type(self)(
+            text_blob=text_blob.tobytes(),
+            text_offsets=text_offsets,
+            n_tokens=self.n_tokens[indices],
+            url_ids=url_ids,
+            urls=urls,
+            tokens=tokens,
+            token_offsets=token_offsets,
+            embeddings=None if self.embeddings is None else self.embeddings[indices],
+        )
+
+    def save(self, path: str):
+        """
+        Save the collection's arrays to a `.npz` file.
+
+        :param path: The path to the `.npz` file.
+        """
+        arrays = {
+            "text_blob": np.frombuffer(self.text_blob, dtype=np.uint8),
+            "text_offsets": self.text_offsets,
+            "n_tokens": self.n_tokens,
+            "url_ids": self.url_ids,
+            "urls": np.array(json.dumps(self.urls)),
+        }
+        if self.tokens is not None:
+            arrays.update(tokens=self.tokens, token_offsets=self.token_offsets)
+        if self.embeddings is not None:
+            arrays.update(embeddings=self.embeddings)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkCollection":
+        """
+        Load a collection saved with `save`.
+
+        :param path: The path to the `.npz` file.
+        :return: The loaded ChunkCollection.
+        """
+        with np.load(path) as arrays:
+            return cls(
+                text_blob=arrays["text_blob"].tobytes(),
+                text_offsets=arrays["text_offsets"],
+                n_tokens=arrays["n_tokens"],
+                url_ids=arrays["url_ids"],
+                urls=json.loads(str(arrays["urls"])),
+                tokens=arrays["tokens"] if "tokens" in arrays else None,
+                token_offsets=(
+                    arrays["token_offsets"] if "token_offsets" in arrays else None
+                ),
+                embeddings=arrays["embeddings"] if "embeddings" in arrays else None,
+            )
+
+    def set_embeddings(self, embeddings: np.ndarray):
+        """
+        Attach an (n, d) embedding matrix, stored as contiguous float32.
+
+        :param embeddings: One embedding row per chunk.
+        :raises ValueError: If the matrix does not have one row per chunk.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or len(embeddings) != len(self):
+            raise ValueError(
+                f"Embeddings must be a matrix with {len(self)} rows. Given shape: {embeddings.shape}."
+            )
+        self.embeddings = embeddings
+
+    def get_text(self, index: int) -> str:
+        """
+        Get the text of the chunk at the index.
+        """
+        start, end = self.text_offsets[index], self.text_offsets[index + 1]
+        return self.text_blob[start:end].decode("utf-8")
+
+    def get_tokens(self, index: int) -> Union[np.ndarray, None]:
+        """
+        Get the tokens of the chunk at the index as a view into the token buffer.
+        """
+        if self.tokens is None:
+            return None
+        start, end = self.token_offsets[index], self.token_offsets[index + 1]
+        return self.tokens[start:end]
+
+    def iter_texts(self) -> Iterator[str]:
+        """
+        Iterate over the texts of all chunks.
+        """
+        for index in range(len(self)):
+            yield self.get_text(index)
+
+    def iter_records(self) -> Iterator[dict]:
+        """
+        Iterate over the chunks as `{url, text}` documents, e.g. for `TextPreparatory.iter_chunks`.
+        """
+        for chunk in self:
+            yield {"url": chunk.url, "text": chunk.text}
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The number of bytes held by the collection's arrays.
+        """
+        arrays = (
+            self.text_offsets,
+            self.n_tokens,
+            self.url_ids,
+            self.tokens,
+            self.token_offsets,
+            self.embeddings,
+        )
+        return len(self.text_blob) + sum(
+            array.nbytes for array in arrays if array is not None
+        )
+
+    def __len__(self) -> int:
+        return len(self.n_tokens)
+
+    def __getitem__(self, index: int) -> Chunk:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Chunk index out of range.")
+        return Chunk(self, index)
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for index in range(len(self)):
+            yield Chunk(self, index)
+
+
+def _gather(buffer: np.ndarray, offsets: np.ndarray, indices: np.ndarray):
+    """
+    Gather the segments `buffer[offsets[i]:offsets[i + 1]]` of the indices back to back.
+
+    :return: The gathered buffer and its offsets, starting at 0.
+    """
+    starts = offsets[indices]
+    lengths = offsets[indices + 1] - starts
+    new_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.arange(new_offsets[-1], dtype=np.int64)
+    positions += np.repeat(starts - new_offsets[:-1], lengths)
+    return buffer[positions], new_offsets
+
+
+def _used_urls(url_ids: np.ndarray, urls: List[str]):
+    """
+    Drop the URLs no chunk refers to, keeping the others in order of first use
+    as `ChunkCollection.from_records` does, and remap the URL ids to them.
+
+    :return: The remapped URL ids and the used URLs.
+    """
+    used, first = np.unique(url_ids, return_index=True)
+    used = used[np.argsort(first, kind="stable")]
+    mapping = np.zeros(len(urls), dtype=np.int32)
+    mapping[used] = np.arange(len(used), dtype=np.int32)
+    return mapping[url_ids], [urls[url_id] for url_id in used]
@@ -0,0 +1,944 @@
+import os
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Sequence, Union
+
+import numpy as np
+from pandas import DataFrame
+from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA
+
+from openaiapp.chunks import ChunkCollection
+
+
+class AbstractEmbeddingStore(ABC):
+    """
+    Abstract base class for embedding stores.
+    Defines a standard interface for similarity search over stored embeddings.
+    """
+
+    @abstractmethod
+    def similarities(self, query: Sequence[float]) -> np.ndarray:
+        """
+        Compute the cosine similarity of the query to every stored embedding.
+        """
+        pass
+
+    @abstractmethod
+    def search(self, query: Sequence[float], k: int = None) -> np.ndarray:
+        """
+        Find the indices of the stored embeddings most similar to the query.
+        """
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+
+class AbstractProjection(ABC):
+    """
+    Abstract base class for projections of embeddings to fewer dimensions.
+    Projected embeddings are L2-normalized again, so cosine similarity stays a dot product.
+    """
+
+    @abstractmethod
+    def fit(self, embeddings: np.ndarray) -> "AbstractProjection":
+        """
+        Fit the projection on a corpus of normalized embeddings.
+        """
+        pass
+
+    @abstractmethod
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Project normalized embeddings, one per row, to normalized float32 rows.
+        """
+        pass
+
+    @abstractmethod
+    def save(self, path: str):
+        """
+        Save the fitted projection to a `.npz` file.
+        """
+        pass
+
+
+class PrefixProjection(AbstractProjection):
+    """
+    Keeps the first `dim` dimensions of each embedding.
+    Suits embeddings trained to front-load information; needs no fitting.
+    """
+
+    def __init__(self, dim: int):
+        if dim < 1:
+            raise ValueError(f"Projection dimensions must be ≥ 1. Given: {dim}.")
+        self.dim = dim
+
+    def fit(self, embeddings: np.ndarray) -> "PrefixProjection":
+        return self
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        return _normalize_rows(
+            np.asarray(embeddings, dtype=np.float32)[..., : self.dim]
+        )
+
+    def save(self, path: str):
+        np.savez(path, kind="prefix", dim=self.dim)
+
+
+class PCAProjection(AbstractProjection):
+    """
+    Projects embeddings onto the top `dim` principal components of the corpus.
+    """
+
+    RANDOM_STATE = 0
+
+    def __init__(
+        self, dim: int, mean: np.ndarray = None, components: np.ndarray = None
+    ):
+        """
+        Initialize the projection, fitted when the mean and components are given.
+
+        :param dim: The number of dimensions to keep.
+        :param mean: The (d,) mean of the corpus embeddings.
+        :param components: The (dim, d) principal components.
+        """
+        if dim < 1:
+            raise ValueError(f"Projection dimensions must be ≥ 1. Given: {dim}.")
+        self.dim = dim
+        self.mean = mean
+        self.components = components
+
+    def fit(self, embeddings: np.ndarray) -> "PCAProjection":
+        """
+        Fit the principal components of the embeddings.
+
+        :param embeddings: The (n, d) normalized corpus embeddings, n and d ≥ `dim`.
+        :return: The fitted projection.
+        :raises ValueError: If there are fewer embeddings or dimensions than `dim`.
+        """
+        if min(embeddings.shape) < self.dim:
+            raise ValueError(
+                f"PCA to {self.dim} dimensions needs at least {self.dim} embeddings "
+                f"of as many dimensions. Given shape: {embeddings.shape}."
+            )
+        pca = PCA(n_components=self.dim, random_state=self.RANDOM_STATE)
+        pca.fit(embeddings)
+        self.mean = pca.mean_.astype(np.float32)
+        self.components = np.ascontiguousarray(pca.components_, dtype=np.float32)
+        return self
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        if self.components is None:
+            raise RuntimeError("The PCA projection must be fitted before use.")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return _normalize_rows((embeddings - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        np.savez(
+            path, kind="pca", dim=self.dim, mean=self.mean, components=self.components
+        )
+
+
+PROJECTIONS = {"pca": PCAProjection, "prefix": PrefixProjection}
+
+
+def load_projection(path: str) -> AbstractProjection:
+    """
+    Load a projection saved with its `save` method.
+
+    :param path: The path to the `.npz` file.
+    :return: The loaded projection.
+    """
+    with np.load(path) as arrays:
+        if str(arrays["kind"]) == "prefix":
+            return PrefixProjection(dim=int(arrays["dim"]))
+        return PCAProjection(
+            dim=int(arrays["dim"]),
+            mean=arrays["mean"],
+            components=arrays["components"],
+        )
+
+
+def top_k(scores: np.ndarray, k: int = None) -> np.ndarray:
+    """
+    Get the indices of the `k` highest scores, from the highest, ties by index,
+    as the first `k` of a stable descending sort but in linear time for small `k`.
+
+    :param scores: The scores to rank.
+    :param k: The number of indices to return, all of them by default.
+    :return: The int64 indices of the highest scores.
+    """
+    if k is None or k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[: k - len(above)]
+    top = np.concatenate([above, ties])
+    return top[np.lexsort((top, -scores[top]))]
+
+
+def _projection_path(path: str) -> str:
+    """
+    Get the path of the projection file saved next to a store's `.npy` file.
+    """
+    return os.path.splitext(path)[0] + ".projection.npz"
+
+
+def _normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize the embeddings along their last axis, leaving zero vectors as they are.
+    """
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return (embeddings / norms).astype(np.float32, copy=False)
+
+
+class EmbeddingStore(AbstractEmbeddingStore):
+    """
+    Embeddings kept in a single C-contiguous (n, d) float32 matrix of L2-normalized rows,
+    so the cosine similarity of a query to all of them is one matrix-vector product.
+    Products are computed by BLAS over blocks of `BLOCK_SIZE` rows written in place,
+    so memory-mapped matrices are streamed and no temporary grows with the store.
+    With a projection the embeddings are kept at reduced dimensions
+    and queries are projected the same way before searching.
+    """
+
+    DTYPE = np.float32
+    # Rows scored at once: 4096 rows of 1536 float32 dimensions span 24 MiB.
+    BLOCK_SIZE = 4096
+
+    def __init__(self, matrix: np.ndarray, projection: AbstractProjection = None):
+        """
+        Initialize the store from an already normalized matrix, e.g. a memory-mapped one.
+        Use `from_embeddings` to build a store from raw embeddings.
+
+        :param matrix: The (n, d) float32 matrix of L2-normalized embeddings.
+        :param projection: The fitted projection the matrix was reduced with, if any.
+        :raises ValueError: If the matrix is not a C-contiguous float32 matrix.
+        """
+        if matrix.ndim != 2 or matrix.dtype != self.DTYPE:
+            raise ValueError(
+                f"Embeddings must be a float32 matrix. Given: {matrix.dtype} of shape {matrix.shape}."
+            )
+        if not matrix.flags["C_CONTIGUOUS"]:
+            raise ValueError("Embeddings matrix must be C-contiguous.")
+        self.matrix = matrix
+        self.projection = projection
+
+    @classmethod
+    def from_embeddings(
+        cls,
+        embeddings: Union[np.ndarray, Sequence[Sequence[float]]],
+        projection: AbstractProjection = None,
+    ) -> "EmbeddingStore":
+        """
+        Build a store from raw embeddings, one per row, normalizing them.
+        Zero vectors stay zero and are never similar to anything.
+
+        :param embeddings: An (n, d) matrix or a sequence of n embeddings.
+        :param projection: An optional projection to fewer dimensions, fitted on these embeddings.
+        :return: A new EmbeddingStore.
+        """
+        matrix = np.array(embeddings, dtype=cls.DTYPE, order="C", ndmin=2)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix /= norms
+        if projection is not None:
+            matrix = np.ascontiguousarray(projection.fit(matrix).transform(matrix))
+        return cls(matrix, projection)
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df: DataFrame,
+        column: str = "embeddings",
+        projection: AbstractProjection = None,
+    ) -> "EmbeddingStore":
+        """
+        Build a store from an embeddings column of a DataFrame.
+        Rows without an embedding get a zero vector.
+
+        :param df: The DataFrame with the embeddings column.
+        :param column: The name of the embeddings column.
+        :param projection: An optional projection to fewer dimensions.
+        :return: A new EmbeddingStore.
+        """
+        embeddings = df[column].tolist()
+        present = next((emb for emb in embeddings if emb is not None), None)
+        if present is None:
+            return cls(np.empty((len(embeddings), 0), dtype=cls.DTYPE))
+        missing = np.zeros(len(present), dtype=cls.DTYPE)
+        return cls.from_embeddings(
+            [missing if emb is None else emb for emb in embeddings], projection
+        )
+
+    @classmethod
+    def from_collection(
+        cls, collection: ChunkCollection, projection: AbstractProjection = None
+    ) -> "EmbeddingStore":
+        """
+        Build a store from the embedding matrix of a ChunkCollection.
+
+        :param collection: The collection with embeddings attached.
+        :param projection: An optional projection to fewer dimensions.
+        :return: A new EmbeddingStore.
+        :raises ValueError: If the collection has no embeddings.
+        """
+        if collection.embeddings is None:
+            raise ValueError("The chunk collection has no embeddings.")
+        return cls.from_embeddings(collection.embeddings, projection)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "r") -> "EmbeddingStore":
+        """
+        Load a store saved with `save`, memory-mapped by default so it is paged in on demand
+        and shared between processes. Its projection is loaded from the file next to it.
+
+        :param path: The path to the `.npy` file.
+        :param mmap_mode: The numpy memory-map mode, or None to read the matrix into memory.
+        :return: The loaded EmbeddingStore.
+        """
+        projection_path = _projection_path(path)
+        projection = (
+            load_projection(projection_path)
+            if os.path.exists(projection_path)
+            else None
+        )
+        return cls(np.load(path, mmap_mode=mmap_mode), projection)
+
+    def save(self, path: str):
+        """
+        Save the normalized matrix as a `.npy` file, and its projection
+        as a `.projection.npz` file next to it.
+
+        :param path: The path to the `.npy` file.
+        """
+        np.save(path, self.matrix)
+        if self.projection is not None:
+            self.projection.save(_projection_path(path))
+
+    def prepare_query(self, query: Sequence[float]) -> np.ndarray:
+        """
+        Normalize the query embedding and project it like the stored embeddings.
+
+        :param query: The query embedding at the original dimensions.
+        :return: The float32 query vector to multiply the matrix with.
+        """
+        query = _normalize_rows(np.asarray(query, dtype=self.DTYPE))
+        if self.projection is not None:
+            query = self.projection.transform(query)
+        return query
+
+    def similarities(self, query: Sequence[float]) -> np.ndarray:
+        """
+        Compute the cosine similarity of the query to every stored embedding.
+
+        :param query: The query embedding.
+        :return: A float32 array with one similarity per stored embedding.
+        """
+        query = self.prepare_query(query)
+        similarities = np.empty(len(self), dtype=self.DTYPE)
+        for start in range(0, len(self), self.BLOCK_SIZE):
+            end = min(start + self.BLOCK_SIZE, len(self))
+            np.dot(self.matrix[start:end], query, out=similarities[start:end])
+        return similarities
+
+    def search_batch(self, queries: Sequence[Sequence[float]], k: int) -> np.ndarray:
+        """
+        Find the `k` stored embeddings most similar to each of many queries at once.
+        Each block of rows is scored against all queries in one matrix product,
+        and only the best `k` candidates per query are kept between blocks.
+
+        :param queries: The query embeddings, one per row.
+        :param k: The number of indices to return per query.
+        :return: A (q, min(k, n)) int64 array of indices per query,
+            from the most to the least similar, ties by index.
+        :raises ValueError: If k is not positive.
+        """
+        if k < 1:
+            raise ValueError(f"Number of results must be ≥ 1. Given: {k}.")
+        if not len(queries):
+            return np.empty((0, min(k, len(self))), dtype=np.int64)
+        queries = np.vstack([self.prepare_query(query) for query in queries]).T
+        queries = np.ascontiguousarray(queries)
+        n_queries = queries.shape[1]
+        best_scores = np.empty((n_queries, 0), dtype=self.DTYPE)
+        best_ids = np.empty((n_queries, 0), dtype=np.int64)
+
+        for start in range(0, len(self), self.BLOCK_SIZE):
+            end = start + self.BLOCK_SIZE
+            block = self.matrix[start:end]
+            scores = np.concatenate([best_scores, (block @ queries).T], axis=1)
+            ids = np.concatenate(
+                [
+                    best_ids,
+                    np.broadcast_to(
+                        np.arange(start, start + len(block)), (n_queries, len(block))
+                    ),
+                ],
+                axis=1,
+            )
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                ids = np.take_along_axis(ids, keep, axis=1)
+            best_scores, best_ids = scores, ids
+
+        return np.vstack(
+            [
+                row_ids[np.lexsort((row_ids, -row_scores))]
+                for row_scores, row_ids in zip(best_scores, best_ids)
+            ]
+        )
+
+    def distances(self, query: Sequence[float]) -> np.ndarray:
+        """
+        Compute the cosine distance of the query to every stored embedding.
+
+        :param query: The query embedding.
+        :return: A float32 array with one distance per stored embedding.
+        """
+        return 1 - self.similarities(query)
+
+    def search(self, query: Sequence[float], k: int = None) -> np.ndarray:
+        """
+        Find the indices of the stored embeddings most similar to the query.
+
+        :param query: The query embedding.
+        :param k: The number of indices to return, all of them by default.
+        :return: The indices ordered from the most to the least similar, ties by index.
+        """
+        return top_k(self.similarities(query), k)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+
+class QuantizedEmbeddingStore(AbstractEmbeddingStore):
+    """
+    Embeddings kept in memory at reduced precision, int8 with a per-vector scale or float16,
+    next to a full-precision EmbeddingStore that is usually memory-mapped from disk.
+    Search ranks all embeddings on the quantized vectors, then rescores the best
+    `rescore_candidates` of them exactly against the full-precision vectors.
+    """
+
+    INT8 = "int8"
+    FLOAT16 = "float16"
+    RESCORE_CANDIDATES = 100
+    # Rows dequantized at once, which bounds the temporary float32 memory of a search.
+    BLOCK_SIZE = 1024
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scales: Union[np.ndarray, None],
+        full: EmbeddingStore,
+        rescore_candidates: int = RESCORE_CANDIDATES,
+    ):
+        """
+        Initialize the store from quantized vectors. Use `from_store` to quantize an EmbeddingStore.
+
+        :param codes: The (n, d) int8 or float16 quantized vectors.
+        :param scales: The float32 scale of each int8 vector, None for float16 vectors.
+        :param full: The full-precision store used for rescoring.
+        :param rescore_candidates: The number of best candidates to rescore exactly.
+        :raises ValueError: If the arrays do not describe the same embeddings.
+        """
+        if codes.dtype == np.int8 and scales is None:
+            raise ValueError("Int8 embeddings require per-vector scales.")
+        if codes.dtype not in (np.int8, np.float16):
+            raise ValueError(
+                f"Quantized embeddings must be int8 or float16. Given: {codes.dtype}."
+            )
+        if codes.shape != full.matrix.shape:
+            raise ValueError(
+                f"Quantized embeddings must match the full store shape {full.matrix.shape}. Given: {codes.shape}."
+            )
+        if rescore_candidates < 1:
+            raise ValueError(
+                f"Rescore candidates must be ≥ 1. Given: {rescore_candidates}."
+            )
+        self.codes = codes
+        self.scales = scales
+        self.full = full
+        self.rescore_candidates = rescore_candidates
+
+    @classmethod
+    def from_store(
+        cls,
+        store: EmbeddingStore,
+        dtype: str = INT8,
+        rescore_candidates: int = RESCORE_CANDIDATES,
+    ) -> "QuantizedEmbeddingStore":
+        """
+        Quantize the normalized embeddings of a store.
+
+        :param store: The full-precision store, kept for rescoring.
+        :param dtype: "int8" for symmetric per-vector int8 quantization or "float16".
+        :param rescore_candidates: The number of best candidates to rescore exactly.
+        :return: A new QuantizedEmbeddingStore.
+        :raises ValueError: If the dtype is not supported.
+        """
+        matrix = store.matrix
+        if dtype == cls.INT8:
+            scales = np.abs(matrix).max(axis=1) / 127
+            scales[scales == 0] = 1
+            codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+            scales = scales.astype(np.float32)
+        elif dtype == cls.FLOAT16:
+            codes, scales = matrix.astype(np.float16), None
+        else:
+            raise ValueError(f"Unsupported quantization dtype: {dtype}.")
+        return cls(codes, scales, store, rescore_candidates)
+
+    @classmethod
+    def load(
+        cls, directory: str, rescore_candidates: int = RESCORE_CANDIDATES
+    ) -> "QuantizedEmbeddingStore":
+        """
+        Load a store saved with `save`. The quantized vectors are read into memory,
+        the full-precision ones are memory-mapped.
+
+        :param directory: The directory the store was saved to.
+        :param rescore_candidates: The number of best candidates to rescore exactly.
+        :return: The loaded QuantizedEmbeddingStore.
+        """
+        scales_path = os.path.join(directory, "scales.npy")
+        return cls(
+            codes=np.load(os.path.join(directory, "codes.npy")),
+            scales=np.load(scales_path) if os.path.exists(scales_path) else None,
+            full=EmbeddingStore.load(os.path.join(directory, "full.npy")),
+            rescore_candidates=rescore_candidates,
+        )
+
+    def save(self, directory: str):
+        """
+        Save the quantized vectors, their scales and the full-precision store as `.npy` files.
+
+        :param directory: The directory to save to, created when missing.
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "codes.npy"), self.codes)
+        if self.scales is not None:
+            np.save(os.path.join(directory, "scales.npy"), self.scales)
+        self.full.save(os.path.join(directory, "full.npy"))
+
+    def similarities(self, query: Sequence[float]) -> np.ndarray:
+        """
+        Compute the approximate cosine similarity of the query to every stored embedding.
+
+        :param query: The query embedding.
+        :return: A float32 array with one similarity per stored embedding.
+        """
+        query = self.full.prepare_query(query)
+        similarities = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self.BLOCK_SIZE):
+            end = min(start + self.BLOCK_SIZE, len(self))
+            similarities[start:end] = self.codes[start:end].astype(np.float32) @ query
+        if self.scales is not None:
+            similarities *= self.scales
+        return similarities
+
+    def search(self, query: Sequence[float], k: int = None) -> np.ndarray:
+        """
+        Find the indices of the stored embeddings most similar to the query.
+        The best candidates on the quantized vectors, at least `k` of them, are reordered
+        by their exact similarity; without `k` the rest follow in approximate order.
+
+        :param query: The query embedding.
+        :param k: The number of indices to return, all of them by default.
+        :return: The indices ordered from the most to the least similar.
+        """
+        approximate = self.similarities(query)
+        n_candidates = min(len(self), max(self.rescore_candidates, k or 0))
+        if n_candidates == 0:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = np.sort(
+            np.argpartition(-approximate, n_candidates - 1)[:n_candidates]
+        )
+        exact = self.full.matrix[candidates] @ self.full.prepare_query(query)
+        candidates = candidates[np.argsort(-exact, kind="stable")]
+        if k is not None:
+            return candidates[:k]
+
+        rest = np.ones(len(self), dtype=bool)
+        rest[candidates] = False
+        rest = np.flatnonzero(rest)
+        rest = rest[np.argsort(-approximate[rest], kind="stable")]
+        return np.concatenate([candidates, rest])
+
+    @property
+    def dim(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The number of bytes held in memory, excluding the full-precision store on disk.
+        """
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class IVFFlatIndex(AbstractEmbeddingStore):
+    """
+    Inverted-file index over normalized embeddings: the embeddings are clustered
+    with spherical k-means and kept in one contiguous list per centroid.
+    A search scores the query against the centroids, then exactly against
+    the embeddings of the `n_probe` most similar lists only,
+    so it reads about `n_probe / n_lists` of the embeddings.
+    """
+
+    N_PROBE = 8
+    # Vectors per list aimed at when the number of lists is not given.
+    LIST_SIZE = 256
+    # Vectors per list sampled to train the centroids, bounding the k-means cost.
+    TRAIN_SAMPLE_PER_LIST = 64
+    MAX_ITER = 20
+    RANDOM_STATE = 0
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        list_vectors: Sequence[np.ndarray],
+        list_ids: Sequence[np.ndarray],
+        n_probe: int = N_PROBE,
+        projection: AbstractProjection = None,
+    ):
+        """
+        Initialize the index from its lists. Use `from_store` to build it from an EmbeddingStore.
+
+        :param centroids: The (n_lists, d) float32 normalized centroids.
+        :param list_vectors: The (m, d) float32 normalized embeddings of each list.
+        :param list_ids: The int64 indices of each list's embeddings.
+        :param n_probe: The number of lists searched per query.
+        :param projection: The fitted projection the embeddings were reduced with, if any.
+        :raises ValueError: If the lists do not match the centroids or n_probe is not positive.
+        """
+        if len(list_vectors) != len(centroids) or len(list_ids) != len(centroids):
+            raise ValueError("There must be one list of vectors and ids per centroid.")
+        if n_probe < 1:
+            raise ValueError(f"Number of probed lists must be ≥ 1. Given: {n_probe}.")
+        self.centroids = centroids
+        self.list_vectors = list(list_vectors)
+        self.list_ids = list(list_ids)
+        self.n_probe = n_probe
+        self.projection = projection
+        self._size = sum(len(ids) for ids in self.list_ids)
+
+    @classmethod
+    def from_store(
+        cls,
+        store: EmbeddingStore,
+        n_lists: int = None,
+        n_probe: int = N_PROBE,
+        max_iter: int = MAX_ITER,
+    ) -> "IVFFlatIndex":
+        """
+        Build an index over the normalized embeddings of a store.
+
+        :param store: The store to index; its rows keep their indices.
+        :param n_lists: The number of lists, about one per `LIST_SIZE` embeddings by default.
+        :param n_probe: The number of lists searched per query.
+        :param max_iter: The maximum number of k-means iterations.
+        :return: A new IVFFlatIndex.
+        :raises ValueError: If the number of lists is not positive.
+        """
+        matrix = np.asarray(store.matrix)
+        if n_lists is None:
+            n_lists = max(1, len(matrix) // cls.LIST_SIZE)
+        if n_lists < 1:
+            raise ValueError(f"Number of lists must be ≥ 1. Given: {n_lists}.")
+        n_lists = min(n_lists, max(1, len(matrix)))
+
+        centroids = np.zeros((n_lists, store.dim), dtype=np.float32)
+        if len(matrix):
+            rng = np.random.default_rng(cls.RANDOM_STATE)
+            sample_size = min(len(matrix), n_lists * cls.TRAIN_SAMPLE_PER_LIST)
+            sample = matrix[np.sort(rng.choice(len(matrix), sample_size, False))]
+            kmeans = KMeans(
+                n_clusters=n_lists,
+                n_init=1,
+                max_iter=max_iter,
+                random_state=cls.RANDOM_STATE,
+            ).fit(sample)
+            centroids = _normalize_rows(kmeans.cluster_centers_.astype(np.float32))
+
+        index = cls(
+            centroids=centroids,
+            list_vectors=[np.empty((0, store.dim), np.float32)] * n_lists,
+            list_ids=[np.empty(0, np.int64)] * n_lists,
+            n_probe=n_probe,
+            projection=store.projection,
+        )
+        index._insert(matrix, np.arange(len(matrix), dtype=np.int64))
+        return index
+
+    @classmethod
+    def load(cls, directory: str, n_probe: int = N_PROBE) -> "IVFFlatIndex":
+        """
+        Load an index saved with `save`, its embeddings memory-mapped.
+
+        :param directory: The directory the index was saved to.
+        :param n_probe: The number of lists searched per query.
+        :return: The loaded IVFFlatIndex.
+        """
+        offsets = np.load(os.path.join(directory, "list_offsets.npy"))
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        ids = np.load(os.path.join(directory, "ids.npy"))
+        projection_path = os.path.join(directory, "projection.npz")
+        return cls(
+            centroids=np.load(os.path.join(directory, "centroids.npy")),
+            list_vectors=np.split(vectors, offsets[1:-1]),
+            list_ids=np.split(ids, offsets[1:-1]),
+            n_probe=n_probe,
+            projection=(
+                load_projection(projection_path)
+                if os.path.exists(projection_path)
+                else None
+            ),
+        )
+
+    def save(self, directory: str):
+        """
+        Save the centroids and the lists, back to back, as `.npy` files.
+
+        :param directory: The directory to save to, created when missing.
+        """
+        os.makedirs(directory, exist_ok=True)
+        sizes = [len(ids) for ids in self.list_ids]
+        np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+        np.save(os.path.join(directory, "vectors.npy"), np.vstack(self.list_vectors))
+        np.save(os.path.join(directory, "ids.npy"), np.concatenate(self.list_ids))
+        np.save(
+            os.path.join(directory, "list_offsets.npy"),
+            np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+        )
+        if self.projection is not None:
+            self.projection.save(os.path.join(directory, "projection.npz"))
+
+    def add(
+        self, embeddings: Union[np.ndarray, Sequence[Sequence[float]]]
+    ) -> np.ndarray:
+        """
+        Insert raw embeddings into the lists of their nearest centroids, without retraining.
+        They get the next indices after the stored ones.
+
+        :param embeddings: An (n, d) matrix or a sequence of n embeddings at the original dimensions.
+        :return: The indices given to the embeddings.
+        """
+        vectors = _normalize_rows(np.array(embeddings, dtype=np.float32, ndmin=2))
+        if self.projection is not None:
+            vectors = self.projection.transform(vectors)
+        ids = np.arange(self._size, self._size + len(vectors), dtype=np.int64)
+        self._insert(vectors, ids)
+        return ids
+
+    def prepare_query(self, query: Sequence[float]) -> np.ndarray:
+        """
+        Normalize the query embedding and project it like the indexed embeddings.
+        """
+        query = _normalize_rows(np.asarray(query, dtype=np.float32))
+        if self.projection is not None:
+            query = self.projection.transform(query)
+        return query
+
+    def similarities(self, query: Sequence[float]) -> np.ndarray:
+        """
+        Compute the exact cosine similarity of the query to every indexed embedding.
+
+        :param query: The query embedding.
+        :return: A float32 array with one similarity per indexed embedding.
+        """
+        query = self.prepare_query(query)
+        similarities = np.zeros(len(self), dtype=np.float32)
+        for vectors, ids in zip(self.list_vectors, self.list_ids):
+            similarities[ids] = vectors @ query
+        return similarities
+
+    def search(
+        self, query: Sequence[float], k: int = None, n_probe: int = None
+    ) -> np.ndarray:
+        """
+        Find the indices of the indexed embeddings most similar to the query.
+        The embeddings of the `n_probe` lists nearest to the query are ranked exactly;
+        without `k` the embeddings of the other lists follow, list by list.
+
+        :param query: The query embedding.
+        :param k: The number of indices to return, all of them by default.
+        :param n_probe: The number of lists searched, the index's `n_probe` by default.
+        :return: The indices ordered from the most to the least similar.
+        """
+        query = self.prepare_query(query)
+        lists = np.argsort(-(self.centroids @ query), kind="stable")
+        probed, unprobed = np.split(lists, [n_probe or self.n_probe])
+
+        ids = np.concatenate([self.list_ids[idx] for idx in probed])
+        scores = np.concatenate([self.list_vectors[idx] @ query for idx in probed])
+        order = np.lexsort((ids, -scores))
+        candidates = ids[order]
+        if k is not None:
+            return candidates[:k]
+        rest = [self.list_ids[idx] for idx in unprobed]
+        return np.concatenate([candidates, *rest])
+
+    def _insert(self, vectors: np.ndarray, ids: np.ndarray):
+        """
+        Append normalized vectors with their indices to the lists of their nearest centroids.
+        """
+        if not len(vectors):
+            return
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        for list_idx in np.unique(assignments):
+            rows = np.flatnonzero(assignments == list_idx)
+            self.list_vectors[list_idx] = np.concatenate(
+                [self.list_vectors[list_idx], vectors[rows]]
+            )
+            self.list_ids[list_idx] = np.concatenate(
+                [self.list_ids[list_idx], ids[rows]]
+            )
+        self._size += len(vectors)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.centroids.nbytes
+            + sum(vectors.nbytes for vectors in self.list_vectors)
+            + sum(ids.nbytes for ids in self.list_ids)
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class QuantizationReport(NamedTuple):
+    """
+    Memory and search quality of a quantized store against its full-precision store.
+    """
+
+    dtype: str
+    full_nbytes: int
+    quantized_nbytes: int
+    recall_at_k: float
+    rescored_recall_at_k: float
+    k: int
+
+    @property
+    def memory_saved(self) -> float:
+        return 1 - self.quantized_nbytes / self.full_nbytes if self.full_nbytes else 0.0
+
+
+def quantization_report(
+    store: QuantizedEmbeddingStore, queries: Sequence[Sequence[float]], k: int = 10
+) -> QuantizationReport:
+    """
+    Measure the memory saved by a quantized store and its recall@k against exact search
+    on its full-precision store, both on the quantized vectors alone and after rescoring.
+
+    :param store: The quantized store.
+    :param queries: The query embeddings to search with.
+    :param k: The number of results compared per query.
+    :return: The QuantizationReport.
+    """
+    hits = rescored_hits = total = 0
+    for query in queries:
+        expected = set(store.full.search(query, k=k).tolist())
+        approximate = top_k(store.similarities(query), k)
+        hits += len(expected.intersection(approximate.tolist()))
+        rescored_hits += len(expected.intersection(store.search(query, k=k).tolist()))
+        total += len(expected)
+
+    return QuantizationReport(
+        dtype=str(store.codes.dtype),
+        full_nbytes=store.full.nbytes,
+        quantized_nbytes=store.nbytes,
+        recall_at_k=hits / total if total else 1.0,
+        rescored_recall_at_k=rescored_hits / total if total else 1.0,
+        k=k,
+    )
+
+
+class DimensionReport(NamedTuple):
+    """
+    Memory and search quality of a store reduced to fewer dimensions against the full store.
+    """
+
+    method: str
+    dim: int
+    full_nbytes: int
+    reduced_nbytes: int
+    recall_at_k: float
+    k: int
+
+    @property
+    def memory_saved(self) -> float:
+        return 1 - self.reduced_nbytes / self.full_nbytes if self.full_nbytes else 0.0
+
+
+def dimension_report(
+    embeddings: Union[np.ndarray, Sequence[Sequence[float]]],
+    queries: Sequence[Sequence[float]],
+    dims: Sequence[int],
+    k: int = 10,
+    method: str = "pca",
+) -> Sequence[DimensionReport]:
+    """
+    Measure the recall@k lost by reducing the embeddings to each of the target dimensions,
+    against exact search at the full dimensions.
+
+    :param embeddings: The corpus embeddings, one per row.
+    :param queries: The query embeddings to search with, ideally held out from the corpus.
+    :param dims: The target dimensions to measure.
+    :param k: The number of results compared per query.
+    :param method: "pca" to project onto principal components, "prefix" to truncate.
+    :return: One DimensionReport per target dimension, in the given order.
+    :raises ValueError: If the method is not supported.
+    """
+    if method not in PROJECTIONS:
+        raise ValueError(
+            f"Projection method must be one of {sorted(PROJECTIONS)}. Given: {method}."
+        )
+    full = EmbeddingStore.from_embeddings(embeddings)
+    expected = [set(full.search(query, k=k).tolist()) for query in queries]
+    total = sum(len(ids) for ids in expected)
+
+    reports = []
+    for dim in dims:
+        reduced = EmbeddingStore.from_embeddings(embeddings, PROJECTIONS[method](dim))
+        hits = sum(
+            len(ids.intersection(reduced.search(query, k=k).tolist()))
+            for ids, query in zip(expected, queries)
+        )
+        reports.append(
+            DimensionReport(
+                method=method,
+                dim=dim,
+                full_nbytes=full.nbytes,
+                reduced_nbytes=reduced.nbytes,
+                recall_at_k=hits / total if total else 1.0,
+                k=k,
+            )
+        )
+    return reports
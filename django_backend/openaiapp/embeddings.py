@@ -1,9 +1,21 @@
+import asyncio
+import random
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Sequence, Union
 
+import aiohttp
 import openai
 import numpy as np
 from pandas import DataFrame
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.random_projection import SparseRandomProjection
+
+from openaiapp.caches import EmbeddingCache
+from openaiapp.chunks import ChunkCollection
+from openaiapp.rate_limiters import RateLimiter
 
 
 class AbstractEmbeddings(ABC):
@@ -25,8 +37,12 @@ class TextEmbeddings(AbstractEmbeddings):
     Concrete class for creating text embeddings using OpenAI API.
     """
 
-    def __init__(self, embedding_engine: str):
+    def __init__(self, embedding_engine: str, cache: EmbeddingCache = None):
+        """
+        Initialize the text embeddings, optionally backed by a persistent embedding cache.
+        """
         self.embedding_engine = embedding_engine
+        self.cache = cache
 
     def create_embeddings(self, input: str) -> List[float]:
         """
@@ -35,13 +51,41 @@ class TextEmbeddings(AbstractEmbeddings):
         :param input: The input text to create an embedding for.
         :return: The embedding as a list of floats.
         """
+        if self.cache is not None:
+            cached = self.cache.get(self.embedding_engine, input)
+            if cached is not None:
+                return cached.tolist()
         try:
             response = openai.Embedding.create(
                 input=input, engine=self.embedding_engine
             )
-            return response["data"][0]["embedding"]
+            embedding = response["data"][0]["embedding"]
         except Exception as e:
             raise RuntimeError(f"Error in creating text embedding: {e}.")
+        if self.cache is not None:
+            self.cache.set(self.embedding_engine, input, embedding)
+        return embedding
+
+    def create_embeddings_batch(self, input: List[str]) -> List[List[float]]:
+        """
+        Create embeddings for many input texts with a single request.
+
+        :param input: The non-empty input texts to create embeddings for.
+        :return: The embeddings as lists of floats, in the order of the input texts.
+        """
+        try:
+            response = openai.Embedding.create(
+                input=input, engine=self.embedding_engine
+            )
+            data = sorted(response["data"], key=lambda item: item["index"])
+            embeddings = [item["embedding"] for item in data]
+        except Exception as e:
+            raise RuntimeError(f"Error in creating text embeddings batch: {e}.")
+        if len(embeddings) != len(input):
+            raise RuntimeError(
+                f"Error in creating text embeddings batch: expected {len(input)} embeddings, got {len(embeddings)}."
+            )
+        return embeddings
 
 
 class DataFrameEmbeddings(AbstractEmbeddings):
@@ -49,34 +93,476 @@ class DataFrameEmbeddings(AbstractEmbeddings):
     Concrete class for creating embeddings for a DataFrame using OpenAI API.
     """
 
-    def __init__(self, embedding_engine: str):
+    BATCH_SIZE = 1
+    BATCH_TOKENS = 131072
+
+    def __init__(
+        self,
+        embedding_engine: str,
+        tokenizer=None,
+        batch_size: int = BATCH_SIZE,
+        batch_tokens: int = BATCH_TOKENS,
+        cache: EmbeddingCache = None,
+    ):
+        """
+        Initialize the DataFrame embeddings.
+
+        With `batch_size` > 1 many texts are sent in each embeddings request,
+        up to `batch_size` texts and `batch_tokens` tokens, as counted by `tokenizer`.
+        A text over the token budget is sent in a request of its own.
+        With a `cache`, only texts missing from it are sent and their embeddings are stored.
+        """
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be ≥ 1. Given: {batch_size}.")
+        if batch_tokens < 1:
+            raise ValueError(f"Batch tokens must be ≥ 1. Given: {batch_tokens}.")
+        if batch_size > 1 and tokenizer is None:
+            raise ValueError("A tokenizer is required for batched embeddings.")
         self.embedding_engine = embedding_engine
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.cache = cache
 
-    def create_embeddings(self, input: DataFrame) -> DataFrame:
+    def create_embeddings(
+        self, input: Union[DataFrame, ChunkCollection]
+    ) -> Union[DataFrame, ChunkCollection]:
         """
         Create embeddings for the 'text' column of the given DataFrame.
+        A ChunkCollection gets its embeddings attached as a float32 matrix instead.
+        Rows with empty texts are not sent and get no embedding.
 
-        :param input: DataFrame with a 'text' column.
-        :return: DataFrame with an additional 'embeddings' column.
+        :param input: DataFrame with a 'text' column or a ChunkCollection.
+        :return: DataFrame with an additional 'embeddings' column or the ChunkCollection.
         """
+        if isinstance(input, ChunkCollection):
+            return self._create_collection_embeddings(input)
         try:
-            input["embeddings"] = input["text"].apply(
-                lambda text: TextEmbeddings(self.embedding_engine).create_embeddings(
-                    text
-                )
-                if text
-                else None
-            )
+            texts = input["text"].tolist()
+            n_tokens = input["n_tokens"].tolist() if "n_tokens" in input else None
+            input["embeddings"] = self._embed_texts(texts, n_tokens)
             return input
         except Exception as e:
             raise RuntimeError(f"Error in creating DataFrame embeddings: {e}.")
 
-    def flatten_embeddings(self, input: DataFrame) -> DataFrame:
+    def flatten_embeddings(
+        self, input: Union[DataFrame, ChunkCollection]
+    ) -> Union[DataFrame, ChunkCollection]:
         """
         Flatten the 'embeddings' column of the DataFrame into a numpy array.
+        A ChunkCollection already keeps its embeddings in a matrix and is returned as is.
 
-        :param input: DataFrame with an 'embeddings' column.
-        :return: DataFrame with the 'embeddings' column flattened.
+        :param input: DataFrame with an 'embeddings' column or a ChunkCollection.
+        :return: DataFrame with the 'embeddings' column flattened or the ChunkCollection.
         """
+        if isinstance(input, ChunkCollection):
+            return input
         input["embeddings"] = input["embeddings"].apply(np.array)
         return input
+
+    def _create_collection_embeddings(self, input: ChunkCollection) -> ChunkCollection:
+        """
+        Create embeddings for the chunks of the collection and attach them as a float32 matrix.
+        Empty chunks get zero vectors. When the embedding of a non-empty chunk could not be
+        created the collection is left without embeddings and the failed chunks are reported;
+        the embeddings already created are kept in the cache, when there is one.
+
+        :raises RuntimeError: If an embedding could not be created.
+        """
+        texts = list(input.iter_texts())
+        try:
+            embeddings = self._embed_texts(texts, input.n_tokens)
+        except Exception as e:
+            raise RuntimeError(f"Error in creating ChunkCollection embeddings: {e}.")
+        failed = [
+            idx
+            for idx, (text, embedding) in enumerate(zip(texts, embeddings))
+            if text and embedding is None
+        ]
+        if failed:
+            raise RuntimeError(
+                f"Error in creating ChunkCollection embeddings: "
+                f"no embedding for chunks {failed}."
+            )
+        present = [embedding for embedding in embeddings if embedding is not None]
+        if present:
+            missing = np.zeros(len(present[0]))
+            input.set_embeddings(
+                np.asarray(
+                    [missing if emb is None else emb for emb in embeddings],
+                    dtype=np.float32,
+                )
+            )
+        return input
+
+    def _embed_texts(
+        self, texts: List[str], n_tokens: Sequence[int] = None
+    ) -> List[Union[List[float], None]]:
+        """
+        Create the embedding of each text, `None` for empty texts.
+        Cached embeddings are looked up and new ones stored in bulk.
+        """
+        embeddings = [None] * len(texts)
+        indices = [idx for idx, text in enumerate(texts) if text]
+
+        if self.cache is not None:
+            cached = self.cache.get_many(
+                self.embedding_engine, [texts[idx] for idx in indices]
+            )
+            for idx, embedding in zip(indices, cached):
+                if embedding is not None:
+                    embeddings[idx] = embedding.tolist()
+            indices = [idx for idx in indices if embeddings[idx] is None]
+
+        self._request_embeddings(texts, indices, n_tokens, embeddings)
+
+        if self.cache is not None:
+            created = [idx for idx in indices if embeddings[idx] is not None]
+            self.cache.put_many(
+                self.embedding_engine,
+                [texts[idx] for idx in created],
+                [embeddings[idx] for idx in created],
+            )
+        return embeddings
+
+    def _request_embeddings(
+        self,
+        texts: List[str],
+        indices: List[int],
+        n_tokens: Sequence[int],
+        embeddings: list,
+    ):
+        """
+        Request the embeddings of the texts at the indices and put them in place in `embeddings`.
+        In the batched mode results are mapped back to the texts by their position.
+        """
+        text_embeddings = TextEmbeddings(self.embedding_engine)
+
+        if self.batch_size == 1:
+            for idx in indices:
+                embeddings[idx] = text_embeddings.create_embeddings(texts[idx])
+            return
+
+        counts = self._count_tokens(texts, indices, n_tokens)
+        for batch in _token_batches(
+            indices, counts, self.batch_size, self.batch_tokens
+        ):
+            batch_embeddings = text_embeddings.create_embeddings_batch(
+                [texts[idx] for idx in batch]
+            )
+            for idx, embedding in zip(batch, batch_embeddings):
+                embeddings[idx] = embedding
+
+    def _count_tokens(
+        self, texts: List[str], indices: List[int], n_tokens: Sequence[int]
+    ) -> List[int]:
+        """
+        Get the token counts of the texts at the indices, counting them when not given.
+        """
+        if n_tokens is None:
+            return self.tokenizer.count_tokens_batch([texts[idx] for idx in indices])
+        return [int(n_tokens[idx]) for idx in indices]
+
+
+class LocalEmbeddings(DataFrameEmbeddings):
+    """
+    Offline embeddings computed on the CPU, for benchmarks, load tests and CI without network access.
+    Texts are hashed into word unigram and bigram counts, which are projected to `dim`
+    dimensions by a sparse random projection with a fixed seed and L2-normalized.
+    The projection needs no fitting, so the embeddings are deterministic and share
+    one space across objects and processes. Accepts strings as well as DataFrames
+    and ChunkCollections.
+    """
+
+    ENGINE = "local-hashing"
+    DIM = 256
+    N_FEATURES = 2**18
+    BATCH_SIZE = 1024
+    RANDOM_STATE = 0
+
+    # Projections shared by all instances, keyed by (n_features, dim).
+    _projections = {}
+    _projections_lock = threading.Lock()
+
+    def __init__(
+        self,
+        dim: int = DIM,
+        n_features: int = N_FEATURES,
+        batch_size: int = BATCH_SIZE,
+    ):
+        """
+        Initialize the local embeddings.
+
+        :param dim: The number of dimensions of the embeddings.
+        :param n_features: The number of hashed text features.
+        :param batch_size: The number of texts vectorized at once.
+        """
+        if dim < 1:
+            raise ValueError(f"Embedding dimensions must be ≥ 1. Given: {dim}.")
+        super().__init__(embedding_engine=self.ENGINE)
+        self.dim = dim
+        self.n_features = n_features
+        self.local_batch_size = batch_size
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm="l2",
+        )
+        self.projection = self._get_projection(n_features, dim)
+
+    def create_embeddings(
+        self, input: Union[str, DataFrame, ChunkCollection]
+    ) -> Union[List[float], DataFrame, ChunkCollection]:
+        """
+        Create an embedding for the given text, or embeddings for the texts of a DataFrame or ChunkCollection.
+
+        :param input: A text, a DataFrame with a 'text' column or a ChunkCollection.
+        :return: The embedding as a list of floats, or the input with its embeddings.
+        """
+        if isinstance(input, str):
+            return self.encode([input])[0].tolist()
+        return super().create_embeddings(input)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed the texts in batches.
+
+        :param texts: The texts to embed.
+        :return: An (n, dim) float32 matrix of L2-normalized embeddings.
+        """
+        batches = []
+        for start in range(0, len(texts), self.local_batch_size):
+            end = start + self.local_batch_size
+            batches.append(
+                self.projection.transform(self.vectorizer.transform(texts[start:end]))
+            )
+        if not batches:
+            return np.empty((0, self.dim), dtype=np.float32)
+        embeddings = np.vstack(batches).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
+
+    def _request_embeddings(
+        self,
+        texts: List[str],
+        indices: List[int],
+        n_tokens: Sequence[int],
+        embeddings: list,
+    ):
+        """
+        Embed the texts at the indices locally and put the embeddings in place in `embeddings`.
+        """
+        for idx, embedding in zip(indices, self.encode([texts[i] for i in indices])):
+            embeddings[idx] = embedding.tolist()
+
+    @classmethod
+    def _get_projection(cls, n_features: int, dim: int) -> SparseRandomProjection:
+        """
+        Get the shared random projection, generating it on first use.
+        """
+        with cls._projections_lock:
+            key = (n_features, dim)
+            if key not in cls._projections:
+                cls._projections[key] = SparseRandomProjection(
+                    n_components=dim,
+                    dense_output=True,
+                    random_state=cls.RANDOM_STATE,
+                ).fit(csr_matrix((1, n_features)))
+            return cls._projections[key]
+
+
+class EmbeddingFailure(NamedTuple):
+    """
+    A text whose embedding could not be created.
+    """
+
+    index: int
+    attempts: int
+    error: str
+
+
+class AsyncDataFrameEmbeddings(DataFrameEmbeddings):
+    """
+    Creates embeddings for a DataFrame with many concurrent requests over one pooled HTTP session.
+    Requests are held back to the requests-per-minute and tokens-per-minute limits
+    and retried with jittered exponential backoff on rate limit and server errors.
+    A failing request does not fail the whole input: its rows get no embedding
+    and are reported in `failures`.
+    """
+
+    CONCURRENCY = 16
+    REQUESTS_PER_MINUTE = 3000
+    TOKENS_PER_MINUTE = 1000000
+    MAX_RETRIES = 6
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 60.0
+
+    def __init__(
+        self,
+        embedding_engine: str,
+        tokenizer,
+        batch_size: int = DataFrameEmbeddings.BATCH_SIZE,
+        batch_tokens: int = DataFrameEmbeddings.BATCH_TOKENS,
+        cache: EmbeddingCache = None,
+        concurrency: int = CONCURRENCY,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+    ):
+        """
+        Initialize the asynchronous DataFrame embeddings.
+
+        The tokenizer counts the tokens of each request for the tokens-per-minute limit.
+        At most `concurrency` requests are in flight at once.
+        """
+        if tokenizer is None:
+            raise ValueError("A tokenizer is required for asynchronous embeddings.")
+        super().__init__(
+            embedding_engine=embedding_engine,
+            tokenizer=tokenizer,
+            batch_size=batch_size,
+            batch_tokens=batch_tokens,
+            cache=cache,
+        )
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be ≥ 1. Given: {concurrency}.")
+        if max_retries < 0:
+            raise ValueError(f"Max retries must be ≥ 0. Given: {max_retries}.")
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failures = []
+
+    def _request_embeddings(
+        self,
+        texts: List[str],
+        indices: List[int],
+        n_tokens: Sequence[int],
+        embeddings: list,
+    ):
+        """
+        Request the embeddings of the texts at the indices, `None` is left for failed requests.
+        The failed requests of the last call are recorded in `failures`, one entry per text.
+        Called from a thread with a running event loop, which cannot be blocked on,
+        the requests run on an event loop of their own in a worker thread.
+        """
+        requests = self._request_embeddings_async(texts, indices, n_tokens, embeddings)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(requests)
+            return
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(asyncio.run, requests).result()
+
+    async def _request_embeddings_async(
+        self,
+        texts: List[str],
+        indices: List[int],
+        n_tokens: Sequence[int],
+        embeddings: list,
+    ):
+        """
+        Send the batches of texts concurrently and put their embeddings in place.
+        """
+        counts = self._count_tokens(texts, indices, n_tokens)
+        token_counts = dict(zip(indices, counts))
+
+        limiter = RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failures = []
+
+        async def embed_batch(batch: List[int]):
+            batch_texts = [texts[idx] for idx in batch]
+            batch_tokens = sum(token_counts[idx] for idx in batch)
+            async with semaphore:
+                for attempt in range(self.max_retries + 1):
+                    await limiter.acquire(batch_tokens)
+                    try:
+                        response = await openai.Embedding.acreate(
+                            input=batch_texts, engine=self.embedding_engine
+                        )
+                        data = sorted(response["data"], key=lambda item: item["index"])
+                        for idx, item in zip(batch, data):
+                            embeddings[idx] = item["embedding"]
+                        return
+                    except Exception as e:
+                        if attempt == self.max_retries or not _is_retryable(e):
+                            failures.extend(
+                                EmbeddingFailure(idx, attempt + 1, str(e))
+                                for idx in batch
+                            )
+                            return
+                    await asyncio.sleep(self._backoff_delay(attempt))
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            session_token = openai.aiosession.set(session)
+            try:
+                await asyncio.gather(
+                    *(
+                        embed_batch(batch)
+                        for batch in _token_batches(
+                            indices, counts, self.batch_size, self.batch_tokens
+                        )
+                    )
+                )
+            finally:
+                openai.aiosession.reset(session_token)
+
+        self.failures = sorted(failures)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """
+        Get a random delay before the retry after the given attempt ("full jitter").
+        """
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Tell whether a failed embeddings request is worth retrying:
+    rate limit, timeout, connection and server (5xx) errors are.
+    """
+    if isinstance(
+        error,
+        (
+            openai.error.RateLimitError,
+            openai.error.ServiceUnavailableError,
+            openai.error.Timeout,
+            openai.error.TryAgain,
+            openai.error.APIConnectionError,
+            asyncio.TimeoutError,
+            aiohttp.ClientError,
+        ),
+    ):
+        return True
+    http_status = getattr(error, "http_status", None)
+    return http_status is not None and (http_status == 429 or http_status >= 500)
+
+
+def _token_batches(
+    indices: List[int], n_tokens: List[int], batch_size: int, batch_tokens: int
+) -> Iterator[List[int]]:
+    """
+    Group consecutive indices into batches of at most `batch_size` items
+    and `batch_tokens` tokens. An item over the token budget gets a batch of its own.
+    """
+    batch, batch_total = [], 0
+    for idx, count in zip(indices, n_tokens):
+        if batch and (len(batch) == batch_size or batch_total + count > batch_tokens):
+            yield batch
+            batch, batch_total = [], 0
+        batch.append(idx)
+        batch_total += count
+    if batch:
+        yield batch
@@ -1,3 +1,4 @@
+import threading
 from abc import ABC, abstractmethod
 from typing import List, Union
 
@@ -7,9 +8,23 @@ import openai
 from pandas import DataFrame
 from scrapy.spiders import CrawlSpider
 
+from openaiapp.caches import EmbeddingCache, TTLCache
+from openaiapp.embedding_stores import (
+    AbstractEmbeddingStore,
+    AbstractProjection,
+    IVFFlatIndex,
+)
 from openaiapp.spiders import NewsSpider
-from openaiapp.tokenizers import AbstractTokenizer, Tokenizer
-from openaiapp.embeddings import AbstractEmbeddings, TextEmbeddings, DataFrameEmbeddings
+from openaiapp.tokenizers import AbstractTokenizer, Tokenizer, TokenizerRegistry
+from openaiapp.vector_db import VectorDBReader
+from openaiapp.retrieval import RetrievalIndex
+from openaiapp.embeddings import (
+    AbstractEmbeddings,
+    AsyncDataFrameEmbeddings,
+    LocalEmbeddings,
+    TextEmbeddings,
+    DataFrameEmbeddings,
+)
 from openaiapp.text_preparators import (
     AbstractTextPreparatory,
     TextPreparatory,
@@ -60,15 +75,30 @@ class TokenizerFactory(Factory):
     """
 
     TOKENIZER_ENCODING = "cl100k_base"
+    NUM_THREADS = Tokenizer.NUM_THREADS
+    COUNT_CACHE_SIZE = Tokenizer.COUNT_CACHE_SIZE
 
-    def create_object(self, encoding: str = TOKENIZER_ENCODING) -> AbstractTokenizer:
+    def create_object(
+        self,
+        encoding: str = TOKENIZER_ENCODING,
+        num_threads: int = NUM_THREADS,
+        count_cache_size: int = COUNT_CACHE_SIZE,
+    ) -> AbstractTokenizer:
         """
         Create a Tokenizer object with the specified encoding.
 
         :param encoding: The encoding to be used by the tokenizer.
-        :return: An instance of Tokenizer.
+        :param num_threads: The number of worker threads for batch tokenization.
+        :param count_cache_size: The number of token counts to memoize.
+        :return: An instance of Tokenizer, shared process-wide when created with defaults.
         """
-        return Tokenizer(encoding=encoding)
+        if (num_threads, count_cache_size) == (self.NUM_THREADS, self.COUNT_CACHE_SIZE):
+            return TokenizerRegistry.get_tokenizer(encoding)
+        return Tokenizer(
+            encoding=encoding,
+            num_threads=num_threads,
+            count_cache_size=count_cache_size,
+        )
 
 
 class EmbeddingsFactory(Factory):
@@ -77,27 +107,96 @@ class EmbeddingsFactory(Factory):
     """
 
     EMBEDDING_ENGINE = "text-embedding-ada-002"
+    LOCAL_EMBEDDING_ENGINE = LocalEmbeddings.ENGINE
+    BATCH_SIZE = DataFrameEmbeddings.BATCH_SIZE
+    BATCH_TOKENS = DataFrameEmbeddings.BATCH_TOKENS
+    CONCURRENCY = AsyncDataFrameEmbeddings.CONCURRENCY
+    REQUESTS_PER_MINUTE = AsyncDataFrameEmbeddings.REQUESTS_PER_MINUTE
+    TOKENS_PER_MINUTE = AsyncDataFrameEmbeddings.TOKENS_PER_MINUTE
+
+    _cache = None
+    _cache_lock = threading.Lock()
 
     def create_object(
         self,
         input_type: Union[str, DataFrame],
         embedding_engine: str = EMBEDDING_ENGINE,
+        batch_size: int = BATCH_SIZE,
+        batch_tokens: int = BATCH_TOKENS,
+        asynchronous: bool = False,
+        concurrency: int = CONCURRENCY,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        use_cache: bool = True,
     ) -> AbstractEmbeddings:
         """
         Create an embeddings object based on the input type.
 
         :param input_type: A string or DataFrame for which embeddings are to be created.
-        :param embedding_engine: The engine to use for creating embeddings.
+        :param embedding_engine: The engine to use for creating embeddings,
+            "local-hashing" for the offline LocalEmbeddings.
+        :param batch_size: The maximum number of DataFrame texts per embeddings request.
+        :param batch_tokens: The maximum number of DataFrame tokens per embeddings request.
+        :param asynchronous: Whether to send the DataFrame requests concurrently.
+        :param concurrency: The maximum number of concurrent requests.
+        :param requests_per_minute: The rate limit of concurrent requests per minute.
+        :param tokens_per_minute: The rate limit of concurrent request tokens per minute.
+        :param use_cache: Whether to look up and store embeddings in the persistent cache.
         :return: An instance of AbstractEmbeddings.
         :raises TypeError: If the input type is not supported.
         """
+        if (
+            input_type in (str, DataFrame)
+            and embedding_engine == self.LOCAL_EMBEDDING_ENGINE
+        ):
+            return LocalEmbeddings()
+        cache = self.get_cache() if use_cache else None
         if input_type == str:
-            return TextEmbeddings(embedding_engine=embedding_engine)
+            return TextEmbeddings(embedding_engine=embedding_engine, cache=cache)
+        elif input_type == DataFrame and asynchronous:
+            return AsyncDataFrameEmbeddings(
+                embedding_engine=embedding_engine,
+                tokenizer=TokenizerFactory().create_object(),
+                batch_size=batch_size,
+                batch_tokens=batch_tokens,
+                cache=cache,
+                concurrency=concurrency,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+            )
         elif input_type == DataFrame:
-            return DataFrameEmbeddings(embedding_engine=embedding_engine)
+            return DataFrameEmbeddings(
+                embedding_engine=embedding_engine,
+                tokenizer=TokenizerFactory().create_object(),
+                batch_size=batch_size,
+                batch_tokens=batch_tokens,
+                cache=cache,
+            )
         else:
             raise TypeError(f"Unsupported input type: {input_type}.")
 
+    @classmethod
+    def get_cache(cls) -> Union[EmbeddingCache, None]:
+        """
+        Get the process-wide persistent embedding cache configured in Django settings.
+
+        :return: The shared EmbeddingCache, or None when the cache is disabled.
+        """
+        path = getattr(settings, "OPENAI_EMBEDDING_CACHE_PATH", None)
+        if path is None:
+            return None
+        with cls._cache_lock:
+            if cls._cache is None or cls._cache.path != path:
+                cls._cache = EmbeddingCache(
+                    path=path,
+                    maxsize=getattr(
+                        settings,
+                        "OPENAI_EMBEDDING_CACHE_MAX_SIZE",
+                        EmbeddingCache.MAXSIZE,
+                    ),
+                )
+            return cls._cache
+
 
 class TextPreparatoryFactory(Factory):
     """
@@ -106,12 +205,21 @@ class TextPreparatoryFactory(Factory):
 
     MIN_TOKENS = 8
     MAX_TOKENS = 512
+    N_WORKERS = DataFrameTextPreparatory.N_WORKERS
+    PARTITION_SIZE = DataFrameTextPreparatory.PARTITION_SIZE
 
-    def create_object(self, df: DataFrame = None) -> AbstractTextPreparatory:
+    def create_object(
+        self,
+        df: DataFrame = None,
+        n_workers: int = N_WORKERS,
+        partition_size: int = PARTITION_SIZE,
+    ) -> AbstractTextPreparatory:
         """
         Create a text preparatory object, optionally based on a DataFrame.
 
         :param df: An optional DataFrame for text preparation.
+        :param n_workers: The number of worker processes for DataFrame preparation.
+        :param partition_size: The number of DataFrame rows per worker task.
         :return: An instance of AbstractTextPreparatory.
         """
         tokenizer = TokenizerFactory().create_object()
@@ -123,6 +231,8 @@ class TextPreparatoryFactory(Factory):
                 tokenizer=tokenizer,
                 min_tokens=self.MIN_TOKENS,
                 max_tokens=self.MAX_TOKENS,
+                n_workers=n_workers,
+                partition_size=partition_size,
             )
 
 
@@ -134,6 +244,13 @@ class AIQuestionAnsweringFactory(Factory):
     MODEL = "gpt-3.5-turbo-instruct"
     ANSWER_MAX_TOKENS = 256
     CONTEXT_MAX_LEN = 2048
+    QUESTION_CACHE_SIZE = 1024
+    QUESTION_CACHE_TTL = 600
+    ANN_THRESHOLD = 20000
+    ANN_N_PROBE = IVFFlatIndex.N_PROBE
+
+    _question_cache = None
+    _question_cache_lock = threading.Lock()
 
     def create_object(
         self,
@@ -143,6 +260,14 @@ class AIQuestionAnsweringFactory(Factory):
         model: str = MODEL,
         answer_max_tokens: int = ANSWER_MAX_TOKENS,
         context_max_len: int = CONTEXT_MAX_LEN,
+        fill_context: bool = False,
+        embedding_store: AbstractEmbeddingStore = None,
+        use_question_cache: bool = True,
+        projection: AbstractProjection = None,
+        vector_db: VectorDBReader = None,
+        ann_threshold: int = ANN_THRESHOLD,
+        ann_n_probe: int = ANN_N_PROBE,
+        retrieval_index: RetrievalIndex = None,
     ) -> AbstractAIQuestionAnswering:
         """
         Create an AIQuestionAnsweringBasedOnContext object.
@@ -153,6 +278,16 @@ class AIQuestionAnsweringFactory(Factory):
         :param model: The model to use for question answering.
         :param answer_max_tokens: The maximum number of tokens for the answer.
         :param context_max_len: The maximum length of the context.
+        :param fill_context: Whether to cut the first text over the limit to fill the context.
+        :param embedding_store: An optional prebuilt store of the prepared texts' embeddings.
+        :param use_question_cache: Whether to reuse question embeddings from the process-wide cache.
+        :param projection: An optional projection of the embeddings to fewer dimensions.
+        :param vector_db: An optional vector database reader to search instead of the prepared texts.
+        :param ann_threshold: The number of texts from which an approximate index is searched,
+            None to always search exactly.
+        :param ann_n_probe: The number of index lists searched per question.
+        :param retrieval_index: An optional loaded index, shared by the objects answering
+            questions over the same texts.
         :return: An instance of AIQuestionAnsweringBasedOnContext.
         """
         return AIQuestionAnsweringBasedOnContext(
@@ -162,8 +297,37 @@ class AIQuestionAnsweringFactory(Factory):
             max_tokens=answer_max_tokens,
             context_max_len=context_max_len,
             stop_sequence=stop_sequence,
+            fill_context=fill_context,
+            embedding_store=embedding_store,
+            question_cache=self.get_question_cache() if use_question_cache else None,
+            projection=projection,
+            vector_db=vector_db,
+            ann_threshold=ann_threshold,
+            ann_n_probe=ann_n_probe,
+            retrieval_index=retrieval_index,
         )
 
+    @classmethod
+    def get_question_cache(cls) -> TTLCache:
+        """
+        Get the process-wide LRU+TTL cache of question embeddings, sized from Django settings.
+
+        :return: The shared TTLCache.
+        """
+        with cls._question_cache_lock:
+            if cls._question_cache is None:
+                cls._question_cache = TTLCache(
+                    maxsize=getattr(
+                        settings,
+                        "OPENAI_QUESTION_CACHE_SIZE",
+                        cls.QUESTION_CACHE_SIZE,
+                    ),
+                    ttl=getattr(
+                        settings, "OPENAI_QUESTION_CACHE_TTL", cls.QUESTION_CACHE_TTL
+                    ),
+                )
+            return cls._question_cache
+
 
 class OpenAIAppObjectFactory(Factory):
     """
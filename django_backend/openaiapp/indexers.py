@@ -0,0 +1,268 @@
+import json
+import os
+from itertools import chain
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+
+from openaiapp.caches import content_digest
+from openaiapp.chunks import ChunkCollection
+from openaiapp.embeddings import DataFrameEmbeddings
+from openaiapp.text_preparators import TextPreparatory
+
+
+class IndexUpdate(NamedTuple):
+    """
+    Summary of one incremental index update.
+    """
+
+    documents_changed: int
+    documents_unchanged: int
+    documents_removed: int
+    chunks_embedded: int
+    chunks_reused: int
+    chunks_removed: int
+
+
+class IncrementalIndexer:
+    """
+    Keeps an embedded chunk index up to date with recrawled documents,
+    doing work proportional to what changed rather than to the corpus size.
+
+    Documents whose text hash is unchanged are skipped without re-chunking.
+    Changed documents are re-chunked, and only chunks whose text hash is new
+    for the URL are embedded; the others reuse their stored embeddings.
+    Chunks of changed or removed documents are tombstoned in place and
+    physically dropped by `compact`, which runs once tombstones pass `COMPACT_RATIO`.
+
+    Embeddings are created inline, so this indexer suits in-memory indexes built in one
+    process; served crawls are queued with `enqueue_documents` for the embedding worker.
+    """
+
+    COMPACT_RATIO = 0.25
+
+    def __init__(
+        self,
+        text_preparatory: TextPreparatory,
+        embeddings_object: DataFrameEmbeddings,
+        max_tokens: int,
+        mode: str = TextPreparatory.SENTENCES_MODE,
+        collection: ChunkCollection = None,
+        alive: np.ndarray = None,
+        document_digests: Dict[str, bytes] = None,
+    ):
+        """
+        Initialize the indexer, empty or from a stored index.
+
+        :param text_preparatory: Splits documents into chunks.
+        :param embeddings_object: Creates the embeddings of new chunks.
+        :param max_tokens: The maximum number of tokens per chunk.
+        :param mode: The chunking mode of `TextPreparatory.iter_chunks`.
+        :param collection: The stored chunks with their embeddings.
+        :param alive: The stored mask of chunks that are not tombstoned.
+        :param document_digests: The stored text hash of each indexed document URL.
+        """
+        self.text_preparatory = text_preparatory
+        self.embeddings_object = embeddings_object
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self.collection = collection
+        if collection is not None and alive is None:
+            alive = np.ones(len(collection), dtype=bool)
+        self.alive = alive
+        self.document_digests = dict(document_digests or {})
+
+    def update(
+        self, documents: Iterable[dict], remove_missing: bool = True
+    ) -> IndexUpdate:
+        """
+        Bring the index up to date with crawled `{url, text}` documents.
+        The index is only changed once the new chunks are embedded, so an update
+        that fails, e.g. on an embeddings error, can be retried with the same documents.
+
+        :param documents: The crawled documents, one per URL.
+        :param remove_missing: Whether indexed URLs absent from the documents are removed.
+        :return: The IndexUpdate summary.
+        """
+        changed, digests, seen, unchanged = [], {}, set(), 0
+        for document in documents:
+            url, text = document.get("url"), document.get("text") or ""
+            seen.add(url)
+            digest = content_digest(text)
+            if self.document_digests.get(url) == digest:
+                unchanged += 1
+                continue
+            digests[url] = digest
+            changed.append({"url": url, "text": text})
+
+        removed_urls = (
+            [url for url in self.document_digests if url not in seen]
+            if remove_missing
+            else []
+        )
+
+        stale_urls = {doc["url"] for doc in changed}.union(removed_urls)
+        stale_rows = self._live_rows_of(stale_urls)
+        # Emptied documents only lose their chunks.
+        chunks = self.text_preparatory.collect_chunks(
+            [doc for doc in changed if doc["text"]], self.max_tokens, mode=self.mode
+        )
+        embedded, reused = self._embed_new_chunks(chunks, stale_rows)
+
+        stale = [row for rows in stale_rows.values() for row in chain(*rows.values())]
+        if stale:
+            self.alive[stale] = False
+        if len(chunks):
+            self._append(chunks)
+        self.document_digests.update(digests)
+        for url in removed_urls:
+            del self.document_digests[url]
+        if self.tombstone_ratio > self.COMPACT_RATIO:
+            self.compact()
+
+        return IndexUpdate(
+            documents_changed=len(changed),
+            documents_unchanged=unchanged,
+            documents_removed=len(removed_urls),
+            chunks_embedded=embedded,
+            chunks_reused=reused,
+            chunks_removed=len(stale) - reused,
+        )
+
+    def compact(self):
+        """
+        Drop the tombstoned chunks from the stored collection.
+        """
+        if self.collection is None or self.alive.all():
+            return
+        self.collection = self.collection.take(np.flatnonzero(self.alive))
+        self.alive = np.ones(len(self.collection), dtype=bool)
+
+    def live_collection(self) -> ChunkCollection:
+        """
+        Get the collection of live chunks, e.g. for question answering, compacting it first.
+
+        :return: The ChunkCollection of live chunks.
+        """
+        self.compact()
+        if self.collection is None:
+            return ChunkCollection.from_records([])
+        return self.collection
+
+    def save(self, directory: str):
+        """
+        Save the index to a directory: the compacted chunk collection and the document hashes.
+
+        :param directory: The directory to save to, created when missing.
+        """
+        os.makedirs(directory, exist_ok=True)
+        collection = self.live_collection()
+        collection.save(os.path.join(directory, "chunks.npz"))
+        with open(os.path.join(directory, "documents.json"), "w") as file:
+            json.dump(
+                {url: digest.hex() for url, digest in self.document_digests.items()},
+                file,
+            )
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        text_preparatory: TextPreparatory,
+        embeddings_object: DataFrameEmbeddings,
+        max_tokens: int,
+        mode: str = TextPreparatory.SENTENCES_MODE,
+    ) -> "IncrementalIndexer":
+        """
+        Load an index saved with `save`.
+
+        :param directory: The directory the index was saved to.
+        :return: The IncrementalIndexer over the stored index.
+        """
+        with open(os.path.join(directory, "documents.json")) as file:
+            document_digests = {
+                url: bytes.fromhex(digest) for url, digest in json.load(file).items()
+            }
+        return cls(
+            text_preparatory=text_preparatory,
+            embeddings_object=embeddings_object,
+            max_tokens=max_tokens,
+            mode=mode,
+            collection=ChunkCollection.load(os.path.join(directory, "chunks.npz")),
+            document_digests=document_digests,
+        )
+
+    @property
+    def tombstone_ratio(self) -> float:
+        if self.collection is None or not len(self.collection):
+            return 0.0
+        return 1 - self.alive.mean()
+
+    def _live_rows_of(self, urls: set) -> Dict[str, Dict[bytes, List[int]]]:
+        """
+        Map each of the URLs to the text hashes of its live chunks and their rows.
+        """
+        rows = {url: {} for url in urls}
+        if self.collection is None or not urls:
+            return rows
+        url_ids = [
+            url_id for url_id, url in enumerate(self.collection.urls) if url in urls
+        ]
+        for row in np.flatnonzero(
+            np.isin(self.collection.url_ids, url_ids) & self.alive
+        ):
+            url = self.collection.urls[self.collection.url_ids[row]]
+            digest = content_digest(self.collection.get_text(row))
+            rows[url].setdefault(digest, []).append(row)
+        return rows
+
+    def _embed_new_chunks(
+        self, chunks: ChunkCollection, stale_rows: Dict[str, Dict[bytes, List[int]]]
+    ) -> Tuple[int, int]:
+        """
+        Attach embeddings to the chunks, reusing the stored embedding of an identical
+        chunk of the same URL and embedding the rest.
+        Returns the numbers of embedded and reused chunks.
+        """
+        if not len(chunks):
+            return 0, 0
+
+        available = {
+            url: {digest: list(digest_rows) for digest, digest_rows in rows.items()}
+            for url, rows in stale_rows.items()
+        }
+        new_rows, reused_rows, reused_from = [], [], []
+        for row, chunk in enumerate(chunks):
+            stored = available[chunk.url].get(content_digest(chunk.text))
+            if stored:
+                reused_rows.append(row)
+                reused_from.append(stored.pop())
+            else:
+                new_rows.append(row)
+
+        embeddings = None
+        if new_rows:
+            new_embeddings = self.embeddings_object.create_embeddings(
+                chunks.take(new_rows)
+            ).embeddings
+            embeddings = np.zeros((len(chunks), new_embeddings.shape[1]), np.float32)
+            embeddings[new_rows] = new_embeddings
+        if reused_rows:
+            if embeddings is None:
+                embeddings = np.zeros(
+                    (len(chunks), self.collection.embeddings.shape[1]), np.float32
+                )
+            embeddings[reused_rows] = self.collection.embeddings[reused_from]
+        chunks.set_embeddings(embeddings)
+        return len(new_rows), len(reused_rows)
+
+    def _append(self, chunks: ChunkCollection):
+        """
+        Append embedded chunks to the stored collection.
+        """
+        if self.collection is None:
+            self.collection = chunks
+            self.alive = np.ones(len(chunks), dtype=bool)
+            return
+        self.collection = ChunkCollection.concat([self.collection, chunks])
+        self.alive = np.concatenate([self.alive, np.ones(len(chunks), dtype=bool)])
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pandas import DataFrame
+
+from openaiapp.factories import EmbeddingsFactory
+from openaiapp.workers import EmbeddingWorker
+
+
+class Command(BaseCommand):
+    help = (
+        "Embed the chunks queued as embedding jobs, in batches claimed with row locks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engine", default=settings.OPENAI_EMBEDDING_JOBS_ENGINE)
+        parser.add_argument(
+            "--batch-size", type=int, default=EmbeddingWorker.BATCH_SIZE
+        )
+        parser.add_argument(
+            "--request-size",
+            type=int,
+            default=64,
+            help="The maximum number of texts per embeddings request.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=EmbeddingsFactory.CONCURRENCY
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=EmbeddingWorker.POLL_INTERVAL
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after this many batches instead of running until interrupted.",
+        )
+        parser.add_argument(
+            "--vector-db",
+            default=settings.OPENAI_VECTOR_DB_PATH,
+            help="The vector database directory finished sources are published to.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Stop once the queue is empty instead of polling it.",
+        )
+
+    def handle(self, *args, **options):
+        embeddings_object = EmbeddingsFactory().create_object(
+            DataFrame,
+            embedding_engine=options["engine"],
+            batch_size=options["request_size"],
+            asynchronous=options["engine"] != EmbeddingsFactory.LOCAL_EMBEDDING_ENGINE,
+            concurrency=options["concurrency"],
+        )
+        worker = EmbeddingWorker(
+            embeddings_object,
+            batch_size=options["batch_size"],
+            vector_db_path=options["vector_db"],
+        )
+        self.stdout.write(f"Embedding worker {worker.worker_id} started.")
+        processed = worker.run(
+            poll_interval=options["poll_interval"],
+            max_batches=options["max_batches"],
+            stop_when_empty=options["once"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
@@ -0,0 +1,59 @@
+from typing import List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from openaiapp.factories import TextPreparatoryFactory
+from openaiapp.spiders import NewsSpider
+from openaiapp.workers import enqueue_documents
+
+
+class Command(BaseCommand):
+    help = (
+        "Crawl a news domain and queue the chunks of its pages as embedding jobs; "
+        "the embeddings are created by the embedding_worker command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("domain")
+        parser.add_argument(
+            "--start-url",
+            action="append",
+            dest="start_urls",
+            help="A URL the crawl starts from, the domain root by default.",
+        )
+        parser.add_argument(
+            "--max-tokens", type=int, default=TextPreparatoryFactory.MAX_TOKENS
+        )
+        parser.add_argument("--engine", default=settings.OPENAI_EMBEDDING_JOBS_ENGINE)
+
+    def handle(self, *args, **options):
+        start_urls = options["start_urls"] or [f"https://{options['domain']}/"]
+        articles = self.crawl(options["domain"], start_urls)
+        enqueued = enqueue_documents(
+            articles,
+            text_preparatory=TextPreparatoryFactory().create_object(),
+            max_tokens=options["max_tokens"],
+            engine=options["engine"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Crawled {len(articles)} pages and enqueued {enqueued} jobs."
+            )
+        )
+
+    def crawl(self, domain: str, start_urls: List[str]) -> List[dict]:
+        """
+        Crawl the domain with a NewsSpider, blocking until the crawl is finished.
+
+        :param domain: The domain to crawl.
+        :param start_urls: The URLs the crawl starts from.
+        :return: The crawled `{url, text}` articles.
+        """
+        from scrapy.crawler import CrawlerProcess
+
+        process = CrawlerProcess()
+        crawler = process.create_crawler(NewsSpider)
+        process.crawl(crawler, domain=domain, start_urls=start_urls)
+        process.start()
+        return crawler.spider.articles
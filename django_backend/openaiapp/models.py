@@ -1,18 +1,297 @@
-def save_flatten_embeddings_to_vector_db():
+import threading
+from datetime import timedelta
+from typing import Iterable, List, Set, Union
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+import numpy as np
+from pandas import DataFrame
+
+from openaiapp.caches import content_digest
+from openaiapp.chunks import ChunkCollection
+from openaiapp.vector_db import VectorDBReader, VectorDBWriter
+
+
+class EmbeddingJobQuerySet(models.QuerySet):
+    def enqueue_chunks(self, chunks: Iterable[dict], engine: str) -> int:
+        """
+        Enqueue `{url, text, n_tokens}` chunk records for embedding, replacing the jobs
+        of their sources. Chunks already queued or embedded for their source are kept,
+        and jobs of chunks no longer present are deleted. Sources that only lost chunks
+        get a publish job, so the worker republishes them to the vector database.
+
+        :param chunks: The chunk records, such as those yielded by `TextPreparatory.iter_chunks`.
+        :param engine: The embedding engine the chunks are embedded with.
+        :return: The number of chunk jobs created or requeued.
+        """
+        by_source = {}
+        for chunk in chunks:
+            digest = content_digest(chunk["text"]).hex()
+            by_source.setdefault(chunk["url"], {}).setdefault(digest, chunk)
+        if not by_source:
+            return 0
+
+        with transaction.atomic(using=self.db):
+            jobs = self.filter(engine=engine, source__in=list(by_source)).exclude(
+                text=""
+            )
+            existing = {}
+            for job_id, source, digest, status in jobs.values_list(
+                "id", "source", "digest", "status"
+            ):
+                existing[(source, digest)] = (job_id, status)
+
+            stale = {
+                job_id: source
+                for (source, digest), (job_id, _) in existing.items()
+                if digest not in by_source[source]
+            }
+            failed = {
+                job_id: source
+                for (source, digest), (job_id, status) in existing.items()
+                if status == EmbeddingJob.FAILED and digest in by_source[source]
+            }
+            self.filter(id__in=list(stale)).delete()
+            self.filter(id__in=list(failed)).update(
+                status=EmbeddingJob.PENDING, attempts=0, error=""
+            )
+            created = self.bulk_create(
+                EmbeddingJob(
+                    source=source,
+                    text=chunk["text"],
+                    n_tokens=chunk["n_tokens"],
+                    digest=digest,
+                    engine=engine,
+                )
+                for source, source_chunks in by_source.items()
+                for digest, chunk in source_chunks.items()
+                if (source, digest) not in existing
+            )
+            queued = {job.source for job in created}.union(failed.values())
+            self._enqueue_publish(set(stale.values()) - queued, engine)
+        return len(created) + len(failed)
+
+    def enqueue_removals(self, sources: Iterable[str], engine: str):
+        """
+        Delete the chunk jobs of removed sources, e.g. emptied or deleted articles,
+        and queue publish jobs removing them from the vector database.
+
+        :param sources: The removed sources.
+        :param engine: The embedding engine of the jobs.
+        """
+        sources = set(sources)
+        if not sources:
+            return
+        with transaction.atomic(using=self.db):
+            self.filter(engine=engine, source__in=list(sources)).exclude(
+                text=""
+            ).delete()
+            self._enqueue_publish(sources, engine)
+
+    def _enqueue_publish(self, sources: set, engine: str):
+        """
+        Queue a publish job, a job without text, for each of the sources without one pending.
+        """
+        if not sources:
+            return
+        pending = self.filter(
+            engine=engine,
+            source__in=list(sources),
+            text="",
+            status=EmbeddingJob.PENDING,
+        ).values_list("source", flat=True)
+        self.bulk_create(
+            EmbeddingJob(
+                source=source,
+                text="",
+                n_tokens=0,
+                digest=content_digest("").hex(),
+                engine=engine,
+            )
+            for source in sources.difference(pending)
+        )
+
+    def claim(
+        self, batch_size: int, worker_id: str, lock_timeout: float
+    ) -> List["EmbeddingJob"]:
+        """
+        Claim up to `batch_size` pending jobs, oldest first, for one worker.
+        Rows are locked with SKIP LOCKED, so concurrent workers claim disjoint batches.
+        Running jobs whose lock is older than `lock_timeout` seconds are claimed again,
+        as their worker is assumed dead.
+
+        :param batch_size: The maximum number of jobs to claim.
+        :param worker_id: The identifier of the claiming worker.
+        :param lock_timeout: The number of seconds after which a running job is reclaimed.
+        :return: The claimed jobs, marked running.
+        """
+        now = timezone.now()
+        claimable = Q(status=EmbeddingJob.PENDING) | Q(
+            status=EmbeddingJob.RUNNING,
+            locked_at__lt=now - timedelta(seconds=lock_timeout),
+        )
+        with transaction.atomic(using=self.db):
+            ids = list(
+                self.select_for_update(skip_locked=True)
+                .filter(claimable)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            self.filter(id__in=ids).update(
+                status=EmbeddingJob.RUNNING,
+                locked_by=worker_id,
+                locked_at=now,
+                attempts=F("attempts") + 1,
+            )
+        return list(self.filter(id__in=ids).order_by("id"))
+
+    def busy_sources(self, engine: str, sources: Iterable[str]) -> Set[str]:
+        """
+        Get the sources among the given ones with jobs still pending or running.
+
+        :param engine: The embedding engine.
+        :param sources: The sources to check.
+        :return: The sources whose embeddings are not all settled yet.
+        """
+        return set(
+            self.filter(
+                engine=engine,
+                source__in=list(sources),
+                status__in=[EmbeddingJob.PENDING, EmbeddingJob.RUNNING],
+            ).values_list("source", flat=True)
+        )
+
+    def done_collection(
+        self, engine: str, sources: Iterable[str] = None
+    ) -> ChunkCollection:
+        """
+        Pack the embedded chunks of an engine into a ChunkCollection, e.g. for an EmbeddingStore.
+
+        :param engine: The embedding engine.
+        :param sources: The sources whose chunks are packed, all of them by default.
+        :return: The ChunkCollection with the embeddings attached, in job order.
+        """
+        jobs = self.filter(engine=engine, status=EmbeddingJob.DONE)
+        if sources is not None:
+            jobs = jobs.filter(source__in=list(sources))
+        jobs = list(
+            jobs.order_by("id").values_list("source", "text", "n_tokens", "embedding")
+        )
+        collection = ChunkCollection.from_records(
+            {"url": source, "text": text, "n_tokens": n_tokens}
+            for source, text, n_tokens, _ in jobs
+        )
+        if jobs:
+            collection.set_embeddings(
+                np.vstack(
+                    [np.frombuffer(embedding, np.float32) for *_, embedding in jobs]
+                )
+            )
+        return collection
+
+
+class EmbeddingJob(models.Model):
     """
-    # TODO.
-    Should be implemented in the future.
-    Should save flatten embeddings to the vector database.
+    A chunk of text queued to be embedded by the `embedding_worker` command.
+    The embedding is stored on the job as float32 bytes once it is done.
+    A job without text is a publish job: it has nothing to embed and only makes
+    the worker republish its source to the vector database, e.g. once the source was removed.
     """
-    raise NotImplementedError
 
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    source = models.CharField(max_length=500)
+    text = models.TextField()
+    n_tokens = models.PositiveIntegerField()
+    digest = models.CharField(max_length=64)
+    engine = models.CharField(max_length=100)
+
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    embedding = models.BinaryField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    objects = EmbeddingJobQuerySet.as_manager()
+
+    def set_embedding(self, embedding: Iterable[float]):
+        """
+        Store the embedding as float32 bytes.
+        """
+        self.embedding = np.asarray(embedding, dtype=np.float32).tobytes()
+
+    def get_embedding(self) -> np.ndarray:
+        """
+        Get the stored embedding as a float32 array.
+        """
+        return np.frombuffer(self.embedding, dtype=np.float32)
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+    class Meta:
+        verbose_name = "embedding job"
+        verbose_name_plural = "Embedding jobs"
+        indexes = [
+            models.Index(fields=["status", "id"]),
+            models.Index(fields=["engine", "source"]),
+        ]
 
-def get_vector_db_model():
+
+def save_flatten_embeddings_to_vector_db(
+    input: Union[DataFrame, ChunkCollection],
+    path: str = None,
+    replace_sources: bool = True,
+) -> int:
+    """
+    Save flatten embeddings to the vector database, committed as a new segment.
+
+    :param input: DataFrame with 'text', 'n_tokens', flattened 'embeddings' and optional 'url'
+        columns, or a ChunkCollection with embeddings.
+    :param path: The vector database directory, the OPENAI_VECTOR_DB_PATH setting by default.
+    :param replace_sources: Whether stored chunks of the same URLs are deleted.
+    :return: The committed version of the vector database.
+    """
+    chunks = (
+        input
+        if isinstance(input, ChunkCollection)
+        else ChunkCollection.from_dataframe(input)
+    )
+    writer = VectorDBWriter(path or settings.OPENAI_VECTOR_DB_PATH)
+    return writer.append(chunks, replace_sources=replace_sources)
+
+
+def get_vector_db_model(path: str = None) -> VectorDBReader:
     """
-    # TODO.
-    Should be implemented in the future.
-    Get the vector database model.
+    Get the vector database model: a process-wide read-only reader
+    of the latest committed version, reopened only when a new version is committed.
 
+    :param path: The vector database directory, the OPENAI_VECTOR_DB_PATH setting by default.
     :return: The vector database model.
     """
-    raise NotImplementedError
+    path = path or settings.OPENAI_VECTOR_DB_PATH
+    with _vector_db_lock:
+        reader = _vector_db_readers.get(path)
+        reader = VectorDBReader(path) if reader is None else reader.refresh()
+        _vector_db_readers[path] = reader
+        return reader
+
+
+_vector_db_readers = {}
+_vector_db_lock = threading.Lock()
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket refilled continuously at a fixed rate.
+    Waiters are served one at a time, in the order they arrived.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize a full bucket.
+
+        :param rate: The number of tokens added per second.
+        :param capacity: The maximum number of tokens the bucket holds.
+        :raises ValueError: If the rate or the capacity is not positive.
+        """
+        if rate <= 0:
+            raise ValueError(f"Bucket rate must be > 0. Given: {rate}.")
+        if capacity <= 0:
+            raise ValueError(f"Bucket capacity must be > 0. Given: {capacity}.")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        """
+        Wait until the amount of tokens is available and take it.
+        An amount over the capacity takes the whole bucket.
+
+        :param amount: The number of tokens to take.
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            if self._tokens < amount:
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= amount
+
+    def _refill(self):
+        """
+        Add the tokens accrued since the last update.
+        """
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+class RateLimiter:
+    """
+    Asyncio limiter of both requests per minute and tokens per minute,
+    as enforced by the OpenAI API.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        """
+        Initialize the limiter with full buckets, allowing an initial burst of one minute's quota.
+
+        :param requests_per_minute: The maximum number of requests per minute.
+        :param tokens_per_minute: The maximum number of tokens per minute.
+        """
+        self.requests = TokenBucket(
+            rate=requests_per_minute / 60, capacity=requests_per_minute
+        )
+        self.tokens = TokenBucket(
+            rate=tokens_per_minute / 60, capacity=tokens_per_minute
+        )
+
+    async def acquire(self, n_tokens: int):
+        """
+        Wait until one request of `n_tokens` tokens fits both limits.
+
+        :param n_tokens: The number of tokens the request sends.
+        """
+        await self.requests.acquire(1)
+        await self.tokens.acquire(n_tokens)
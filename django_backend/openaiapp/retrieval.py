@@ -0,0 +1,145 @@
+from typing import Callable, Sequence, Union
+
+import numpy as np
+from pandas import DataFrame
+
+from openaiapp.chunks import ChunkCollection
+from openaiapp.embedding_stores import (
+    AbstractEmbeddingStore,
+    AbstractProjection,
+    EmbeddingStore,
+    IVFFlatIndex,
+)
+from openaiapp.vector_db import VectorDBReader
+
+
+class RetrievalIndex:
+    """
+    A read-only snapshot of the texts searched for question contexts: their embedding store,
+    token counts and texts, frozen when the index is loaded.
+
+    Nothing is written after loading and a search allocates only local arrays,
+    so one index serves concurrent questions from any number of threads without locks.
+    Texts changed after loading are seen by loading a new index.
+    """
+
+    def __init__(
+        self,
+        store: AbstractEmbeddingStore,
+        n_tokens: Sequence[int],
+        get_text: Callable[[int], str],
+        source: Union[DataFrame, ChunkCollection, VectorDBReader] = None,
+    ):
+        """
+        Initialize the RetrievalIndex object, copying the token counts into a read-only array.
+
+        :param store: The embedding store, one row per text.
+        :param n_tokens: The number of tokens of each text.
+        :param get_text: A function getting the text at an index.
+        :param source: The prepared texts or vector database reader the index was loaded from.
+        :raises ValueError: If the store and the token counts differ in length.
+        """
+        n_tokens = np.array(n_tokens, dtype=np.int64)
+        if len(store) != len(n_tokens):
+            raise ValueError(
+                f"Store and token counts must be of the same length. "
+                f"Given: {len(store)} and {len(n_tokens)}."
+            )
+        n_tokens.setflags(write=False)
+        if isinstance(store, EmbeddingStore):
+            store.matrix.setflags(write=False)
+
+        self.store = store
+        self.n_tokens = n_tokens
+        self.get_text = get_text
+        self.source = source
+        self._shortest = max(1, int(n_tokens.min())) if len(n_tokens) else 1
+        self._empty = int(np.count_nonzero(n_tokens <= 0))
+
+    @classmethod
+    def from_prepared(
+        cls,
+        prepared: Union[DataFrame, ChunkCollection],
+        embedding_store: AbstractEmbeddingStore = None,
+        projection: AbstractProjection = None,
+        ann_threshold: int = None,
+        ann_n_probe: int = IVFFlatIndex.N_PROBE,
+    ) -> "RetrievalIndex":
+        """
+        Load an index from prepared texts with their token counts and embeddings.
+        DataFrame texts are copied, so later changes to the DataFrame do not reach the index.
+
+        :param prepared: DataFrame with 'text', 'n_tokens' and 'embeddings' columns,
+            or a ChunkCollection with embeddings.
+        :param embedding_store: An optional prebuilt store of the prepared embeddings,
+            built anew when it is missing or no longer matches the number of texts.
+        :param projection: An optional projection of the embeddings to fewer dimensions.
+        :param ann_threshold: The number of texts from which an IVFFlatIndex is searched,
+            None to always search exactly.
+        :param ann_n_probe: The number of index lists searched per question.
+        :return: A new RetrievalIndex.
+        """
+        store = embedding_store
+        if store is None or len(store) != len(prepared):
+            if isinstance(prepared, ChunkCollection):
+                store = EmbeddingStore.from_collection(prepared, projection=projection)
+            else:
+                store = EmbeddingStore.from_dataframe(prepared, projection=projection)
+            if ann_threshold is not None and len(store) >= ann_threshold:
+                store = IVFFlatIndex.from_store(store, n_probe=ann_n_probe)
+
+        if isinstance(prepared, ChunkCollection):
+            return cls(store, prepared.n_tokens, prepared.get_text, source=prepared)
+
+        texts = prepared["text"].to_numpy(dtype=object, copy=True)
+        texts.setflags(write=False)
+        return cls(
+            store, prepared["n_tokens"].values, texts.__getitem__, source=prepared
+        )
+
+    @classmethod
+    def from_vector_db(
+        cls,
+        reader: VectorDBReader,
+        ann_threshold: int = None,
+        ann_n_probe: int = IVFFlatIndex.N_PROBE,
+    ) -> "RetrievalIndex":
+        """
+        Load an index of a vector database version; the reader is already a read-only snapshot.
+        From `ann_threshold` chunks the segments are searched through the IVFFlatIndex
+        the writer persisted with them; nothing is trained when the index is loaded.
+
+        :param reader: The vector database reader.
+        :param ann_threshold: The number of chunks from which the search is approximate,
+            None to always search the reader exactly.
+        :param ann_n_probe: The number of index lists searched per segment and question.
+        :return: A new RetrievalIndex searching the reader.
+        """
+        store = reader
+        if ann_threshold is not None and len(reader) >= ann_threshold:
+            store = reader.approximate(n_probe=ann_n_probe)
+        return cls(store, reader.n_tokens, reader.get_text, source=reader)
+
+    def candidates_needed(self, context_max_len: int) -> int:
+        """
+        Get the number of most similar texts that can take part in a context:
+        as many of the shortest texts as fit the context max length,
+        plus one text cut to fill the context and the texts without tokens.
+
+        :param context_max_len: The maximum number of context tokens.
+        :return: The number of candidates to search for.
+        """
+        return context_max_len // self._shortest + 1 + self._empty
+
+    def search(self, query: Sequence[float], k: int = None) -> np.ndarray:
+        """
+        Find the indices of the texts most similar to the query.
+
+        :param query: The query embedding.
+        :param k: The number of indices to return, all of them by default.
+        :return: The indices ordered from the most to the least similar.
+        """
+        return self.store.search(query, k=k)
+
+    def __len__(self) -> int:
+        return len(self.n_tokens)
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.utils.html import strip_tags
+
+from openaiapp.models import EmbeddingJob
+
+
+def get_article_source(article) -> str:
+    """
+    Get the source key under which the chunks of an article are queued.
+    """
+    return f"article:{article.uid}"
+
+
+def enqueue_article_embeddings(sender, instance, **kwargs):
+    """
+    Queue the chunks of a saved article for the embedding worker.
+    Unpublished articles have their queued and embedded chunks removed.
+    Nothing is embedded or written to the vector database during the save.
+    """
+    from openaiapp.factories import TextPreparatoryFactory
+    from openaiapp.workers import enqueue_documents
+
+    text = strip_tags(instance.content) if instance.is_published else ""
+    enqueue_documents(
+        [{"url": get_article_source(instance), "text": text}],
+        text_preparatory=TextPreparatoryFactory().create_object(),
+        max_tokens=TextPreparatoryFactory.MAX_TOKENS,
+        engine=settings.OPENAI_EMBEDDING_JOBS_ENGINE,
+    )
+
+
+def delete_article_embeddings(sender, instance, **kwargs):
+    """
+    Remove the queued and embedded chunks of a deleted article,
+    queuing its removal from the vector database for the embedding worker.
+    """
+    source = get_article_source(instance)
+    EmbeddingJob.objects.filter(source=source).exclude(
+        engine=settings.OPENAI_EMBEDDING_JOBS_ENGINE
+    ).delete()
+    EmbeddingJob.objects.enqueue_removals(
+        [source], engine=settings.OPENAI_EMBEDDING_JOBS_ENGINE
+    )
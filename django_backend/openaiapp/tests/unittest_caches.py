@@ -0,0 +1,232 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import TestCase
+
+import numpy as np
+
+from openaiapp.caches import EmbeddingCache, LRUCache, TTLCache, text_digest
+
+
+class LRUCacheTestCase(TestCase):
+    def test_should_evict_least_recently_used_entry(self):
+        """
+        Test that the cache evicts the least recently used entry once it is full.
+        """
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(1, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(3, cache.get("c"))
+        self.assertEqual(2, len(cache))
+
+    def test_should_count_hits_and_misses(self):
+        """
+        Test that the cache statistics report hits, misses and the hit rate.
+        """
+        cache = LRUCache(maxsize=4)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+
+        info = cache.info()
+        self.assertEqual((1, 1, 4, 1), tuple(info))
+        self.assertEqual(0.5, info.hit_rate)
+
+    def test_should_store_nothing_with_zero_size(self):
+        """
+        Test that a zero-sized cache never stores values.
+        """
+        cache = LRUCache(maxsize=0)
+        cache.set("a", 1)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, len(cache))
+
+    def test_should_raise_exception_with_negative_size(self):
+        """
+        Test that a negative maximum size raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            LRUCache(maxsize=-1)
+
+    def test_should_text_digest_be_stable(self):
+        """
+        Test that equal texts get equal digests and different texts get different digests.
+        """
+        self.assertEqual(text_digest("Abra kadabra."), text_digest("Abra kadabra."))
+        self.assertNotEqual(text_digest("Abra kadabra."), text_digest("Abra kadabra"))
+
+
+class EmbeddingCacheTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with a cache in a temporary directory.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache", "embeddings.sqlite3")
+        self.cache = EmbeddingCache(path=self.path, maxsize=3)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_should_store_and_get_many_embeddings(self):
+        """
+        Test that embeddings are stored as float32 and looked up in bulk, in order.
+        """
+        self.cache.put_many("engine", ["a", "b"], [[1.0, 2.0], [3.0, 4.0]])
+        found = self.cache.get_many("engine", ["b", "missing", "a"])
+
+        self.assertEqual([3.0, 4.0], found[0].tolist())
+        self.assertIsNone(found[1])
+        self.assertEqual([1.0, 2.0], found[2].tolist())
+        self.assertEqual(np.float32, found[0].dtype)
+
+    def test_should_key_embeddings_by_engine(self):
+        """
+        Test that an embedding is only found for the engine it was stored with.
+        """
+        self.cache.set("engine", "a", [1.0])
+
+        self.assertIsNone(self.cache.get("other-engine", "a"))
+        self.assertEqual([1.0], self.cache.get("engine", "a").tolist())
+
+    def test_should_evict_least_recently_used_embeddings(self):
+        """
+        Test that the cache evicts the least recently used embeddings over its size cap.
+        """
+        self.cache.put_many("engine", ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+        self.cache.get("engine", "a")
+        self.cache.put_many("engine", ["d"], [[4.0]])
+
+        self.assertEqual(3, len(self.cache))
+        self.assertIsNone(self.cache.get("engine", "b"))
+        self.assertIsNotNone(self.cache.get("engine", "a"))
+
+    def test_should_count_entries_without_scanning(self):
+        """
+        Test that writes keep the entry count from their row counts, without counting the table,
+        and that replaced embeddings are not counted twice.
+        """
+        self.cache.put_many("engine", ["a", "b"], [[1.0], [2.0]])
+        statements = []
+        self.cache._connection.set_trace_callback(statements.append)
+        self.cache.put_many("engine", ["b", "c", "c"], [[5.0], [3.0], [3.0]])
+        self.cache.put_many("engine", ["d"], [[4.0]])
+        self.cache._connection.set_trace_callback(None)
+
+        self.assertFalse([sql for sql in statements if "COUNT" in sql])
+        self.assertEqual(3, self.cache._count)
+        self.assertEqual(3, len(self.cache))
+        self.assertIsNone(self.cache.get("engine", "a"))
+        self.assertEqual([5.0], self.cache.get("engine", "b").tolist())
+
+        reopened = EmbeddingCache(path=self.path, maxsize=3)
+        self.assertEqual(3, reopened._count)
+        reopened.close()
+
+    def test_should_count_hits_and_misses(self):
+        """
+        Test that bulk lookups update the hit rate.
+        """
+        self.cache.put_many("engine", ["a"], [[1.0]])
+        self.cache.get_many("engine", ["a", "b", "a", "c"])
+
+        info = self.cache.info()
+        self.assertEqual((2, 2, 3, 1), tuple(info))
+        self.assertEqual(0.5, info.hit_rate)
+
+    def test_should_persist_embeddings(self):
+        """
+        Test that embeddings survive reopening the cache file.
+        """
+        self.cache.set("engine", "a", [1.0, 2.0])
+        self.cache.close()
+        self.cache = EmbeddingCache(path=self.path, maxsize=3)
+
+        self.assertEqual([1.0, 2.0], self.cache.get("engine", "a").tolist())
+
+
+class TTLCacheTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with a cache on a fake clock.
+        """
+        self.now = 0.0
+        self.cache = TTLCache(maxsize=2, ttl=10, clock=lambda: self.now)
+
+    def test_should_expire_entries_after_ttl(self):
+        """
+        Test that an entry is a hit before its TTL passes and a miss after.
+        """
+        self.cache.set("a", 1)
+        self.now = 9.9
+        self.assertEqual(1, self.cache.get("a"))
+        self.now = 10.0
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual((1, 1), tuple(self.cache.info())[:2])
+
+    def test_should_evict_least_recently_used_entry(self):
+        """
+        Test that the size cap still evicts the least recently used entry.
+        """
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(1, self.cache.get("a"))
+
+    def test_should_share_concurrent_computations(self):
+        """
+        Test that concurrent misses on one key run the computation once.
+        """
+        calls, started, release = [], threading.Event(), threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "value"
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(self.cache.get_or_compute, "key", compute)
+                for _ in range(4)
+            ]
+            started.wait(5)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(["value"] * 4, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual("value", self.cache.get_or_compute("key", compute))
+        self.assertEqual(1, len(calls))
+
+    def test_should_not_cache_failed_computations(self):
+        """
+        Test that a failing computation raises and is retried by the next caller.
+        """
+
+        def fail():
+            raise RuntimeError("No embedding.")
+
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_compute("key", fail)
+        self.assertEqual(2, self.cache.get_or_compute("key", lambda: 2))
+
+    def test_should_raise_exception_with_invalid_ttl(self):
+        """
+        Test that a non-positive TTL raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            TTLCache(maxsize=1, ttl=0)
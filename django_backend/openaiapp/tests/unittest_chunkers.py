@@ -0,0 +1,185 @@
+from django.test import TestCase
+
+import numpy as np
+
+from openaiapp.chunkers import (
+    AbstractChunker,
+    SentenceChunker,
+    SlidingWindowChunker,
+    TextChunk,
+    pack_token_counts,
+)
+from openaiapp.factories import TokenizerFactory
+
+
+class SentenceChunkerTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with sample texts and a sentence chunker instance.
+        """
+        self.sentence = (
+            "Fact-based news, exclusive video footage, photos and updated maps."
+        )
+        self.sample_text = (
+            "Fact-based news, exclusive video footage, photos and updated maps. "
+            "Abra kadabra abra kadabra YEAH. "
+            "Fact-based news, exclusive video footage, photos and updated maps."
+        )
+        self.tokenizer = TokenizerFactory().create_object()
+        self.chunker = SentenceChunker(tokenizer=self.tokenizer)
+
+    def test_should_chunker_inherit_abstract(self):
+        """
+        Test that the sentence chunker is an instance of the AbstractChunker class.
+        """
+        self.assertIsInstance(self.chunker, AbstractChunker)
+
+    def test_should_return_chunks_with_token_counts(self):
+        """
+        Test that chunks are packed from whole sentences and returned with their token counts.
+        """
+        chunks = self.chunker.chunk_text(self.sample_text, max_tokens=30)
+
+        self.assertEqual(
+            [
+                "Fact-based news, exclusive video footage, photos and updated maps. "
+                "Abra kadabra abra kadabra YEAH.",
+                self.sentence,
+            ],
+            [chunk.text for chunk in chunks],
+        )
+        for chunk in chunks:
+            self.assertIsInstance(chunk, TextChunk)
+            self.assertLessEqual(chunk.n_tokens, 30)
+        self.assertEqual(
+            self.tokenizer.count_tokens(self.sample_text),
+            sum(chunk.n_tokens for chunk in chunks),
+        )
+
+    def test_should_reuse_given_tokens(self):
+        """
+        Test that chunking already encoded text gives the same chunks as encoding it again.
+        """
+        tokens = self.tokenizer.tokenize_text(self.sample_text)
+
+        self.assertEqual(
+            self.chunker.chunk_text(self.sample_text, max_tokens=14),
+            self.chunker.chunk_text(self.sample_text, max_tokens=14, tokens=tokens),
+        )
+
+    def test_should_split_oversized_sentence_on_token_windows(self):
+        """
+        Test that a sentence longer than the limit is cut into token windows instead of failing.
+        """
+        chunks = self.chunker.chunk_text(self.sentence, max_tokens=5)
+
+        self.assertEqual([5, 5, 3], [chunk.n_tokens for chunk in chunks])
+        self.assertEqual(
+            self.sentence.replace(" ", ""),
+            "".join(chunk.text for chunk in chunks).replace(" ", ""),
+        )
+
+    def test_should_chunk_non_ascii_text(self):
+        """
+        Test that sentence boundaries are found in text with multi-byte characters.
+        """
+        text = "Žalgiris laimėjo čempionatą. Ąžuolas žaliuoja!"
+        chunks = self.chunker.chunk_text(text, max_tokens=16)
+
+        self.assertEqual(
+            ["Žalgiris laimėjo čempionatą.", "Ąžuolas žaliuoja!"],
+            [chunk.text for chunk in chunks],
+        )
+
+    def test_should_raise_exception_with_non_positive_max_tokens(self):
+        """
+        Test that a non-positive token limit raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            self.chunker.chunk_text(self.sample_text, max_tokens=0)
+
+
+class SlidingWindowChunkerTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with a sample text and its tokens.
+        """
+        self.sample_text = (
+            "Fact-based news, exclusive video footage, photos and updated maps. "
+            "Abra kadabra abra kadabra YEAH."
+        )
+        self.tokenizer = TokenizerFactory().create_object()
+        self.tokens = self.tokenizer.tokenize_text(self.sample_text)
+
+    def test_should_cut_overlapping_windows(self):
+        """
+        Test that windows have the requested size and share `overlap_tokens` tokens with the previous one.
+        """
+        chunker = SlidingWindowChunker(tokenizer=self.tokenizer, overlap_tokens=3)
+        chunks = chunker.chunk_text(self.sample_text, max_tokens=10)
+
+        self.assertIsInstance(chunker, AbstractChunker)
+        for chunk in chunks[:-1]:
+            self.assertEqual(10, chunk.n_tokens)
+        for previous, current in zip(chunks, chunks[1:]):
+            self.assertEqual(list(previous.tokens[-3:]), list(current.tokens[:3]))
+        self.assertEqual(self.tokens[-1], chunks[-1].tokens[-1])
+
+    def test_should_windows_be_uint32_views_of_one_buffer(self):
+        """
+        Test that window tokens are uint32 views into a single buffer rather than copies.
+        """
+        chunker = SlidingWindowChunker(tokenizer=self.tokenizer, overlap_tokens=2)
+        chunks = chunker.chunk_text(self.sample_text, max_tokens=8)
+
+        buffer = chunks[0].tokens.base
+        self.assertIsNotNone(buffer)
+        for chunk in chunks:
+            self.assertEqual(np.uint32, chunk.tokens.dtype)
+            self.assertIs(buffer, chunk.tokens.base)
+            self.assertEqual(chunk.n_tokens, len(chunk.tokens))
+
+    def test_should_window_text_match_its_tokens(self):
+        """
+        Test that the text of a window decodes from its tokens.
+        """
+        chunker = SlidingWindowChunker(tokenizer=self.tokenizer)
+        chunks = chunker.chunk_text(self.sample_text, max_tokens=6, tokens=self.tokens)
+
+        for chunk in chunks:
+            decoded = self.tokenizer.decode_tokens(chunk.tokens.tolist())
+            self.assertEqual(decoded.strip(), chunk.text)
+
+    def test_should_raise_exception_with_overlap_not_smaller_than_window(self):
+        """
+        Test that a window not larger than the overlap raises a ValueError.
+        """
+        chunker = SlidingWindowChunker(tokenizer=self.tokenizer, overlap_tokens=4)
+
+        with self.assertRaises(ValueError):
+            chunker.chunk_text(self.sample_text, max_tokens=4)
+        with self.assertRaises(ValueError):
+            SlidingWindowChunker(tokenizer=self.tokenizer, overlap_tokens=-1)
+
+
+class PackTokenCountsTestCase(TestCase):
+    def test_should_pack_greedily(self):
+        """
+        Test that consecutive items are packed greedily up to the token limit.
+        """
+        self.assertEqual(
+            [0, 2, 3, 6], pack_token_counts(np.array([5, 5, 9, 3, 3, 3]), 10)
+        )
+        self.assertEqual([0, 4], pack_token_counts(np.array([0, 10, 0, 0]), 10))
+
+    def test_should_oversized_item_get_own_chunk(self):
+        """
+        Test that an item over the limit gets a chunk of its own instead of stalling the packing.
+        """
+        self.assertEqual([0, 1, 2, 3], pack_token_counts(np.array([4, 12, 4]), 10))
+
+    def test_should_pack_nothing_from_no_items(self):
+        """
+        Test that no items produce no boundaries.
+        """
+        self.assertEqual([], pack_token_counts(np.array([], dtype=np.int64), 10))
@@ -0,0 +1,303 @@
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+
+import numpy as np
+from pandas import DataFrame
+
+from openaiapp.ai_question_answering import AIQuestionAnsweringBasedOnContext
+from openaiapp.caches import TTLCache
+from openaiapp.chunks import Chunk, ChunkCollection
+from openaiapp.factories import (
+    AIQuestionAnsweringFactory,
+    EmbeddingsFactory,
+    TextPreparatoryFactory,
+    TokenizerFactory,
+)
+
+
+class ChunkCollectionTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with sample chunk records and a collection built from them.
+        """
+        self.records = [
+            {
+                "url": "a",
+                "text": "Fact-based news.",
+                "n_tokens": 4,
+                "tokens": [1, 2, 3, 4],
+            },
+            {"url": "a", "text": "Žalgiris laimėjo.", "n_tokens": 2, "tokens": [5, 6]},
+            {"url": "b", "text": "Abra kadabra.", "n_tokens": 3, "tokens": [7, 8, 9]},
+        ]
+        self.chunks = ChunkCollection.from_records(self.records, keep_tokens=True)
+
+    def test_should_pack_records_into_contiguous_arrays(self):
+        """
+        Test that records are packed into one text blob and typed columns.
+        """
+        self.assertEqual(3, len(self.chunks))
+        self.assertIsInstance(self.chunks.text_blob, bytes)
+        self.assertEqual(np.int32, self.chunks.n_tokens.dtype)
+        self.assertEqual(np.int32, self.chunks.url_ids.dtype)
+        self.assertEqual(np.uint32, self.chunks.tokens.dtype)
+        self.assertEqual(["a", "b"], self.chunks.urls)
+        self.assertEqual([0, 0, 1], self.chunks.url_ids.tolist())
+
+    def test_should_chunk_views_read_from_collection(self):
+        """
+        Test that chunk views expose each record's fields without holding data of their own.
+        """
+        for record, chunk in zip(self.records, self.chunks):
+            self.assertIsInstance(chunk, Chunk)
+            self.assertEqual(record["text"], chunk.text)
+            self.assertEqual(record["n_tokens"], chunk.n_tokens)
+            self.assertEqual(record["url"], chunk.url)
+            self.assertEqual(record["tokens"], chunk.tokens.tolist())
+            self.assertIs(self.chunks.tokens, chunk.tokens.base)
+        self.assertFalse(hasattr(self.chunks[0], "__dict__"))
+        self.assertEqual("Abra kadabra.", self.chunks[-1].text)
+        with self.assertRaises(IndexError):
+            self.chunks[3]
+
+    def test_should_round_trip_through_dataframe(self):
+        """
+        Test that a collection with embeddings survives a round trip through a DataFrame.
+        """
+        self.chunks.set_embeddings(np.arange(6).reshape(3, 2))
+        df = self.chunks.to_dataframe()
+        chunks = ChunkCollection.from_dataframe(df)
+
+        self.assertEqual(
+            ["url", "text", "n_tokens", "tokens", "embeddings"], list(df.columns)
+        )
+        self.assertEqual(list(self.chunks.iter_texts()), list(chunks.iter_texts()))
+        self.assertEqual(np.float32, chunks.embeddings.dtype)
+        np.testing.assert_array_equal(self.chunks.embeddings, chunks.embeddings)
+        np.testing.assert_array_equal(self.chunks.tokens, chunks.tokens)
+
+    def test_should_take_and_concat_chunks(self):
+        """
+        Test that chunks are copied by index and joined with their tokens and embeddings.
+        """
+        self.chunks.set_embeddings(np.arange(6).reshape(3, 2))
+        taken = self.chunks.take([2, 0])
+        joined = ChunkCollection.concat([taken, self.chunks.take([1])])
+
+        self.assertEqual(
+            ["Abra kadabra.", "Fact-based news.", "Žalgiris laimėjo."],
+            list(joined.iter_texts()),
+        )
+        self.assertEqual(["b", "a"], joined.urls)
+        self.assertEqual([7, 8, 9], joined[0].tokens.tolist())
+        self.assertEqual([[4, 5], [0, 1], [2, 3]], joined.embeddings.tolist())
+
+    def test_should_take_and_concat_like_records(self):
+        """
+        Test that taking and joining arrays matches packing the same records again.
+        """
+        untokenized = ChunkCollection.from_records(
+            {"url": url, "text": text, "n_tokens": 1}
+            for url, text in (("c", "Ąžuolas."), ("a", ""), ("c", "Kitas."))
+        )
+        joined = ChunkCollection.concat([untokenized.take([-1, 1]), self.chunks])
+        expected = ChunkCollection.from_records(
+            [
+                {"url": "c", "text": "Kitas.", "n_tokens": 1},
+                {"url": "a", "text": "", "n_tokens": 1},
+                *self.records,
+            ]
+        )
+
+        self.assertEqual(expected.text_blob, joined.text_blob)
+        self.assertEqual(expected.text_offsets.tolist(), joined.text_offsets.tolist())
+        self.assertEqual(expected.url_ids.tolist(), joined.url_ids.tolist())
+        self.assertEqual(expected.urls, joined.urls)
+        self.assertIsNone(joined.tokens)
+        self.assertEqual(0, len(self.chunks.take([])))
+
+    def test_should_save_and_load(self):
+        """
+        Test that a collection survives saving and loading.
+        """
+        self.chunks.set_embeddings(np.arange(6).reshape(3, 2))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "chunks.npz")
+            self.chunks.save(path)
+            chunks = ChunkCollection.load(path)
+
+        self.assertEqual(list(self.chunks.iter_texts()), list(chunks.iter_texts()))
+        self.assertEqual(self.chunks.urls, chunks.urls)
+        np.testing.assert_array_equal(self.chunks.tokens, chunks.tokens)
+        np.testing.assert_array_equal(self.chunks.embeddings, chunks.embeddings)
+
+    def test_should_raise_exception_with_misaligned_embeddings(self):
+        """
+        Test that an embedding matrix without one row per chunk raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            self.chunks.set_embeddings(np.zeros((2, 4)))
+
+
+class ChunkCollectionIntegrationTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with sample documents.
+        """
+        self.texts = [
+            "Fact-based news, exclusive video footage, photos and updated maps. Abra kadabra abra kadabra YEAH.",
+            "Fact-based news, exclusive video footage, photos and updated maps. Abra kadabra abra kadabra Csharp.",
+        ]
+        self.documents = [
+            {"url": f"http://example.com/{idx}", "text": text}
+            for idx, text in enumerate(self.texts)
+        ]
+
+    def test_should_text_preparatory_collect_chunks(self):
+        """
+        Test that the text preparatory packs the chunks of documents into a collection.
+        """
+        text_preparatory = TextPreparatoryFactory().create_object()
+        chunks = text_preparatory.collect_chunks(self.documents, max_tokens=30)
+
+        self.assertIsInstance(chunks, ChunkCollection)
+        self.assertEqual(self.texts, list(chunks.iter_texts()))
+        self.assertEqual([25, 24], chunks.n_tokens.tolist())
+        self.assertIsNone(chunks.tokens)
+
+    def test_should_embed_collection_and_answer_from_it(self):
+        """
+        Test that embeddings are attached to a collection and used by the question answering context.
+        """
+        chunks = (
+            TextPreparatoryFactory()
+            .create_object()
+            .collect_chunks(self.documents, max_tokens=30)
+        )
+        vectors = {self.texts[0]: [1.0, 0.0], self.texts[1]: [0.0, 1.0]}
+        question = "What are the pros and cons of the Csharp programming language?"
+        vectors[question] = [0.1, 0.9]
+
+        def embedding_create(input, engine):
+            return {"data": [{"embedding": vectors[input]}]}
+
+        with patch("openai.Embedding.create", side_effect=embedding_create):
+            df_embeddings_object = EmbeddingsFactory().create_object(
+                input_type=DataFrame
+            )
+            chunks = df_embeddings_object.create_embeddings(input=chunks)
+            chunks = df_embeddings_object.flatten_embeddings(input=chunks)
+
+            ai_qa = AIQuestionAnsweringFactory().create_object(
+                text_embeddings_object=EmbeddingsFactory().create_object(
+                    input_type=str
+                ),
+                text_preparatory=TextPreparatoryFactory().create_object(df=chunks),
+            )
+            ai_qa.context_max_len = 30
+            context = ai_qa.create_context(question=question)
+
+        self.assertEqual((2, 2), chunks.embeddings.shape)
+        self.assertEqual(np.float32, chunks.embeddings.dtype)
+        self.assertEqual(self.texts[1], context)
+
+    def test_should_fill_context_with_truncated_text(self):
+        """
+        Test that with fill_context the next most similar text is cut to fill the remaining room.
+        """
+        chunks = (
+            TextPreparatoryFactory()
+            .create_object()
+            .collect_chunks(self.documents, max_tokens=30)
+        )
+        chunks.set_embeddings(np.array([[1.0, 0.0], [0.0, 1.0]]))
+        question = "What are the pros and cons of the Csharp programming language?"
+
+        with patch(
+            "openai.Embedding.create",
+            return_value={"data": [{"embedding": [0.1, 0.9]}]},
+        ):
+            ai_qa = AIQuestionAnsweringFactory().create_object(
+                text_embeddings_object=EmbeddingsFactory().create_object(
+                    input_type=str
+                ),
+                text_preparatory=TextPreparatoryFactory().create_object(df=chunks),
+                fill_context=True,
+            )
+            ai_qa.context_max_len = 30
+            context = ai_qa.create_context(question=question)
+
+        filled = context.split("\n\n###\n\n")
+        self.assertEqual(self.texts[1], filled[0])
+        self.assertEqual(
+            TokenizerFactory().create_object().truncate_to_tokens(self.texts[0], 6),
+            filled[1],
+        )
+
+    def test_should_pack_context_from_top_candidates_only(self):
+        """
+        Test that only as many candidates as the shortest texts can fill are searched
+        and the context keeps the most similar texts that fit.
+        """
+        rng = np.random.default_rng(0)
+        chunks = ChunkCollection.from_records(
+            {"url": "a", "text": f"Text {idx}.", "n_tokens": 3 + idx % 4}
+            for idx in range(100)
+        )
+        chunks.set_embeddings(rng.normal(size=(100, 8)))
+        text_preparatory = MagicMock()
+        text_preparatory.generate_tokens_amount.return_value = chunks
+        embeddings_object = MagicMock()
+        embeddings_object.create_embeddings.return_value = rng.normal(size=8)
+        ai_qa = AIQuestionAnsweringBasedOnContext(
+            text_preparatory=text_preparatory,
+            text_embeddings_object=embeddings_object,
+            model="model",
+            max_tokens=10,
+            context_max_len=20,
+            stop_sequence=None,
+        )
+
+        context = ai_qa.create_context("Question?")
+        order = ai_qa.retrieval_index.search(embeddings_object.create_embeddings())
+        expected, length = [], 0
+        for idx in order:
+            if length + chunks.n_tokens[idx] > 20:
+                break
+            length += chunks.n_tokens[idx]
+            expected.append(chunks.get_text(idx))
+
+        self.assertEqual("\n\n###\n\n".join(expected), context)
+        self.assertEqual(7, ai_qa.retrieval_index.candidates_needed(20))
+
+    def test_should_reuse_cached_question_embedding(self):
+        """
+        Test that a question differing only in case and whitespace reuses the cached embedding.
+        """
+        chunks = (
+            TextPreparatoryFactory()
+            .create_object()
+            .collect_chunks(self.documents, max_tokens=30)
+        )
+        chunks.set_embeddings(np.array([[1.0, 0.0], [0.0, 1.0]]))
+
+        with patch(
+            "openai.Embedding.create",
+            return_value={"data": [{"embedding": [0.1, 0.9]}]},
+        ) as mocked:
+            ai_qa = AIQuestionAnsweringFactory().create_object(
+                text_embeddings_object=EmbeddingsFactory().create_object(
+                    input_type=str
+                ),
+                text_preparatory=TextPreparatoryFactory().create_object(df=chunks),
+            )
+            ai_qa.question_cache = TTLCache(maxsize=8, ttl=60)
+            first = ai_qa.create_context(question="What is  Csharp?")
+            second = ai_qa.create_context(question="what is csharp?\n")
+
+        self.assertEqual(1, mocked.call_count)
+        self.assertEqual(first, second)
+        self.assertEqual(1, ai_qa.question_cache.info().hits)
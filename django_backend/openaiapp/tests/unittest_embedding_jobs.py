@@ -0,0 +1,274 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+import numpy as np
+
+from core.utils.database_config import AUTH_DB_ALIAS, NEWS_FEED_DB_ALIAS
+from openaiapp.embeddings import LocalEmbeddings
+from openaiapp.factories import TextPreparatoryFactory
+from openaiapp.management.commands.enqueue_crawl import Command as EnqueueCrawlCommand
+from openaiapp.models import EmbeddingJob
+from openaiapp.signals import delete_article_embeddings, enqueue_article_embeddings
+from openaiapp.vector_db import VectorDBReader
+from openaiapp.workers import EmbeddingWorker, enqueue_documents
+
+
+class EmbeddingJobTestCase(TestCase):
+    databases = {AUTH_DB_ALIAS, NEWS_FEED_DB_ALIAS}
+
+    def setUp(self):
+        """
+        Set up the test case with sample documents and a worker over local embeddings.
+        """
+        self.engine = LocalEmbeddings.ENGINE
+        self.text_preparatory = TextPreparatoryFactory().create_object()
+        self.documents = [
+            {"url": "http://example.com/a", "text": "First sentence here. Second one."},
+            {"url": "http://example.com/b", "text": "Another page."},
+        ]
+        self.embeddings_object = LocalEmbeddings()
+        self.worker = EmbeddingWorker(
+            self.embeddings_object, batch_size=2, worker_id="test"
+        )
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.vector_db_path = os.path.join(tmp_dir.name, "vector_db")
+
+    def _enqueue(self, documents):
+        """
+        Enqueue the documents in chunks of at most 5 tokens.
+        """
+        return enqueue_documents(
+            documents, self.text_preparatory, max_tokens=5, engine=self.engine
+        )
+
+    def _published(self):
+        """
+        Get the texts published to the vector database by source URL.
+        """
+        reader = VectorDBReader(self.vector_db_path)
+        published = {}
+        for idx in range(len(reader)):
+            published.setdefault(reader.get_url(idx), []).append(reader.get_text(idx))
+        return published
+
+    def test_should_enqueue_only_new_chunks(self):
+        """
+        Test that re-enqueuing keeps unchanged chunks and replaces the changed ones.
+        """
+        self.assertEqual(3, self._enqueue(self.documents))
+        self.assertEqual(0, self._enqueue(self.documents))
+
+        changed = [{"url": "http://example.com/a", "text": "First sentence here."}]
+        self.assertEqual(0, self._enqueue(changed))
+        self.assertEqual(
+            [
+                ("http://example.com/a", "First sentence here."),
+                ("http://example.com/b", "Another page."),
+                ("http://example.com/a", ""),
+            ],
+            list(EmbeddingJob.objects.order_by("id").values_list("source", "text")),
+        )
+
+        self._enqueue([{"url": "http://example.com/b", "text": ""}])
+        self.assertEqual(
+            {"http://example.com/a": 2, "http://example.com/b": 1},
+            {
+                source: EmbeddingJob.objects.filter(source=source).count()
+                for source in ["http://example.com/a", "http://example.com/b"]
+            },
+        )
+        self.assertFalse(
+            EmbeddingJob.objects.filter(source="http://example.com/b")
+            .exclude(text="")
+            .exists()
+        )
+
+    def test_should_embed_queued_chunks_in_batches(self):
+        """
+        Test that the worker embeds every job, one batch per run, and stores the embeddings.
+        """
+        self._enqueue(self.documents)
+
+        self.assertEqual(2, self.worker.run_once())
+        self.assertEqual(1, self.worker.run(stop_when_empty=True))
+        self.assertEqual(0, self.worker.run_once())
+
+        jobs = list(EmbeddingJob.objects.order_by("id"))
+        self.assertEqual({EmbeddingJob.DONE}, {job.status for job in jobs})
+        np.testing.assert_allclose(
+            self.embeddings_object.encode([job.text for job in jobs]),
+            [job.get_embedding() for job in jobs],
+            rtol=1e-6,
+        )
+
+        collection = EmbeddingJob.objects.done_collection(self.engine)
+        self.assertEqual([job.text for job in jobs], list(collection.iter_texts()))
+        self.assertEqual((3, LocalEmbeddings.DIM), collection.embeddings.shape)
+
+    def test_should_publish_settled_sources_to_vector_db(self):
+        """
+        Test that the worker publishes sources once their jobs are done,
+        and removals through their publish jobs.
+        """
+        worker = EmbeddingWorker(
+            self.embeddings_object, batch_size=2, vector_db_path=self.vector_db_path
+        )
+        self._enqueue(self.documents)
+        worker.run_once()
+        self.assertEqual(
+            {"http://example.com/a": ["First sentence here.", "Second one."]},
+            self._published(),
+        )
+
+        worker.run_once()
+        self.assertEqual(["Another page."], self._published()["http://example.com/b"])
+
+        changed = [
+            {"url": "http://example.com/a", "text": "First sentence here."},
+            {"url": "http://example.com/b", "text": ""},
+        ]
+        self._enqueue(changed)
+        self.assertEqual(2, len(self._published()))
+        self.assertEqual(2, worker.run(stop_when_empty=True))
+        self.assertEqual(
+            {"http://example.com/a": ["First sentence here."]}, self._published()
+        )
+        self.assertFalse(EmbeddingJob.objects.filter(text="").exists())
+
+    def test_should_retry_failed_jobs_until_max_attempts(self):
+        """
+        Test that failed jobs go back to the queue until they run out of attempts.
+        """
+        self._enqueue(self.documents[1:])
+        worker = EmbeddingWorker(self.embeddings_object, max_attempts=2)
+
+        with patch.object(
+            self.embeddings_object,
+            "create_embeddings",
+            side_effect=RuntimeError("Service unavailable."),
+        ):
+            worker.run_once()
+            job = EmbeddingJob.objects.get()
+            self.assertEqual(
+                (EmbeddingJob.PENDING, 1, "Service unavailable."),
+                (job.status, job.attempts, job.error),
+            )
+            worker.run_once()
+            self.assertEqual(EmbeddingJob.FAILED, EmbeddingJob.objects.get().status)
+
+        self.assertEqual(0, worker.run_once())
+        self.assertEqual(1, self._enqueue(self.documents[1:]))
+        self.assertEqual(1, worker.run_once())
+
+    def test_should_not_claim_locked_jobs_until_timeout(self):
+        """
+        Test that running jobs are only claimed again once their lock has timed out.
+        """
+        self._enqueue(self.documents)
+        claimed = EmbeddingJob.objects.claim(10, "dead", lock_timeout=60)
+
+        self.assertEqual(3, len(claimed))
+        self.assertEqual([], EmbeddingJob.objects.claim(10, "other", lock_timeout=60))
+
+        EmbeddingJob.objects.update(locked_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(
+            {"other"},
+            {
+                job.locked_by
+                for job in EmbeddingJob.objects.claim(10, "other", lock_timeout=60)
+            },
+        )
+
+    @override_settings(OPENAI_EMBEDDING_JOBS_ENGINE=LocalEmbeddings.ENGINE)
+    def test_should_enqueue_published_articles_only(self):
+        """
+        Test that saving an article queues its text, stripped of HTML, only while published.
+        """
+        article = SimpleNamespace(
+            uid="1", content="<p>Article text.</p>", is_published=True
+        )
+        enqueue_article_embeddings(sender=None, instance=article)
+        job = EmbeddingJob.objects.get()
+        self.assertEqual(("article:1", "Article text."), (job.source, job.text))
+
+        article.is_published = False
+        enqueue_article_embeddings(sender=None, instance=article)
+        job = EmbeddingJob.objects.get()
+        self.assertEqual(("article:1", ""), (job.source, job.text))
+        self.assertFalse(os.path.exists(self.vector_db_path))
+
+    @override_settings(OPENAI_EMBEDDING_JOBS_ENGINE=LocalEmbeddings.ENGINE)
+    def test_should_unpublish_deleted_articles(self):
+        """
+        Test that deleting an article removes its jobs and queues the removal
+        of its vector database chunks for the worker.
+        """
+        article = SimpleNamespace(
+            uid="1", content="<p>Article text.</p>", is_published=True
+        )
+        worker = EmbeddingWorker(
+            self.embeddings_object, vector_db_path=self.vector_db_path
+        )
+        enqueue_article_embeddings(sender=None, instance=article)
+        worker.run_once()
+        self.assertEqual({"article:1": ["Article text."]}, self._published())
+
+        delete_article_embeddings(sender=None, instance=article)
+        self.assertEqual(1, EmbeddingJob.objects.filter(text="").count())
+        self.assertEqual({"article:1": ["Article text."]}, self._published())
+
+        worker.run_once()
+        self.assertFalse(EmbeddingJob.objects.exists())
+        self.assertEqual({}, self._published())
+
+    def test_should_run_worker_command(self):
+        """
+        Test that the management command drains the queue and stops with --once.
+        """
+        self._enqueue(self.documents)
+        out = StringIO()
+        call_command(
+            "embedding_worker",
+            engine=self.engine,
+            vector_db=self.vector_db_path,
+            once=True,
+            stdout=out,
+        )
+
+        self.assertIn("Processed 3 jobs.", out.getvalue())
+        self.assertFalse(
+            EmbeddingJob.objects.exclude(status=EmbeddingJob.DONE).exists()
+        )
+        self.assertEqual(3, len(VectorDBReader(self.vector_db_path)))
+
+    def test_should_enqueue_crawled_pages(self):
+        """
+        Test that the crawl command queues the crawled pages without embedding them.
+        """
+        out = StringIO()
+        with patch.object(
+            EnqueueCrawlCommand, "crawl", return_value=self.documents
+        ) as crawl:
+            call_command(
+                "enqueue_crawl",
+                "example.com",
+                engine=self.engine,
+                max_tokens=5,
+                stdout=out,
+            )
+
+        crawl.assert_called_once_with("example.com", ["https://example.com/"])
+        self.assertIn("Crawled 2 pages and enqueued 3 jobs.", out.getvalue())
+        self.assertEqual(
+            {EmbeddingJob.PENDING},
+            set(EmbeddingJob.objects.values_list("status", flat=True)),
+        )
@@ -0,0 +1,467 @@
+import os
+import tempfile
+
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+import numpy as np
+from openai.embeddings_utils import distances_from_embeddings
+from pandas import DataFrame
+
+from openaiapp.ai_question_answering import AIQuestionAnsweringBasedOnContext
+from openaiapp.chunks import ChunkCollection
+from openaiapp.embedding_stores import (
+    AbstractEmbeddingStore,
+    EmbeddingStore,
+    IVFFlatIndex,
+    PCAProjection,
+    PrefixProjection,
+    QuantizedEmbeddingStore,
+    dimension_report,
+    load_projection,
+    quantization_report,
+    top_k,
+)
+
+
+class EmbeddingStoreTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with random embeddings and a query.
+        """
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(50, 16))
+        self.query = rng.normal(size=16)
+        self.store = EmbeddingStore.from_embeddings(self.embeddings)
+
+    def test_should_store_inherit_abstract(self):
+        """
+        Test that the embedding store inherits from AbstractEmbeddingStore.
+        """
+        self.assertIsInstance(self.store, AbstractEmbeddingStore)
+
+    def test_should_keep_normalized_float32_matrix(self):
+        """
+        Test that the embeddings are kept in one contiguous float32 matrix of unit rows.
+        """
+        self.assertEqual(np.float32, self.store.matrix.dtype)
+        self.assertTrue(self.store.matrix.flags["C_CONTIGUOUS"])
+        self.assertEqual((50, 16), self.store.matrix.shape)
+        np.testing.assert_allclose(
+            np.ones(50), np.linalg.norm(self.store.matrix, axis=1), rtol=1e-6
+        )
+        self.assertEqual(50 * 16 * 4, self.store.nbytes)
+
+    def test_should_match_cosine_distances(self):
+        """
+        Test that the distances and the search order match the cosine distances of the raw embeddings.
+        """
+        expected = distances_from_embeddings(
+            self.query, list(self.embeddings), distance_metric="cosine"
+        )
+
+        np.testing.assert_allclose(
+            expected, self.store.distances(self.query), atol=1e-6
+        )
+        self.assertEqual(
+            np.argsort(expected)[:5].tolist(),
+            self.store.search(self.query, k=5).tolist(),
+        )
+
+    def test_should_save_and_load_memory_mapped(self):
+        """
+        Test that a saved store loads back memory-mapped with the same matrix.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "store.npy")
+            self.store.save(path)
+            loaded = EmbeddingStore.load(path)
+
+            self.assertIsInstance(loaded.matrix, np.memmap)
+            np.testing.assert_array_equal(self.store.matrix, loaded.matrix)
+            self.assertEqual(
+                self.store.search(self.query).tolist(),
+                loaded.search(self.query).tolist(),
+            )
+            del loaded
+
+    def test_should_build_from_dataframe_and_collection(self):
+        """
+        Test that rows without an embedding get a zero vector and collections are supported.
+        """
+        df = DataFrame({"embeddings": [[3.0, 4.0], None, np.array([0.0, 2.0])]})
+        store = EmbeddingStore.from_dataframe(df)
+
+        np.testing.assert_allclose([[0.6, 0.8], [0.0, 0.0], [0.0, 1.0]], store.matrix)
+        self.assertEqual([2, 0, 1], store.search([0.0, 1.0]).tolist())
+
+        collection = ChunkCollection.from_records(
+            [{"text": "a", "n_tokens": 1}, {"text": "b", "n_tokens": 1}]
+        )
+        with self.assertRaises(ValueError):
+            EmbeddingStore.from_collection(collection)
+        collection.set_embeddings(np.array([[1.0, 0.0], [1.0, 1.0]]))
+        self.assertEqual(
+            [1, 0],
+            EmbeddingStore.from_collection(collection).search([0.0, 1.0]).tolist(),
+        )
+
+    def test_should_score_in_blocks_like_one_product(self):
+        """
+        Test that blocked scoring, also of a memory-mapped matrix, matches one matrix product.
+        """
+        self.store.BLOCK_SIZE = 7
+        expected = self.store.matrix @ (self.query / np.linalg.norm(self.query))
+        np.testing.assert_allclose(
+            expected, self.store.similarities(self.query), rtol=1e-5
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "store.npy")
+            self.store.save(path)
+            loaded = EmbeddingStore.load(path)
+            loaded.BLOCK_SIZE = 7
+            np.testing.assert_allclose(
+                expected, loaded.similarities(self.query), rtol=1e-5
+            )
+            del loaded
+
+    def test_should_search_batch_like_single_searches(self):
+        """
+        Test that a batch search across blocks returns each query's own top k.
+        """
+        queries = np.random.default_rng(1).normal(size=(6, 16))
+        self.store.BLOCK_SIZE = 8
+
+        self.assertEqual(
+            [self.store.search(query, k=5).tolist() for query in queries],
+            self.store.search_batch(queries, k=5).tolist(),
+        )
+        self.assertEqual((6, 50), self.store.search_batch(queries, k=100).shape)
+        self.assertEqual((0, 5), self.store.search_batch([], k=5).shape)
+        with self.assertRaises(ValueError):
+            self.store.search_batch(queries, k=0)
+
+    def test_should_top_k_match_stable_sort_prefix(self):
+        """
+        Test that top k selection returns the first k of a stable descending sort, ties included.
+        """
+        scores = np.random.default_rng(2).integers(0, 5, size=40).astype(np.float32)
+        expected = np.argsort(-scores, kind="stable")
+
+        for k in (1, 3, 7, 39):
+            self.assertEqual(expected[:k].tolist(), top_k(scores, k).tolist())
+        self.assertEqual(expected.tolist(), top_k(scores).tolist())
+        self.assertEqual(expected.tolist(), top_k(scores, 100).tolist())
+        self.assertEqual([], top_k(scores, 0).tolist())
+
+    def test_should_raise_exception_with_float64_matrix(self):
+        """
+        Test that a matrix of another dtype raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            EmbeddingStore(np.zeros((2, 2)))
+
+
+class ProjectionTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with embeddings that mostly vary along a few directions.
+        """
+        rng = np.random.default_rng(0)
+        basis = rng.normal(size=(4, 32))
+        self.embeddings = rng.normal(size=(200, 4)) @ basis
+        self.embeddings += rng.normal(scale=0.01, size=self.embeddings.shape)
+        self.queries = rng.normal(size=(10, 4)) @ basis
+
+    def test_should_reduce_store_and_project_queries(self):
+        """
+        Test that a PCA store keeps reduced normalized rows and projects queries the same way.
+        """
+        store = EmbeddingStore.from_embeddings(self.embeddings, PCAProjection(4))
+        full = EmbeddingStore.from_embeddings(self.embeddings)
+
+        self.assertEqual((200, 4), store.matrix.shape)
+        self.assertEqual(np.float32, store.matrix.dtype)
+        np.testing.assert_allclose(1.0, np.linalg.norm(store.matrix, axis=1), atol=1e-5)
+        for query in self.queries:
+            self.assertEqual(
+                full.search(query, k=5).tolist(), store.search(query, k=5).tolist()
+            )
+
+    def test_should_truncate_prefix_and_renormalize(self):
+        """
+        Test that a prefix projection keeps the first dimensions, normalized again.
+        """
+        store = EmbeddingStore.from_embeddings([[3.0, 4.0, 12.0]], PrefixProjection(2))
+
+        np.testing.assert_allclose([[0.6, 0.8]], store.matrix)
+        np.testing.assert_allclose([1.0], store.similarities([6.0, 8.0, -1.0]))
+
+    def test_should_save_and_load_projection_with_store(self):
+        """
+        Test that a saved store loads back with its projection.
+        """
+        store = EmbeddingStore.from_embeddings(self.embeddings, PCAProjection(4))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "store.npy")
+            store.save(path)
+            loaded = EmbeddingStore.load(path)
+
+            self.assertIsInstance(loaded.projection, PCAProjection)
+            np.testing.assert_allclose(
+                store.similarities(self.queries[0]),
+                loaded.similarities(self.queries[0]),
+                rtol=1e-5,
+            )
+            del loaded
+
+            PrefixProjection(3).save(os.path.join(tmp_dir, "prefix.npz"))
+            self.assertEqual(
+                3, load_projection(os.path.join(tmp_dir, "prefix.npz")).dim
+            )
+
+    def test_should_report_recall_per_dimension(self):
+        """
+        Test that the report gives one entry per dimension, with full recall
+        once the dimensions cover the data.
+        """
+        reports = dimension_report(self.embeddings, self.queries, dims=[1, 4], k=5)
+
+        self.assertEqual([1, 4], [report.dim for report in reports])
+        self.assertEqual(1.0, reports[1].recall_at_k)
+        self.assertLessEqual(reports[0].recall_at_k, reports[1].recall_at_k)
+        self.assertAlmostEqual(0.875, reports[1].memory_saved)
+
+    def test_should_raise_exception_with_invalid_projection(self):
+        """
+        Test that invalid dimensions, methods and unfitted PCA raise exceptions.
+        """
+        with self.assertRaises(ValueError):
+            PrefixProjection(0)
+        with self.assertRaises(ValueError):
+            PCAProjection(64).fit(self.embeddings)
+        with self.assertRaises(RuntimeError):
+            PCAProjection(4).transform(self.queries)
+        with self.assertRaises(ValueError):
+            dimension_report(self.embeddings, self.queries, dims=[4], method="svd")
+
+
+class QuantizedEmbeddingStoreTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with a store of random embeddings and queries.
+        """
+        rng = np.random.default_rng(0)
+        self.store = EmbeddingStore.from_embeddings(rng.normal(size=(500, 32)))
+        self.queries = rng.normal(size=(20, 32))
+
+    def test_should_quantize_to_int8_with_scales(self):
+        """
+        Test that int8 storage keeps a quarter of the memory plus one scale per vector.
+        """
+        quantized = QuantizedEmbeddingStore.from_store(self.store)
+
+        self.assertIsInstance(quantized, AbstractEmbeddingStore)
+        self.assertEqual(np.int8, quantized.codes.dtype)
+        self.assertEqual(500 * 32 + 500 * 4, quantized.nbytes)
+        np.testing.assert_allclose(
+            self.store.similarities(self.queries[0]),
+            quantized.similarities(self.queries[0]),
+            atol=0.02,
+        )
+
+    def test_should_rescore_to_exact_results(self):
+        """
+        Test that rescoring returns the exact top results for both dtypes.
+        """
+        for dtype in (QuantizedEmbeddingStore.INT8, QuantizedEmbeddingStore.FLOAT16):
+            quantized = QuantizedEmbeddingStore.from_store(
+                self.store, dtype=dtype, rescore_candidates=50
+            )
+            for query in self.queries:
+                self.assertEqual(
+                    self.store.search(query, k=5).tolist(),
+                    quantized.search(query, k=5).tolist(),
+                )
+
+    def test_should_search_return_every_index_without_k(self):
+        """
+        Test that a search without k orders every index once, the exact best first.
+        """
+        quantized = QuantizedEmbeddingStore.from_store(
+            self.store, rescore_candidates=10
+        )
+        order = quantized.search(self.queries[0])
+
+        self.assertEqual(list(range(500)), sorted(order.tolist()))
+        self.assertEqual(
+            self.store.search(self.queries[0], k=3).tolist(), order[:3].tolist()
+        )
+
+    def test_should_report_memory_saved_and_recall(self):
+        """
+        Test that the report measures the memory saved and the recall@k.
+        """
+        quantized = QuantizedEmbeddingStore.from_store(
+            self.store, dtype=QuantizedEmbeddingStore.FLOAT16
+        )
+        report = quantization_report(quantized, self.queries, k=5)
+
+        self.assertEqual("float16", report.dtype)
+        self.assertAlmostEqual(0.5, report.memory_saved)
+        self.assertEqual(1.0, report.rescored_recall_at_k)
+        self.assertGreaterEqual(report.recall_at_k, 0.9)
+
+    def test_should_save_and_load_with_full_store_on_disk(self):
+        """
+        Test that a saved store loads back with the full-precision vectors memory-mapped.
+        """
+        quantized = QuantizedEmbeddingStore.from_store(self.store)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            quantized.save(tmp_dir)
+            loaded = QuantizedEmbeddingStore.load(tmp_dir)
+
+            self.assertIsInstance(loaded.full.matrix, np.memmap)
+            np.testing.assert_array_equal(quantized.codes, loaded.codes)
+            self.assertEqual(
+                quantized.search(self.queries[0], k=5).tolist(),
+                loaded.search(self.queries[0], k=5).tolist(),
+            )
+            del loaded
+
+    def test_should_raise_exception_with_unsupported_dtype(self):
+        """
+        Test that an unsupported quantization dtype raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            QuantizedEmbeddingStore.from_store(self.store, dtype="int4")
+
+
+class IVFFlatIndexTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with clustered embeddings, queries and their exact store.
+        """
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(8, 16))
+        self.embeddings = centers[rng.integers(0, 8, size=400)]
+        self.embeddings += rng.normal(scale=0.3, size=self.embeddings.shape)
+        self.queries = centers + rng.normal(scale=0.3, size=centers.shape)
+        self.store = EmbeddingStore.from_embeddings(self.embeddings)
+
+    def test_should_index_inherit_abstract(self):
+        """
+        Test that the index is an embedding store over every stored row.
+        """
+        index = IVFFlatIndex.from_store(self.store, n_lists=8)
+
+        self.assertIsInstance(index, AbstractEmbeddingStore)
+        self.assertEqual((400, 8, 16), (len(index), index.n_lists, index.dim))
+        self.assertEqual(
+            list(range(400)), sorted(np.concatenate(index.list_ids).tolist())
+        )
+
+    def test_should_match_exact_search_when_probing_every_list(self):
+        """
+        Test that probing all lists gives the exact results and similarities.
+        """
+        index = IVFFlatIndex.from_store(self.store, n_lists=8, n_probe=8)
+
+        for query in self.queries:
+            self.assertEqual(
+                self.store.search(query, k=10).tolist(),
+                index.search(query, k=10).tolist(),
+            )
+            np.testing.assert_allclose(
+                self.store.similarities(query), index.similarities(query), atol=1e-6
+            )
+
+    def test_should_keep_high_recall_probing_few_lists(self):
+        """
+        Test that probing a few lists of clustered embeddings keeps a high recall@10.
+        """
+        index = IVFFlatIndex.from_store(self.store, n_lists=16, n_probe=4)
+        hits = sum(
+            len(
+                set(self.store.search(query, k=10).tolist()).intersection(
+                    index.search(query, k=10).tolist()
+                )
+            )
+            for query in self.queries
+        )
+
+        self.assertGreaterEqual(hits / (10 * len(self.queries)), 0.9)
+
+    def test_should_search_return_every_index_without_k(self):
+        """
+        Test that a search without k returns each index once.
+        """
+        index = IVFFlatIndex.from_store(self.store, n_lists=8, n_probe=2)
+        order = index.search(self.queries[0])
+
+        self.assertEqual(list(range(400)), sorted(order.tolist()))
+
+    def test_should_add_embeddings_incrementally(self):
+        """
+        Test that added embeddings get the next indices and are found by search.
+        """
+        index = IVFFlatIndex.from_store(self.store, n_lists=8, n_probe=1)
+        ids = index.add(self.queries[:2] * 3)
+
+        self.assertEqual([400, 401], ids.tolist())
+        self.assertEqual(402, len(index))
+        self.assertEqual([401], index.search(self.queries[1], k=1).tolist())
+
+    def test_should_save_and_load(self):
+        """
+        Test that a saved index loads back with the same results.
+        """
+        index = IVFFlatIndex.from_store(self.store, n_lists=8, n_probe=2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index.save(tmp_dir)
+            loaded = IVFFlatIndex.load(tmp_dir, n_probe=2)
+
+            self.assertEqual(len(index), len(loaded))
+            for query in self.queries:
+                self.assertEqual(
+                    index.search(query).tolist(), loaded.search(query).tolist()
+                )
+            del loaded
+
+    def test_should_use_index_above_threshold_only(self):
+        """
+        Test that question answering searches an index for corpora over the threshold
+        and searches exactly below it.
+        """
+        collection = ChunkCollection.from_records(
+            {"text": f"Text {idx}.", "n_tokens": 1} for idx in range(400)
+        )
+        collection.set_embeddings(self.embeddings)
+        text_preparatory = MagicMock()
+        text_preparatory.generate_tokens_amount.return_value = collection
+        embeddings_object = MagicMock()
+        embeddings_object.create_embeddings.return_value = self.embeddings[7]
+
+        for threshold, store_class in ((400, IVFFlatIndex), (401, EmbeddingStore)):
+            qa = AIQuestionAnsweringBasedOnContext(
+                text_preparatory=text_preparatory,
+                text_embeddings_object=embeddings_object,
+                model="model",
+                max_tokens=10,
+                context_max_len=1,
+                stop_sequence=None,
+                ann_threshold=threshold,
+            )
+            self.assertEqual("Text 7.", qa.create_context("Question?"))
+            self.assertIsInstance(qa.retrieval_index.store, store_class)
+
+    def test_should_raise_exception_with_invalid_parameters(self):
+        """
+        Test that non-positive numbers of lists or probes raise a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            IVFFlatIndex.from_store(self.store, n_lists=0)
+        with self.assertRaises(ValueError):
+            IVFFlatIndex.from_store(self.store, n_probe=0)
@@ -1,12 +1,26 @@
+import asyncio
+import os
+import tempfile
+import time
 from typing import List
+from unittest.mock import AsyncMock, patch
 
 from django.test import TestCase
 
 import numpy as np
+import openai
 from pandas import DataFrame
 
-from openaiapp.embeddings import AbstractEmbeddings
-from openaiapp.factories import EmbeddingsFactory
+from openaiapp.caches import EmbeddingCache
+from openaiapp.chunks import ChunkCollection
+from openaiapp.embeddings import (
+    AbstractEmbeddings,
+    AsyncDataFrameEmbeddings,
+    EmbeddingFailure,
+)
+from openaiapp.factories import EmbeddingsFactory, TokenizerFactory
+from openaiapp.models import get_vector_db_model, save_flatten_embeddings_to_vector_db
+from openaiapp.rate_limiters import RateLimiter, TokenBucket
 
 
 class EmbeddingsTestCase(TestCase):
@@ -91,4 +105,281 @@ class EmbeddingsTestCase(TestCase):
         """
         Test that flattened embeddings are correctly saved to the vector database.
         """
-        raise NotImplementedError
+        df = self.df.assign(
+            url=["http://example.com/a", "http://example.com/b"],
+            n_tokens=[20, 20],
+            embeddings=[np.array([0.6, 0.8]), np.array([1.0, 0.0])],
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "vector_db")
+            self.assertEqual(1, save_flatten_embeddings_to_vector_db(df, path=path))
+
+            model = get_vector_db_model(path)
+            self.assertEqual(2, len(model))
+            self.assertEqual(self.texts, [model.get_text(idx) for idx in range(2)])
+            self.assertEqual(
+                df["url"].tolist(), [model.get_url(idx) for idx in range(2)]
+            )
+            self.assertEqual([20, 20], model.n_tokens.tolist())
+            self.assertEqual([1, 0], model.search([1.0, 0.0]).tolist())
+
+
+class BatchedEmbeddingsTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with sample texts and a fake embeddings endpoint.
+        """
+        self.texts = ["First text.", "", "Second text.", None, "Third text."]
+        self.df = DataFrame({"text": self.texts})
+        self.requests = []
+
+        def embedding_create(input, engine):
+            self.requests.append(input)
+            data = [
+                {"index": idx, "embedding": [float(len(text)), 1.0]}
+                for idx, text in enumerate(input)
+            ]
+            return {"data": data[::-1]}
+
+        self.embedding_create = embedding_create
+
+    def test_should_pack_texts_into_batches(self):
+        """
+        Test that texts are sent in batches of the given size and mapped back to their rows.
+        """
+        embeddings_obj = EmbeddingsFactory().create_object(
+            input_type=DataFrame, batch_size=2
+        )
+        with patch("openai.Embedding.create", side_effect=self.embedding_create):
+            df = embeddings_obj.create_embeddings(input=self.df)
+
+        self.assertEqual(
+            [["First text.", "Second text."], ["Third text."]], self.requests
+        )
+        self.assertEqual([11.0, 1.0], df["embeddings"][0])
+        self.assertIsNone(df["embeddings"][1])
+        self.assertEqual([12.0, 1.0], df["embeddings"][2])
+        self.assertIsNone(df["embeddings"][3])
+        self.assertEqual([11.0, 1.0], df["embeddings"][4])
+
+    def test_should_limit_batch_tokens(self):
+        """
+        Test that a batch is closed before going over the token budget.
+        """
+        self.df["n_tokens"] = [3, 0, 3, 0, 3]
+        embeddings_obj = EmbeddingsFactory().create_object(
+            input_type=DataFrame, batch_size=16, batch_tokens=6
+        )
+        with patch("openai.Embedding.create", side_effect=self.embedding_create):
+            embeddings_obj.create_embeddings(input=self.df)
+
+        self.assertEqual(
+            [["First text.", "Second text."], ["Third text."]], self.requests
+        )
+
+    def test_should_send_only_texts_missing_from_cache(self):
+        """
+        Test that cached embeddings are reused and only new texts are sent, then stored.
+        """
+        cache = EmbeddingCache(path=":memory:")
+        cache.set(EmbeddingsFactory.EMBEDDING_ENGINE, "Second text.", [0.5, 0.5])
+        embeddings_obj = EmbeddingsFactory().create_object(
+            input_type=DataFrame, batch_size=16
+        )
+        embeddings_obj.cache = cache
+
+        with patch("openai.Embedding.create", side_effect=self.embedding_create):
+            df = embeddings_obj.create_embeddings(input=self.df)
+            embeddings_obj.create_embeddings(input=self.df)
+
+        self.assertEqual([["First text.", "Third text."]], self.requests)
+        self.assertEqual([0.5, 0.5], df["embeddings"][2])
+        self.assertEqual([11.0, 1.0], df["embeddings"][4])
+        self.assertEqual(3, len(cache))
+
+    def test_should_raise_exception_with_invalid_batch_size(self):
+        """
+        Test that a batch size below one raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            EmbeddingsFactory().create_object(input_type=DataFrame, batch_size=0)
+
+
+class AsyncDataFrameEmbeddingsTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with sample texts and an asynchronous embeddings object.
+        """
+        self.texts = ["First text.", "", "Second text.", "Bad text.", "Third text."]
+        self.df = DataFrame({"text": self.texts})
+        self.embeddings_obj = AsyncDataFrameEmbeddings(
+            embedding_engine=EmbeddingsFactory.EMBEDDING_ENGINE,
+            tokenizer=TokenizerFactory().create_object(),
+            backoff_base=0.001,
+        )
+
+    @staticmethod
+    def _response(input):
+        return {
+            "data": [
+                {"index": idx, "embedding": [float(len(text)), 1.0]}
+                for idx, text in enumerate(input)
+            ]
+        }
+
+    def test_should_create_embeddings_concurrently(self):
+        """
+        Test that every non-empty text gets its embedding from its own request.
+        """
+
+        async def acreate(input, engine):
+            return self._response(input)
+
+        with patch("openai.Embedding.acreate", side_effect=acreate) as mocked:
+            df = self.embeddings_obj.create_embeddings(input=self.df)
+
+        self.assertEqual(4, mocked.call_count)
+        self.assertEqual([11.0, 1.0], df["embeddings"][0])
+        self.assertIsNone(df["embeddings"][1])
+        self.assertEqual([12.0, 1.0], df["embeddings"][2])
+        self.assertEqual([], self.embeddings_obj.failures)
+
+    def test_should_retry_rate_limited_requests(self):
+        """
+        Test that rate limited requests are retried until they succeed.
+        """
+        errors = {text: 2 for text in self.texts}
+
+        async def acreate(input, engine):
+            if errors[input[0]]:
+                errors[input[0]] -= 1
+                raise openai.error.RateLimitError("Rate limit reached.")
+            return self._response(input)
+
+        with patch("openai.Embedding.acreate", side_effect=acreate) as mocked:
+            df = self.embeddings_obj.create_embeddings(input=self.df)
+
+        self.assertEqual(12, mocked.call_count)
+        self.assertEqual([11.0, 1.0], df["embeddings"][4])
+        self.assertEqual([], self.embeddings_obj.failures)
+
+    def test_should_report_partial_failures(self):
+        """
+        Test that a failing request leaves its row without an embedding and is reported,
+        while the other rows still get theirs.
+        """
+
+        async def acreate(input, engine):
+            if input == ["Bad text."]:
+                raise openai.error.InvalidRequestError("Invalid input.", "input")
+            return self._response(input)
+
+        with patch("openai.Embedding.acreate", side_effect=acreate):
+            df = self.embeddings_obj.create_embeddings(input=self.df)
+
+        self.assertIsNone(df["embeddings"][3])
+        self.assertEqual([11.0, 1.0], df["embeddings"][4])
+        self.assertEqual(1, len(self.embeddings_obj.failures))
+        failure = self.embeddings_obj.failures[0]
+        self.assertIsInstance(failure, EmbeddingFailure)
+        self.assertEqual((3, 1), (failure.index, failure.attempts))
+
+    def test_should_leave_collection_unembedded_on_failure(self):
+        """
+        Test that a chunk whose request failed raises instead of getting a zero vector.
+        """
+        chunks = ChunkCollection.from_records(
+            {"text": text, "n_tokens": 3} for text in self.texts
+        )
+
+        async def acreate(input, engine):
+            if input == ["Bad text."]:
+                raise openai.error.InvalidRequestError("Invalid input.", "input")
+            return self._response(input)
+
+        with patch("openai.Embedding.acreate", side_effect=acreate):
+            with self.assertRaisesRegex(RuntimeError, r"chunks \[3\]"):
+                self.embeddings_obj.create_embeddings(input=chunks)
+
+        self.assertIsNone(chunks.embeddings)
+
+    def test_should_create_embeddings_from_running_event_loop(self):
+        """
+        Test that embeddings are created when called from a running event loop.
+        """
+
+        async def acreate(input, engine):
+            return self._response(input)
+
+        async def create():
+            return self.embeddings_obj.create_embeddings(input=self.df)
+
+        with patch("openai.Embedding.acreate", side_effect=acreate):
+            df = asyncio.run(create())
+
+        self.assertEqual([11.0, 1.0], df["embeddings"][0])
+        self.assertEqual([], self.embeddings_obj.failures)
+
+    def test_should_give_up_after_max_retries(self):
+        """
+        Test that a request failing with server errors is given up after the retries.
+        """
+        error = openai.error.APIError("Server error.", http_status=503)
+        self.embeddings_obj.max_retries = 2
+
+        with patch("openai.Embedding.acreate", new=AsyncMock(side_effect=error)):
+            df = self.embeddings_obj.create_embeddings(input=self.df)
+
+        self.assertTrue(df["embeddings"].isna().all())
+        self.assertEqual([0, 2, 3, 4], [f.index for f in self.embeddings_obj.failures])
+        self.assertEqual({3}, {f.attempts for f in self.embeddings_obj.failures})
+
+    def test_should_factory_create_async_embeddings(self):
+        """
+        Test that the factory creates asynchronous embeddings on request.
+        """
+        obj = EmbeddingsFactory().create_object(
+            input_type=DataFrame, asynchronous=True, concurrency=4
+        )
+
+        self.assertIsInstance(obj, AsyncDataFrameEmbeddings)
+        self.assertEqual(4, obj.concurrency)
+
+
+class RateLimiterTestCase(TestCase):
+    def test_should_token_bucket_wait_for_refill(self):
+        """
+        Test that acquiring more than the bucket holds waits for the refill.
+        """
+
+        async def acquire_all():
+            bucket = TokenBucket(rate=100, capacity=2)
+            for _ in range(4):
+                await bucket.acquire(1)
+
+        start = time.monotonic()
+        asyncio.run(acquire_all())
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.015)
+
+    def test_should_rate_limiter_apply_both_limits(self):
+        """
+        Test that the limiter holds requests back on the tokens per minute limit.
+        """
+
+        async def acquire_all():
+            limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=600)
+            await limiter.acquire(600)
+            await limiter.acquire(6)
+
+        start = time.monotonic()
+        asyncio.run(acquire_all())
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
+
+    def test_should_raise_exception_with_invalid_rate(self):
+        """
+        Test that a bucket with a non-positive rate raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0, capacity=1)
@@ -0,0 +1,168 @@
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase
+
+import numpy as np
+
+from openaiapp.chunks import ChunkCollection
+from openaiapp.embeddings import LocalEmbeddings
+from openaiapp.factories import TextPreparatoryFactory
+from openaiapp.indexers import IncrementalIndexer, IndexUpdate
+
+
+class IncrementalIndexerTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with an empty indexer over local embeddings and sample documents.
+        """
+        self.embeddings_object = LocalEmbeddings()
+        self.indexer = IncrementalIndexer(
+            text_preparatory=TextPreparatoryFactory().create_object(),
+            embeddings_object=self.embeddings_object,
+            max_tokens=5,
+        )
+        self.documents = [
+            {"url": "http://example.com/a", "text": "First sentence here. Second one."},
+            {
+                "url": "http://example.com/b",
+                "text": "Another page. With two sentences.",
+            },
+            {"url": "http://example.com/c", "text": "A third page."},
+        ]
+
+    def _embedded_texts(self, documents, **kwargs):
+        """
+        Update the index and return the update with the texts sent for embedding.
+        """
+        texts = []
+        encode = self.embeddings_object.encode
+
+        def spy(batch):
+            texts.extend(batch)
+            return encode(batch)
+
+        with patch.object(self.embeddings_object, "encode", side_effect=spy):
+            update = self.indexer.update(documents, **kwargs)
+        return update, texts
+
+    def test_should_index_all_chunks_at_first(self):
+        """
+        Test that the first update chunks and embeds every document.
+        """
+        update, texts = self._embedded_texts(self.documents)
+
+        self.assertIsInstance(update, IndexUpdate)
+        self.assertEqual((3, 0, 0, 5, 0, 0), tuple(update))
+        collection = self.indexer.live_collection()
+        self.assertEqual(5, len(collection))
+        self.assertEqual(sorted(texts), sorted(collection.iter_texts()))
+
+    def test_should_skip_unchanged_documents(self):
+        """
+        Test that a recrawl without changes embeds nothing.
+        """
+        self.indexer.update(self.documents)
+        update, texts = self._embedded_texts(self.documents)
+
+        self.assertEqual((0, 3, 0, 0, 0, 0), tuple(update))
+        self.assertEqual([], texts)
+
+    def test_should_embed_only_changed_chunks(self):
+        """
+        Test that only the new chunks of a changed document are embedded
+        and the replaced chunks are tombstoned.
+        """
+        self.indexer.update(self.documents)
+        before = self.indexer.live_collection()
+        kept = before.embeddings[list(before.iter_texts()).index("Second one.")]
+
+        documents = [dict(doc) for doc in self.documents]
+        documents[0]["text"] = "First sentence changed. Second one."
+        update, texts = self._embedded_texts(documents)
+
+        self.assertEqual((1, 2, 0, 1, 1, 1), tuple(update))
+        self.assertEqual(["First sentence changed."], texts)
+        collection = self.indexer.live_collection()
+        self.assertEqual(5, len(collection))
+        np.testing.assert_array_equal(
+            kept,
+            collection.embeddings[list(collection.iter_texts()).index("Second one.")],
+        )
+        self.assertNotIn("First sentence here.", list(collection.iter_texts()))
+
+    def test_should_tombstone_removed_documents(self):
+        """
+        Test that documents missing from a recrawl are removed, unless asked to keep them.
+        """
+        self.indexer.update(self.documents)
+
+        update = self.indexer.update(self.documents[:2], remove_missing=False)
+        self.assertEqual(0, update.documents_removed)
+
+        update = self.indexer.update(self.documents[:2])
+        self.assertEqual((0, 2, 1, 0, 0, 1), tuple(update))
+        self.assertEqual(
+            {"http://example.com/a", "http://example.com/b"},
+            {chunk.url for chunk in self.indexer.live_collection()},
+        )
+
+    def test_should_keep_index_when_embedding_fails(self):
+        """
+        Test that a failed update leaves the index unchanged, so retrying it re-embeds.
+        """
+        self.indexer.update(self.documents)
+        documents = [{"url": "http://example.com/a", "text": "A new text."}]
+
+        with patch.object(
+            self.embeddings_object, "encode", side_effect=RuntimeError("Unavailable.")
+        ):
+            with self.assertRaises(RuntimeError):
+                self.indexer.update(documents, remove_missing=False)
+        self.assertIn(
+            "First sentence here.", self.indexer.live_collection().iter_texts()
+        )
+
+        update, texts = self._embedded_texts(documents, remove_missing=False)
+        self.assertEqual((1, 0, 0, 1, 0, 2), tuple(update))
+        self.assertEqual(["A new text."], texts)
+
+    def test_should_index_empty_documents_without_chunks(self):
+        """
+        Test that new and emptied documents without text are indexed without chunks.
+        """
+        self.indexer.update(self.documents)
+        documents = [
+            {"url": "http://example.com/a", "text": ""},
+            {"url": "http://example.com/d", "text": ""},
+        ]
+
+        update, texts = self._embedded_texts(documents, remove_missing=False)
+        self.assertEqual((2, 0, 0, 0, 0, 2), tuple(update))
+        self.assertEqual([], texts)
+        self.assertNotIn(
+            "http://example.com/a",
+            {chunk.url for chunk in self.indexer.live_collection()},
+        )
+        update = self.indexer.update(documents, remove_missing=False)
+        self.assertEqual(2, update.documents_unchanged)
+
+    def test_should_save_and_load_index(self):
+        """
+        Test that a saved index loads back and still skips unchanged documents.
+        """
+        self.indexer.update(self.documents)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.indexer.save(tmp_dir)
+            self.indexer = IncrementalIndexer.load(
+                tmp_dir,
+                text_preparatory=TextPreparatoryFactory().create_object(),
+                embeddings_object=self.embeddings_object,
+                max_tokens=5,
+            )
+
+        update, texts = self._embedded_texts(self.documents)
+        self.assertEqual(3, update.documents_unchanged)
+        self.assertEqual([], texts)
+        self.assertIsInstance(self.indexer.live_collection(), ChunkCollection)
+        self.assertEqual(5, len(self.indexer.live_collection()))
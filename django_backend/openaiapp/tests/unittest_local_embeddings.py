@@ -0,0 +1,91 @@
+from django.test import TestCase
+
+import numpy as np
+from pandas import DataFrame
+
+from openaiapp.embeddings import AbstractEmbeddings, LocalEmbeddings
+from openaiapp.factories import (
+    AIQuestionAnsweringFactory,
+    EmbeddingsFactory,
+    TextPreparatoryFactory,
+)
+
+
+class LocalEmbeddingsTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with sample texts and local embeddings objects.
+        """
+        self.texts = [
+            "Fact-based news, exclusive video footage, photos and updated maps. Abra kadabra abra kadabra YEAH.",
+            "Fact-based news, exclusive video footage, photos and updated maps. Abra kadabra abra kadabra Csharp.",
+            "The Csharp programming language has pros and cons.",
+        ]
+        self.factory = EmbeddingsFactory()
+        self.text_embeddings_obj = self.factory.create_object(
+            input_type=str, embedding_engine=EmbeddingsFactory.LOCAL_EMBEDDING_ENGINE
+        )
+        self.df_embeddings_obj = self.factory.create_object(
+            input_type=DataFrame,
+            embedding_engine=EmbeddingsFactory.LOCAL_EMBEDDING_ENGINE,
+        )
+
+    def test_should_factory_create_local_embeddings(self):
+        """
+        Test that the factory creates local embeddings for the local engine.
+        """
+        for obj in (self.text_embeddings_obj, self.df_embeddings_obj):
+            self.assertIsInstance(obj, LocalEmbeddings)
+            self.assertIsInstance(obj, AbstractEmbeddings)
+
+    def test_should_be_deterministic(self):
+        """
+        Test that separate objects embed a text identically, as normalized float vectors.
+        """
+        embedding = self.text_embeddings_obj.create_embeddings(self.texts[0])
+
+        self.assertEqual(embedding, LocalEmbeddings().create_embeddings(self.texts[0]))
+        self.assertEqual(LocalEmbeddings.DIM, len(embedding))
+        self.assertIsInstance(embedding[0], float)
+        self.assertAlmostEqual(1.0, np.linalg.norm(embedding), places=5)
+
+    def test_should_similar_texts_be_closer(self):
+        """
+        Test that texts sharing words are more similar than unrelated texts.
+        """
+        embeddings = LocalEmbeddings().encode(self.texts + ["Zebra yacht quartz."])
+
+        self.assertGreater(embeddings[0] @ embeddings[1], embeddings[0] @ embeddings[3])
+        self.assertGreater(embeddings[1] @ embeddings[2], embeddings[0] @ embeddings[2])
+
+    def test_should_embed_dataframe_in_batches(self):
+        """
+        Test that DataFrame embeddings match the text embeddings and skip empty texts.
+        """
+        df = DataFrame({"text": self.texts + [""]})
+        embeddings_obj = LocalEmbeddings(batch_size=2)
+        df = embeddings_obj.create_embeddings(input=df)
+
+        self.assertIsNone(df["embeddings"][3])
+        for text, embedding in zip(self.texts, df["embeddings"]):
+            np.testing.assert_allclose(
+                self.text_embeddings_obj.create_embeddings(text), embedding, atol=1e-6
+            )
+
+    def test_should_answer_context_offline(self):
+        """
+        Test that the question answering context is created end to end with local embeddings.
+        """
+        df = self.df_embeddings_obj.create_embeddings(
+            input=DataFrame({"text": self.texts[:2]})
+        )
+        df = self.df_embeddings_obj.flatten_embeddings(input=df)
+        ai_qa = AIQuestionAnsweringFactory().create_object(
+            text_embeddings_object=self.text_embeddings_obj,
+            text_preparatory=TextPreparatoryFactory().create_object(df=df),
+        )
+        ai_qa.context_max_len = 30
+
+        context = ai_qa.create_context(question="Pros and cons of Csharp?")
+
+        self.assertEqual(self.texts[1], context)
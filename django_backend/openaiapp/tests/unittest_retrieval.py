@@ -0,0 +1,144 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+import numpy as np
+from pandas import DataFrame
+
+from openaiapp.ai_question_answering import AIQuestionAnsweringBasedOnContext
+from openaiapp.chunks import ChunkCollection
+from openaiapp.embedding_stores import EmbeddingStore
+from openaiapp.retrieval import RetrievalIndex
+from openaiapp.vector_db import ApproximateSearch, VectorDBReader, VectorDBWriter
+
+
+class RetrievalIndexTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with a DataFrame of embedded texts and question embeddings.
+        """
+        rng = np.random.default_rng(0)
+        self.df = DataFrame(
+            {
+                "text": [f"Text {idx}." for idx in range(40)],
+                "n_tokens": [2 + idx % 3 for idx in range(40)],
+                "embeddings": list(rng.normal(size=(40, 8))),
+            }
+        )
+        self.questions = {f"Question {idx}?": rng.normal(size=8) for idx in range(16)}
+
+    def _qa(self, **kwargs) -> AIQuestionAnsweringBasedOnContext:
+        """
+        Create a question answering object over the DataFrame with mocked embeddings.
+        """
+        text_preparatory = MagicMock()
+        text_preparatory.generate_tokens_amount.return_value = self.df
+        embeddings_object = MagicMock()
+        embeddings_object.create_embeddings.side_effect = self._embed
+        return AIQuestionAnsweringBasedOnContext(
+            text_preparatory=text_preparatory,
+            text_embeddings_object=embeddings_object,
+            model="model",
+            max_tokens=10,
+            context_max_len=8,
+            stop_sequence=None,
+            **kwargs,
+        )
+
+    def _embed(self, input: str) -> np.ndarray:
+        """
+        Get the embedding of a test question.
+        """
+        return self.questions[input]
+
+    def test_should_freeze_texts_and_token_counts(self):
+        """
+        Test that the loaded arrays are read-only and later DataFrame changes do not reach them.
+        """
+        index = RetrievalIndex.from_prepared(self.df)
+        self.df.loc[0, "text"] = "Changed."
+        self.df["n_tokens"] = 100
+
+        self.assertEqual("Text 0.", index.get_text(0))
+        self.assertEqual(2, index.n_tokens[0])
+        self.assertFalse(index.n_tokens.flags["WRITEABLE"])
+        self.assertFalse(index.store.matrix.flags["WRITEABLE"])
+
+    def test_should_prepare_texts_once(self):
+        """
+        Test that texts are prepared when the index is loaded and not for each question.
+        """
+        qa = self._qa()
+        for question in self.questions:
+            qa.create_context(question)
+
+        qa.text_preparatory.generate_tokens_amount.assert_called_once()
+        self.assertNotIn("distances", self.df.columns)
+
+    def test_should_answer_concurrent_questions_like_serial_ones(self):
+        """
+        Test that questions from many threads sharing one object get their serial contexts.
+        """
+        qa = self._qa()
+        expected = [qa.create_context(question) for question in self.questions]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            contexts = list(executor.map(qa.create_context, list(self.questions) * 8))
+
+        self.assertEqual(expected * 8, contexts)
+
+    def test_should_follow_vector_db_versions(self):
+        """
+        Test that the index of a vector database is reloaded once a new version is committed.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "vector_db")
+            writer = VectorDBWriter(path)
+            chunks = ChunkCollection.from_dataframe(self.df)
+            writer.append(chunks.take(np.arange(20)))
+            qa = self._qa(vector_db=VectorDBReader(path))
+            first = qa.get_retrieval_index()
+            self.assertIs(first, qa.get_retrieval_index())
+
+            writer.append(chunks.take(np.arange(20, 40)))
+            second = qa.get_retrieval_index()
+            self.assertEqual((20, 40), (len(first), len(second)))
+            qa.text_preparatory.generate_tokens_amount.assert_not_called()
+
+    def test_should_search_large_vector_db_versions_approximately(self):
+        """
+        Test that a vector database version of at least the ANN threshold is searched
+        through the indexes of its segments, and smaller versions exactly.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "vector_db")
+            writer = VectorDBWriter(path, ivf_min_size=20)
+            chunks = ChunkCollection.from_dataframe(
+                self.df.assign(url=[f"u{idx % 4}" for idx in range(40)])
+            )
+            writer.append(chunks.take(np.arange(10)))
+            qa = self._qa(
+                vector_db=VectorDBReader(path), ann_threshold=25, ann_n_probe=1000
+            )
+            self.assertIsInstance(qa.get_retrieval_index().store, VectorDBReader)
+
+            writer.append(chunks.take(np.arange(10, 40)))
+            writer.delete(["u0"])
+            index = qa.get_retrieval_index()
+            self.assertEqual(30, len(index))
+            self.assertIsInstance(index.store, ApproximateSearch)
+            query = self.questions["Question 0?"]
+            np.testing.assert_array_equal(
+                index.source.search(query, k=5), index.search(query, k=5)
+            )
+
+    def test_should_raise_exception_with_mismatched_token_counts(self):
+        """
+        Test that a store and token counts of different lengths raise a ValueError.
+        """
+        store = EmbeddingStore.from_embeddings(np.eye(3))
+        with self.assertRaises(ValueError):
+            RetrievalIndex(store, [1, 2], lambda idx: "")
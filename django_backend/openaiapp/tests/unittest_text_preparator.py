@@ -83,6 +83,64 @@ class SimpleTextPreparatorTestCase(TestCase):
         self.assertIsInstance(chunks, list)
         self.assertEqual(expected_chunks, chunks)
 
+    def test_should_iter_chunks_lazily(self):
+        """
+        Test that documents are consumed lazily, one batch at a time, and chunks keep their source URL.
+        """
+        consumed = []
+
+        def documents():
+            for idx in range(10):
+                consumed.append(idx)
+                yield {"url": f"http://example.com/{idx}", "text": self.sample_text_2}
+
+        chunks = self.text_preparatory.iter_chunks(
+            documents(), max_tokens=30, batch_size=2
+        )
+        first_chunk = next(chunks)
+
+        self.assertEqual([0, 1], consumed)
+        self.assertEqual(
+            {
+                "url": "http://example.com/0",
+                "text": "Fact-based news, exclusive video footage, photos and updated maps. "
+                "Abra kadabra abra kadabra YEAH.",
+                "n_tokens": 25,
+            },
+            first_chunk,
+        )
+        self.assertEqual(10 * 3 - 1, len(list(chunks)))
+        self.assertEqual(list(range(10)), consumed)
+
+    def test_should_iter_chunks_skip_missing_texts(self):
+        """
+        Test that documents without text are skipped and short or empty texts are yielded unchanged.
+        """
+        documents = [
+            {"url": "a", "text": None},
+            {"url": "b", "text": "Abra kadabra."},
+            {"url": "c", "text": ""},
+        ]
+        chunks = list(self.text_preparatory.iter_chunks(documents, max_tokens=30))
+
+        self.assertEqual(
+            [
+                {"url": "b", "text": "Abra kadabra.", "n_tokens": 5},
+                {"url": "c", "text": "", "n_tokens": 0},
+            ],
+            chunks,
+        )
+
+    def test_should_raise_exception_with_non_positive_batch_size(self):
+        """
+        Test that a non-positive batch size raises a ValueError when chunks are requested.
+        """
+        for batch_size in (0, -1):
+            with self.assertRaises(ValueError):
+                self.text_preparatory.iter_chunks(
+                    [], max_tokens=30, batch_size=batch_size
+                )
+
 
 class DataFrameTextPreparatorTestCase(TestCase):
     def setUp(self):
@@ -143,6 +201,33 @@ class DataFrameTextPreparatorTestCase(TestCase):
         self.assertIsInstance(shortened_df, DataFrame)
         self.assertEqual(expected_df.to_dict(), shortened_df.to_dict())
 
+    def test_should_shorten_texts_into_overlapping_windows(self):
+        """
+        Test that the windows mode cuts texts into overlapping token windows with their counts and tokens.
+        """
+        max_tokens, overlap_tokens = 30, 5
+        windows_df = self.text_preparatory.shorten_texts(
+            max_tokens=max_tokens,
+            mode=self.text_preparatory.WINDOWS_MODE,
+            overlap_tokens=overlap_tokens,
+        )
+
+        self.assertIsInstance(windows_df, DataFrame)
+        self.assertEqual(["text", "n_tokens", "tokens"], list(windows_df.columns))
+        self.assertEqual([30, 30, 25], windows_df["n_tokens"].tolist())
+        tokens = windows_df["tokens"].tolist()
+        for previous, current in zip(tokens, tokens[1:]):
+            self.assertEqual(
+                list(previous[-overlap_tokens:]), list(current[:overlap_tokens])
+            )
+
+    def test_should_raise_exception_with_unsupported_mode(self):
+        """
+        Test that an unsupported chunking mode raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            self.text_preparatory.shorten_texts(max_tokens=30, mode="paragraphs")
+
     def test_should_max_tokens_be_greater_or_equal(self):
         """
         Test that the function raises a ValueError if the maximum number of tokens is less than MIN_TOKENS.
@@ -172,3 +257,61 @@ class DataFrameTextPreparatorTestCase(TestCase):
             str(context.exception),
             f"Max tokens must be ≤ {max_tokens}. Given: {max_tokens_to_test}.",
         )
+
+
+class ParallelDataFrameTextPreparatorTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with a multi-row DataFrame and sequential and parallel text preparatory instances.
+        """
+        texts = [
+            "Fact-based news, exclusive video footage, photos and updated maps. "
+            "Abra kadabra abra kadabra YEAH. " * idx
+            for idx in range(1, 6)
+        ]
+        self.sample_df = DataFrame(
+            {"url": [f"u{idx}" for idx in range(5)], "text": texts}
+        )
+        self.sequential = TextPreparatoryFactory().create_object(
+            df=self.sample_df.copy()
+        )
+        self.parallel = TextPreparatoryFactory().create_object(
+            df=self.sample_df.copy(), n_workers=2, partition_size=2
+        )
+
+    def test_should_parallel_token_amounts_match_sequential(self):
+        """
+        Test that token counts computed by worker processes match the sequential ones, in row order.
+        """
+        expected_df = self.sequential.generate_tokens_amount()
+        df = self.parallel.generate_tokens_amount()
+
+        self.assertEqual(expected_df.to_dict(), df.to_dict())
+        self.assertEqual(
+            [2, 2, 1], [timing.rows for timing in self.parallel.partition_timings]
+        )
+        for timing in self.parallel.partition_timings:
+            self.assertGreaterEqual(timing.seconds, 0)
+
+    def test_should_parallel_shortened_texts_match_sequential(self):
+        """
+        Test that texts shortened by worker processes match the sequential ones, in row order.
+        """
+        for mode in (
+            self.sequential.SENTENCES_MODE,
+            self.sequential.WINDOWS_MODE,
+        ):
+            expected_df = self.sequential.shorten_texts(max_tokens=30, mode=mode)
+            df = self.parallel.shorten_texts(max_tokens=30, mode=mode)
+
+            self.assertEqual(expected_df["text"].tolist(), df["text"].tolist())
+            self.assertEqual(3, len(self.parallel.partition_timings))
+
+    def test_should_raise_exception_with_invalid_workers(self):
+        """
+        Test that non-positive worker counts and partition sizes raise a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            TextPreparatoryFactory().create_object(df=self.sample_df, n_workers=0)
+        with self.assertRaises(ValueError):
+            TextPreparatoryFactory().create_object(df=self.sample_df, partition_size=0)
@@ -1,6 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
 from django.test import TestCase
 
 from openaiapp.factories import TokenizerFactory
+from openaiapp.tokenizers import TokenizerRegistry
 
 
 class TokenizerTestCase(TestCase):
@@ -53,3 +57,180 @@ class TokenizerTestCase(TestCase):
             decoded_text,
             "Decoded text does not match the original sample text.",
         )
+
+    def test_tokenize_batch(self):
+        """
+        Ensure that batch tokenization returns the same tokens as per-text tokenization, in input order.
+        """
+        texts = [self.sample_text, "", "Abra kadabra.", self.sample_text]
+        tokens = self.tokenizer.tokenize_batch(texts)
+
+        self.assertEqual(len(texts), len(tokens))
+        self.assertEqual(self.expected_tokens, tokens[0])
+        self.assertEqual([], tokens[1])
+        self.assertEqual(self.tokenizer.tokenize_text(texts[2]), tokens[2])
+        self.assertEqual(tokens[0], tokens[3])
+
+    def test_count_tokens_batch(self):
+        """
+        Ensure that batch token counting matches the per-text token counts for any worker count.
+        """
+        texts = [self.sample_text, "", "Abra kadabra."]
+        expected_counts = [len(self.tokenizer.tokenize_text(text)) for text in texts]
+
+        for num_threads in (1, 4):
+            counts = self.tokenizer.count_tokens_batch(texts, num_threads=num_threads)
+            self.assertEqual(expected_counts, counts)
+
+    def test_count_tokens(self):
+        """
+        Ensure that token counting matches the length of the tokenized output.
+        """
+        self.assertEqual(
+            len(self.expected_tokens), self.tokenizer.count_tokens(self.sample_text)
+        )
+        self.assertEqual(0, self.tokenizer.count_tokens(""))
+
+    def test_count_tokens_is_memoized(self):
+        """
+        Ensure that repeated token counts are served from the cache and reported as hits.
+        """
+        tokenizer = TokenizerFactory().create_object(count_cache_size=2)
+
+        tokenizer.count_tokens(self.sample_text)
+        tokenizer.count_tokens(self.sample_text)
+        tokenizer.count_tokens_batch([self.sample_text, "Abra kadabra."])
+
+        info = tokenizer.cache_info()
+        self.assertEqual(2, info.hits)
+        self.assertEqual(2, info.misses)
+        self.assertEqual(2, info.currsize)
+
+    def test_count_tokens_reuses_encoding(self):
+        """
+        Ensure that a text encoded with offsets is counted from the cache without encoding it again.
+        """
+        tokenizer = TokenizerFactory().create_object(count_cache_size=2)
+
+        with patch.object(
+            tokenizer, "tokenize_text", wraps=tokenizer.tokenize_text
+        ) as tokenize_text:
+            tokenizer.encode_text(self.sample_text)
+            count = tokenizer.count_tokens(self.sample_text)
+
+        self.assertEqual(len(self.expected_tokens), count)
+        self.assertEqual(1, tokenize_text.call_count)
+        self.assertEqual(1, tokenizer.cache_info().hits)
+
+    def test_tokenize_text_with_offsets(self):
+        """
+        Ensure that each token offset points at the start of the token in the original text.
+        """
+        for text in (self.sample_text, "Žalgiris čempionai. Ąžuolas!"):
+            tokens, offsets = self.tokenizer.tokenize_text_with_offsets(text)
+
+            self.assertEqual(self.tokenizer.tokenize_text(text), tokens)
+            self.assertEqual(len(tokens), len(offsets))
+            self.assertEqual(0, offsets[0])
+            self.assertEqual(sorted(offsets), offsets)
+
+        tokens, offsets = self.tokenizer.tokenize_text_with_offsets(self.sample_text)
+        decoded = [self.tokenizer.decode_tokens([token]) for token in tokens]
+        for token_text, offset in zip(decoded, offsets):
+            self.assertTrue(self.sample_text.startswith(token_text, offset))
+
+    def test_encode_text(self):
+        """
+        Ensure that the encoded text slices back into its token texts.
+        """
+        encoded = self.tokenizer.encode_text(self.sample_text)
+
+        self.assertEqual(self.expected_tokens, encoded.tokens)
+        self.assertEqual(self.sample_text, encoded.slice(0))
+        self.assertEqual("Fact", encoded.slice(0, 1))
+        self.assertEqual(" maps.", encoded.slice(-2))
+        self.assertEqual("", encoded.slice(5, 5))
+
+    def test_truncate_to_tokens(self):
+        """
+        Ensure that truncated texts are prefixes within the token limit.
+        """
+        for text in (self.sample_text, "Žalgiris čempionai. Ąžuolas!"):
+            for max_tokens in range(len(self.tokenizer.tokenize_text(text)) + 2):
+                truncated = self.tokenizer.truncate_to_tokens(text, max_tokens)
+
+                self.assertTrue(text.startswith(truncated))
+                self.assertLessEqual(self.tokenizer.count_tokens(truncated), max_tokens)
+
+        self.assertEqual(
+            "Fact-based news", self.tokenizer.truncate_to_tokens(self.sample_text, 3)
+        )
+        self.assertEqual(
+            self.sample_text, self.tokenizer.truncate_to_tokens(self.sample_text, 13)
+        )
+
+    def test_truncate_to_tokens_encodes_once(self):
+        """
+        Ensure that a text over the limit is encoded once to be counted and cut.
+        """
+        tokenizer = TokenizerFactory().create_object()
+
+        with patch.object(
+            tokenizer, "tokenize_text", wraps=tokenizer.tokenize_text
+        ) as tokenize_text:
+            truncated = tokenizer.truncate_to_tokens(self.sample_text, 3)
+            tokenizer.truncate_to_tokens(self.sample_text, 13)
+
+        self.assertEqual("Fact-based news", truncated)
+        self.assertEqual(1, tokenize_text.call_count)
+
+    def test_slice_tokens(self):
+        """
+        Ensure that token slices cover the expected parts of the text.
+        """
+        self.assertEqual(
+            " exclusive video footage",
+            self.tokenizer.slice_tokens(self.sample_text, 4, 7),
+        )
+        self.assertEqual(" maps.", self.tokenizer.slice_tokens(self.sample_text, 11))
+
+
+class TokenizerRegistryTestCase(TestCase):
+    def test_should_share_tokenizer_per_encoding(self):
+        """
+        Ensure that the factory hands out one shared tokenizer per encoding with default settings.
+        """
+        tokenizer = TokenizerFactory().create_object()
+
+        self.assertIs(tokenizer, TokenizerFactory().create_object())
+        self.assertIs(tokenizer, TokenizerRegistry.get_tokenizer("cl100k_base"))
+        self.assertIsNot(tokenizer, TokenizerFactory().create_object(num_threads=1))
+
+    def test_should_share_encoder_between_tokenizers(self):
+        """
+        Ensure that tokenizers with custom settings still reuse the shared encoder.
+        """
+        tokenizer = TokenizerFactory().create_object(count_cache_size=0)
+
+        self.assertIs(TokenizerRegistry.get_encoder("cl100k_base"), tokenizer.tokenizer)
+
+    def test_should_share_tokenizer_between_threads(self):
+        """
+        Ensure that concurrent first uses from many threads end up with the same tokenizer.
+        """
+        TokenizerRegistry.clear()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            tokenizers = list(
+                executor.map(TokenizerRegistry.get_tokenizer, ["cl100k_base"] * 16)
+            )
+
+        self.assertEqual(1, len({id(tokenizer) for tokenizer in tokenizers}))
+
+    def test_should_raise_exception_with_unsupported_encoding(self):
+        """
+        Ensure that an unknown encoding raises a ValueError and is not registered.
+        """
+        with self.assertRaises(ValueError):
+            TokenizerRegistry.warm_up(["no_such_encoding"])
+        with self.assertRaises(ValueError):
+            TokenizerRegistry.get_encoder("no_such_encoding")
@@ -0,0 +1,228 @@
+import os
+import tempfile
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+import numpy as np
+from pandas import DataFrame
+
+from openaiapp.ai_question_answering import AIQuestionAnsweringBasedOnContext
+from openaiapp.chunks import ChunkCollection
+from openaiapp.embedding_stores import AbstractEmbeddingStore, EmbeddingStore
+from openaiapp.models import get_vector_db_model, save_flatten_embeddings_to_vector_db
+from openaiapp.vector_db import VectorDBReader, VectorDBWriter
+
+
+class VectorDBTestCase(TestCase):
+    def setUp(self):
+        """
+        Set up the test case with a temporary database and two embedded collections.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "vector_db")
+        self.writer = VectorDBWriter(self.path)
+        rng = np.random.default_rng(0)
+        self.first = self._collection(["a", "a", "b"], rng.normal(size=(3, 8)))
+        self.second = self._collection(["c", "a"], rng.normal(size=(2, 8)))
+        self.query = rng.normal(size=8)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def _collection(urls, embeddings):
+        """
+        Build a collection of chunks with the given URLs and embeddings.
+        """
+        collection = ChunkCollection.from_records(
+            {"url": url, "text": f"Text {idx} of {url}.", "n_tokens": idx + 1}
+            for idx, url in enumerate(urls)
+        )
+        collection.set_embeddings(embeddings)
+        return collection
+
+    def test_should_reader_inherit_abstract(self):
+        """
+        Test that the reader is an embedding store.
+        """
+        self.assertIsInstance(VectorDBReader(self.path), AbstractEmbeddingStore)
+
+    def test_should_search_segments_like_one_store(self):
+        """
+        Test that searching appended segments matches exact search over all chunks.
+        """
+        self.writer.append(self.first)
+        self.writer.append(self.second)
+        reader = VectorDBReader(self.path)
+        store = EmbeddingStore.from_embeddings(
+            np.vstack([self.first.embeddings, self.second.embeddings])
+        )
+
+        self.assertEqual((2, 5, 8), (reader.version, len(reader), reader.dim))
+        self.assertEqual(
+            store.search(self.query).tolist(), reader.search(self.query).tolist()
+        )
+        self.assertEqual("Text 0 of c.", reader.get_text(3))
+        self.assertEqual("a", reader.get_url(4))
+        self.assertEqual([1, 2, 3, 1, 2], reader.n_tokens.tolist())
+
+    def test_should_map_segments_read_only(self):
+        """
+        Test that segment vectors are memory-mapped read-only.
+        """
+        self.writer.append(self.first)
+        segment = VectorDBReader(self.path).segments[0]
+
+        self.assertIsInstance(segment.store.matrix, np.memmap)
+        self.assertFalse(segment.store.matrix.flags["WRITEABLE"])
+
+    def test_should_keep_snapshot_until_refresh(self):
+        """
+        Test that an open reader keeps its version and refresh opens the latest one.
+        """
+        self.writer.append(self.first)
+        reader = VectorDBReader(self.path)
+        self.writer.append(self.second, replace_sources=True)
+
+        self.assertEqual(3, len(reader))
+        refreshed = reader.refresh()
+        self.assertEqual(2, refreshed.version)
+        self.assertIs(refreshed, refreshed.refresh())
+        self.assertEqual(
+            ["Text 2 of b.", "Text 0 of c.", "Text 1 of a."],
+            [refreshed.get_text(idx) for idx in range(len(refreshed))],
+        )
+
+    def test_should_delete_and_compact(self):
+        """
+        Test that deleted chunks are hidden and compaction merges the live ones.
+        """
+        self.writer.append(self.first)
+        self.writer.append(self.second)
+        self.writer.delete(["a"])
+        reader = VectorDBReader(self.path)
+        self.assertEqual(["b", "c"], [reader.get_url(idx) for idx in range(2)])
+
+        self.writer.compact()
+        compacted = VectorDBReader(self.path)
+        self.assertEqual(1, len(compacted.segments))
+        self.assertEqual(
+            reader.search(self.query).tolist(), compacted.search(self.query).tolist()
+        )
+        # The old reader still reads its removed segments through their mappings.
+        self.assertEqual("Text 2 of b.", reader.get_text(0))
+
+    def test_should_not_commit_deletions_of_missing_urls(self):
+        """
+        Test that deleting URLs without live chunks keeps the current version.
+        """
+        self.assertEqual(0, self.writer.delete(["a"]))
+        self.writer.append(self.first)
+        self.assertEqual(2, self.writer.delete(["a"]))
+        self.assertEqual(2, self.writer.delete(["a", "nothing"]))
+        self.assertEqual(2, VectorDBReader(self.path).version)
+
+    def test_should_search_indexed_segments_approximately(self):
+        """
+        Test that large segments are written with an index whose search, probing
+        every list, matches the exact search of the live chunks.
+        """
+        rng = np.random.default_rng(1)
+        writer = VectorDBWriter(self.path, ivf_min_size=10)
+        writer.append(self.first)
+        writer.append(
+            self._collection(["d", "e"] * 150, rng.normal(size=(300, 8))),
+            replace_sources=False,
+        )
+        writer.delete(["a", "d"])
+        reader = VectorDBReader(self.path)
+        self.assertEqual([None], [segment.ivf for segment in reader.segments[:1]])
+        self.assertIsNotNone(reader.segments[1].ivf)
+
+        approximate = reader.approximate(n_probe=reader.segments[1].ivf.n_lists)
+        self.assertEqual(len(reader), len(approximate))
+        for query in rng.normal(size=(5, 8)):
+            self.assertEqual(
+                reader.search(query, k=10).tolist(),
+                approximate.search(query, k=10).tolist(),
+            )
+
+    def test_should_compact_above_max_segments(self):
+        """
+        Test that appending past the max segments merges them into one.
+        """
+        writer = VectorDBWriter(self.path, max_segments=2)
+        for _ in range(3):
+            writer.append(self.second)
+
+        reader = VectorDBReader(self.path)
+        self.assertEqual((1, 6), (len(reader.segments), len(reader)))
+
+    def test_should_ignore_uncommitted_segments(self):
+        """
+        Test that a segment written without its manifest commit is never read and is cleaned up.
+        """
+        self.writer.append(self.first)
+        self.writer._write_segment(self.second, version=2)
+
+        self.assertEqual(3, len(VectorDBReader(self.path)))
+        self.writer.append(self.first)
+        self.assertEqual(
+            ["LOCK", "MANIFEST.json", "segment-000001", "segment-000002"],
+            sorted(os.listdir(self.path)),
+        )
+
+    def test_should_raise_exception_with_invalid_chunks(self):
+        """
+        Test that chunks without embeddings or with other dimensions raise a ValueError.
+        """
+        self.writer.append(self.first)
+        with self.assertRaises(ValueError):
+            self.writer.append(ChunkCollection.from_records([]))
+        with self.assertRaises(ValueError):
+            self.writer.append(self._collection(["d"], np.ones((1, 4))))
+
+    def test_should_save_and_get_vector_db_model(self):
+        """
+        Test that the models functions save flattened DataFrame embeddings and share a reader.
+        """
+        df = DataFrame(
+            {
+                "url": ["a", "b"],
+                "text": ["First.", "Second."],
+                "n_tokens": [2, 2],
+                "embeddings": [np.array([1.0, 0.0]), np.array([0.0, 1.0])],
+            }
+        )
+        self.assertEqual(1, save_flatten_embeddings_to_vector_db(df, path=self.path))
+
+        model = get_vector_db_model(self.path)
+        self.assertIs(model, get_vector_db_model(self.path))
+        self.assertEqual([1, 0], model.search([0.0, 1.0]).tolist())
+
+        save_flatten_embeddings_to_vector_db(df.iloc[:1], path=self.path)
+        self.assertEqual(2, get_vector_db_model(self.path).version)
+        self.assertEqual(2, len(get_vector_db_model(self.path)))
+
+    def test_should_create_context_from_vector_db(self):
+        """
+        Test that question answering reads the context from the vector database
+        without preparing texts.
+        """
+        self.writer.append(self.first)
+        text_preparatory = MagicMock()
+        embeddings_object = MagicMock()
+        embeddings_object.create_embeddings.return_value = self.first.embeddings[2]
+        qa = AIQuestionAnsweringBasedOnContext(
+            text_preparatory=text_preparatory,
+            text_embeddings_object=embeddings_object,
+            model="model",
+            max_tokens=10,
+            context_max_len=3,
+            stop_sequence=None,
+            vector_db=VectorDBReader(self.path),
+        )
+
+        self.assertEqual("Text 2 of b.", qa.create_context("Question?"))
+        text_preparatory.generate_tokens_amount.assert_not_called()
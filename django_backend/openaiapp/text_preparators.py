@@ -1,9 +1,15 @@
-import re
-from typing import List
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice, repeat
+from typing import Iterable, Iterator, List, NamedTuple, Tuple, Union
 from abc import ABC, abstractmethod
 
 from pandas import DataFrame
 
+from openaiapp.chunkers import SentenceChunker, SlidingWindowChunker, TextChunk
+from openaiapp.chunks import ChunkCollection
+from openaiapp.tokenizers import Tokenizer
+
 
 class AbstractTextPreparatory(ABC):
     """
@@ -25,39 +31,137 @@ class TextPreparatory(AbstractTextPreparatory):
     Splits text into chunks based on token limits.
     """
 
+    SENTENCES_MODE = "sentences"
+    WINDOWS_MODE = "windows"
+    BATCH_SIZE = 256
+
     def __init__(self, tokenizer):
         self.tokenizer = tokenizer
+        self.chunker = SentenceChunker(tokenizer=tokenizer)
 
     def split_text_into_chunks(self, text: str, max_tokens: int) -> List[str]:
         """
         Splits text into chunks, each with at most `max_tokens` tokens.
         """
-        sentences = re.split(r"(?<=[.!?])\s+", text)
-        sentence_token_counts = [
-            (sentence, len(self.tokenizer.tokenize_text(sentence)))
-            for sentence in sentences
-        ]
+        return [chunk.text for chunk in self.chunk_text(text, max_tokens)]
+
+    def chunk_text(
+        self, text: str, max_tokens: int, tokens: List[int] = None
+    ) -> List[TextChunk]:
+        """
+        Splits text into chunks, each with at most `max_tokens` tokens,
+        and returns them together with their token counts.
+        """
+        return self.chunker.chunk_text(text, max_tokens, tokens=tokens)
 
-        chunks, current_chunk, current_chunk_size = [], "", 0
+    def split_text_into_windows(
+        self,
+        text: str,
+        max_tokens: int,
+        overlap_tokens: int = 0,
+        tokens: List[int] = None,
+    ) -> List[TextChunk]:
+        """
+        Splits text into windows of `max_tokens` tokens overlapping by `overlap_tokens`.
+        Each window carries its tokens as a uint32 view into one encoded buffer.
+        """
+        chunker = SlidingWindowChunker(
+            tokenizer=self.tokenizer, overlap_tokens=overlap_tokens
+        )
+        return chunker.chunk_text(text, max_tokens, tokens=tokens)
 
-        for idx, (sentence, size) in enumerate(sentence_token_counts):
-            assert (
-                size <= max_tokens
-            ), f"Sentence token count exceeds max tokens. Tokens: {size}, Max: {max_tokens}."
+    def iter_chunks(
+        self,
+        documents: Iterable[dict],
+        max_tokens: int,
+        mode: str = SENTENCES_MODE,
+        overlap_tokens: int = 0,
+        batch_size: int = BATCH_SIZE,
+    ) -> Iterator[dict]:
+        """
+        Lazily splits a stream of `{url, text}` documents into chunks of at most `max_tokens` tokens.
 
-            next_size = (
-                sentence_token_counts[idx + 1][1]
-                if idx < len(sentence_token_counts) - 1
-                else -1
-            )
-            current_chunk += (" " + sentence) if current_chunk else sentence
-            current_chunk_size += size
+        Documents are read and encoded `batch_size` at a time, so memory stays bounded
+        whatever the corpus size. Each yielded record holds the chunk's `url`, `text` and
+        `n_tokens`, plus its uint32 `tokens` in the windows mode.
+        In the sentences mode texts within the limit, empty ones included, are yielded unchanged;
+        documents without a text are skipped.
+        A ChunkCollection can be passed as documents to re-chunk it.
 
-            if next_size == -1 or current_chunk_size + next_size > max_tokens:
-                chunks.append(current_chunk)
-                current_chunk, current_chunk_size = "", 0
+        :raises ValueError: If the mode is unsupported or the batch size is not positive.
+        """
+        if mode not in (self.SENTENCES_MODE, self.WINDOWS_MODE):
+            raise ValueError(f"Unsupported chunking mode: {mode}.")
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be ≥ 1. Given: {batch_size}.")
+        if isinstance(documents, ChunkCollection):
+            documents = documents.iter_records()
+        return self._iter_chunks(
+            documents, max_tokens, mode, overlap_tokens, batch_size
+        )
 
-        return chunks
+    def _iter_chunks(
+        self,
+        documents: Iterable[dict],
+        max_tokens: int,
+        mode: str,
+        overlap_tokens: int,
+        batch_size: int,
+    ) -> Iterator[dict]:
+        """
+        Generates the chunks of `iter_chunks` once its arguments are checked.
+        """
+        for batch in _batched(documents, batch_size):
+            batch = [doc for doc in batch if isinstance(doc.get("text"), str)]
+            texts = [doc["text"] for doc in batch]
+
+            for doc, tokens in zip(batch, self.tokenizer.tokenize_batch(texts)):
+                text, url = doc["text"], doc.get("url")
+                if mode == self.WINDOWS_MODE:
+                    for chunk in self.split_text_into_windows(
+                        text, max_tokens, overlap_tokens, tokens=tokens
+                    ):
+                        yield {
+                            "url": url,
+                            "text": chunk.text,
+                            "n_tokens": chunk.n_tokens,
+                            "tokens": chunk.tokens,
+                        }
+                elif len(tokens) > max_tokens:
+                    for chunk in self.chunk_text(text, max_tokens, tokens=tokens):
+                        yield {
+                            "url": url,
+                            "text": chunk.text,
+                            "n_tokens": chunk.n_tokens,
+                        }
+                else:
+                    yield {"url": url, "text": text, "n_tokens": len(tokens)}
+
+    def collect_chunks(
+        self,
+        documents: Iterable[dict],
+        max_tokens: int,
+        mode: str = SENTENCES_MODE,
+        overlap_tokens: int = 0,
+    ) -> ChunkCollection:
+        """
+        Splits documents into chunks packed into a compact ChunkCollection.
+        Token buffers are kept in the windows mode.
+        """
+        return ChunkCollection.from_records(
+            self.iter_chunks(documents, max_tokens, mode, overlap_tokens),
+            keep_tokens=mode == self.WINDOWS_MODE,
+        )
+
+
+class PartitionTiming(NamedTuple):
+    """
+    Time spent by a worker process on one DataFrame partition.
+    """
+
+    partition: int
+    rows: int
+    seconds: float
 
 
 class DataFrameTextPreparatory(TextPreparatory):
@@ -66,39 +170,118 @@ class DataFrameTextPreparatory(TextPreparatory):
     Extends TextPreparatory to handle DataFrame-specific operations.
     """
 
-    def __init__(self, df: DataFrame, tokenizer, min_tokens: int, max_tokens: int):
+    N_WORKERS = 1
+    PARTITION_SIZE = 1000
+
+    def __init__(
+        self,
+        df: Union[DataFrame, ChunkCollection],
+        tokenizer,
+        min_tokens: int,
+        max_tokens: int,
+        n_workers: int = N_WORKERS,
+        partition_size: int = PARTITION_SIZE,
+    ):
+        """
+        Initialize the DataFrame text preparatory.
+
+        The texts may also come packed in a ChunkCollection instead of a DataFrame.
+        With `n_workers` > 1 the DataFrame is split into partitions of `partition_size`
+        rows, which are processed by a pool of worker processes.
+        """
         super().__init__(tokenizer=tokenizer)
+        if n_workers < 1:
+            raise ValueError(f"Number of workers must be ≥ 1. Given: {n_workers}.")
+        if partition_size < 1:
+            raise ValueError(f"Partition size must be ≥ 1. Given: {partition_size}.")
         self.df = df
         self._min_tokens = min_tokens
         self._max_tokens = max_tokens
+        self.n_workers = n_workers
+        self.partition_size = partition_size
+        self.partition_timings = []
 
-    def shorten_texts(self, max_tokens: int = None) -> DataFrame:
+    def shorten_texts(
+        self,
+        max_tokens: int = None,
+        mode: str = TextPreparatory.SENTENCES_MODE,
+        overlap_tokens: int = 0,
+    ) -> DataFrame:
         """
         Shortens texts in the DataFrame to a specified token limit.
+
+        In the sentences mode texts over the limit are split into chunks of whole sentences.
+        In the windows mode every text is cut into token windows overlapping by
+        `overlap_tokens`, returned with their token counts and uint32 token buffers.
+        This is a thin wrapper over `iter_chunks`.
         """
         max_tokens = self._max_tokens if max_tokens is None else max_tokens
         self._check_max_tokens_amount(max_tokens)
 
-        shortened_texts = []
-        for text in self.df["text"].dropna():
-            token_count = len(self.tokenizer.tokenize_text(text))
-            shortened_texts.extend(
-                self.split_text_into_chunks(text, max_tokens)
-                if token_count > max_tokens
-                else [text]
+        documents = self._iter_documents()
+        columns = (
+            ["text", "n_tokens", "tokens"] if mode == self.WINDOWS_MODE else ["text"]
+        )
+
+        if self.n_workers > 1:
+            records = chain.from_iterable(
+                self._map_partitions(
+                    _chunk_partition, documents, max_tokens, mode, overlap_tokens
+                )
             )
+        else:
+            records = self.iter_chunks(documents, max_tokens, mode, overlap_tokens)
 
-        return DataFrame(data=shortened_texts, columns=["text"])
+        return DataFrame.from_records(records, columns=columns)
 
-    def generate_tokens_amount(self) -> DataFrame:
+    def generate_tokens_amount(self) -> Union[DataFrame, ChunkCollection]:
         """
         Generates token counts for each text in the DataFrame.
+        A ChunkCollection already holds its token counts and is returned as is.
         """
-        self.df["n_tokens"] = self.df["text"].apply(
-            lambda x: len(self.tokenizer.tokenize_text(x)) if x else 0
-        )
+        if isinstance(self.df, ChunkCollection):
+            return self.df
+
+        texts = [text if text else "" for text in self.df["text"]]
+        if self.n_workers > 1:
+            self.df["n_tokens"] = list(
+                chain.from_iterable(self._map_partitions(_count_partition, texts))
+            )
+        else:
+            self.df["n_tokens"] = self.tokenizer.count_tokens_batch(texts)
         return self.df
 
+    def _iter_documents(self) -> Iterator[dict]:
+        """
+        Iterates over the rows of the DataFrame or chunks of the ChunkCollection as `{url, text}` documents.
+        """
+        if isinstance(self.df, ChunkCollection):
+            return self.df.iter_records()
+        urls = self.df["url"] if "url" in self.df.columns else repeat(None)
+        return ({"url": url, "text": text} for url, text in zip(urls, self.df["text"]))
+
+    def _map_partitions(self, func, items: Iterable, *args) -> List[list]:
+        """
+        Runs `func` over partitions of the items in a process pool.
+        Each worker loads the encoder once; results come back in the original order
+        and the time spent on each partition is recorded in `partition_timings`.
+        """
+        partitions = list(_batched(items, self.partition_size))
+        with ProcessPoolExecutor(
+            max_workers=min(self.n_workers, len(partitions)) or 1,
+            initializer=_init_worker,
+            initargs=(self.tokenizer.encoding,),
+        ) as executor:
+            results = list(
+                executor.map(func, partitions, *(repeat(arg) for arg in args))
+            )
+
+        self.partition_timings = [
+            PartitionTiming(partition=idx, rows=len(partition), seconds=seconds)
+            for idx, (partition, (_, seconds)) in enumerate(zip(partitions, results))
+        ]
+        return [result for result, _ in results]
+
     def _check_max_tokens_amount(self, max_tokens: int):
         """
         Validates that the maximum token count is within the allowed range.
@@ -119,3 +302,48 @@ class DataFrameTextPreparatory(TextPreparatory):
     @property
     def max_tokens(self):
         return self._max_tokens
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Yield lists of up to `size` consecutive items of the iterable.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# The text preparatory of a worker process, created once by `_init_worker`.
+_worker_preparatory = None
+
+
+def _init_worker(encoding: str):
+    """
+    Load the encoder once per worker process.
+    """
+    global _worker_preparatory
+    _worker_preparatory = TextPreparatory(
+        tokenizer=Tokenizer(encoding=encoding, num_threads=1)
+    )
+
+
+def _count_partition(texts: List[str]) -> Tuple[List[int], float]:
+    """
+    Count the tokens of a partition of texts in a worker process.
+    """
+    start = time.perf_counter()
+    counts = _worker_preparatory.tokenizer.count_tokens_batch(texts)
+    return counts, time.perf_counter() - start
+
+
+def _chunk_partition(
+    documents: List[dict], max_tokens: int, mode: str, overlap_tokens: int
+) -> Tuple[List[dict], float]:
+    """
+    Chunk a partition of documents in a worker process.
+    """
+    start = time.perf_counter()
+    records = list(
+        _worker_preparatory.iter_chunks(documents, max_tokens, mode, overlap_tokens)
+    )
+    return records, time.perf_counter() - start
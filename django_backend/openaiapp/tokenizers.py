@@ -1,8 +1,50 @@
+import threading
 from abc import ABC, abstractmethod
-from typing import List
+from itertools import accumulate
+from typing import Iterable, List, NamedTuple, Tuple
 
 import tiktoken
 
+from openaiapp.caches import CacheInfo, LRUCache, text_digest
+
+
+class EncodedText(NamedTuple):
+    """
+    A text with its token IDs and the character offset where each token starts.
+    Cuts on token positions are plain string slices, no re-encoding is needed.
+    """
+
+    text: str
+    tokens: List[int]
+    offsets: List[int]
+
+    def slice(self, start: int, end: int = None) -> str:
+        """
+        Get the part of the text covered by tokens `start:end`.
+
+        :param start: The index of the first token.
+        :param end: The index after the last token, defaults to the end of the text.
+        :return: The part of the original text.
+        """
+        n_tokens = len(self.tokens)
+        start, end, _ = slice(start, end).indices(n_tokens)
+        if start >= end:
+            return ""
+        text_start = self.offsets[start]
+        text_end = self.offsets[end] if end < n_tokens else len(self.text)
+        return self.text[text_start:text_end]
+
+    def truncate(self, max_tokens: int) -> str:
+        """
+        Get the longest prefix of the text with at most `max_tokens` tokens.
+
+        :param max_tokens: The maximum number of tokens to keep.
+        :return: The prefix of the original text.
+        """
+        if max_tokens >= len(self.tokens):
+            return self.text
+        return self.text[: self.offsets[max(max_tokens, 0)]]
+
 
 class AbstractTokenizer(ABC):
     """
@@ -30,6 +72,169 @@ class AbstractTokenizer(ABC):
         """
         pass
 
+    @abstractmethod
+    def tokenize_text_with_offsets(self, text: str) -> Tuple[List[int], List[int]]:
+        """
+        Tokenize the given text and locate each token in it.
+
+        :param text: Text to be tokenized.
+        :return: A tuple of token IDs and the character offset where each token starts.
+        """
+        pass
+
+    @abstractmethod
+    def token_offsets(self, text: str, tokens: List[int]) -> List[int]:
+        """
+        Locate already encoded tokens in the text they were encoded from.
+
+        :param text: The text the tokens were encoded from.
+        :param tokens: Token IDs of the text.
+        :return: The character offset where each token starts.
+        """
+        pass
+
+    @abstractmethod
+    def encode_text(self, text: str) -> EncodedText:
+        """
+        Encode the given text with token offsets for cutting it on token positions.
+
+        :param text: Text to be encoded.
+        :return: The text with its tokens and their offsets.
+        """
+        pass
+
+    @abstractmethod
+    def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """
+        Cut the given text down to its first `max_tokens` tokens.
+
+        :param text: Text to be truncated.
+        :param max_tokens: The maximum number of tokens to keep.
+        :return: The longest prefix of the text within the limit.
+        """
+        pass
+
+    @abstractmethod
+    def slice_tokens(self, text: str, start: int, end: int = None) -> str:
+        """
+        Get the part of the given text covered by tokens `start:end`.
+
+        :param text: Text to be sliced.
+        :param start: The index of the first token.
+        :param end: The index after the last token.
+        :return: The part of the original text.
+        """
+        pass
+
+    @abstractmethod
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens of the given text without returning the tokens.
+
+        :param text: Text whose tokens should be counted.
+        :return: The number of tokens.
+        """
+        pass
+
+    @abstractmethod
+    def tokenize_batch(
+        self, texts: List[str], num_threads: int = None
+    ) -> List[List[int]]:
+        """
+        Tokenize many texts at once.
+
+        :param texts: Texts to be tokenized.
+        :param num_threads: Number of worker threads to use.
+        :return: A list with the token IDs of each text, in input order.
+        """
+        pass
+
+    @abstractmethod
+    def count_tokens_batch(
+        self, texts: List[str], num_threads: int = None
+    ) -> List[int]:
+        """
+        Count the tokens of many texts at once.
+
+        :param texts: Texts whose tokens should be counted.
+        :param num_threads: Number of worker threads to use.
+        :return: A list with the token count of each text, in input order.
+        """
+        pass
+
+
+class TokenizerRegistry:
+    """
+    Process-wide registry of tokenizers, safe to use from many threads.
+    Keeps one tiktoken encoder and one shared default Tokenizer per encoding name,
+    so the BPE ranks are loaded once per process.
+    """
+
+    _encoders = {}
+    _tokenizers = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def get_encoder(cls, encoding: str) -> tiktoken.Encoding:
+        """
+        Get the shared tiktoken encoder, loading it on first use.
+
+        :param encoding: Name of the encoding.
+        :return: The tiktoken encoder.
+        :raises ValueError: If the specified encoding is not supported.
+        """
+        encoder = cls._encoders.get(encoding)
+        if encoder is None:
+            with cls._lock:
+                encoder = cls._encoders.get(encoding)
+                if encoder is None:
+                    try:
+                        encoder = tiktoken.get_encoding(encoding)
+                    except Exception as e:
+                        raise ValueError(
+                            f"Initialization error with encoding '{encoding}': {e}"
+                        )
+                    cls._encoders[encoding] = encoder
+        return encoder
+
+    @classmethod
+    def get_tokenizer(cls, encoding: str) -> "Tokenizer":
+        """
+        Get the shared Tokenizer with default settings, creating it on first use.
+
+        :param encoding: Name of the encoding.
+        :return: The shared Tokenizer.
+        :raises ValueError: If the specified encoding is not supported.
+        """
+        tokenizer = cls._tokenizers.get(encoding)
+        if tokenizer is None:
+            cls.get_encoder(encoding)
+            with cls._lock:
+                tokenizer = cls._tokenizers.get(encoding)
+                if tokenizer is None:
+                    tokenizer = cls._tokenizers[encoding] = Tokenizer(encoding)
+        return tokenizer
+
+    @classmethod
+    def warm_up(cls, encodings: Iterable[str]):
+        """
+        Load the shared tokenizers of the given encodings ahead of their first use.
+
+        :param encodings: Names of the encodings.
+        :raises ValueError: If an encoding is not supported.
+        """
+        for encoding in encodings:
+            cls.get_tokenizer(encoding)
+
+    @classmethod
+    def clear(cls):
+        """
+        Drop all shared encoders and tokenizers.
+        """
+        with cls._lock:
+            cls._encoders.clear()
+            cls._tokenizers.clear()
+
 
 class Tokenizer(AbstractTokenizer):
     """
@@ -37,17 +242,29 @@ class Tokenizer(AbstractTokenizer):
     Utilizes the 'tiktoken' library for tokenization and decoding.
     """
 
-    def __init__(self, encoding: str):
+    NUM_THREADS = 8
+    COUNT_CACHE_SIZE = 65536
+
+    def __init__(
+        self,
+        encoding: str,
+        num_threads: int = NUM_THREADS,
+        count_cache_size: int = COUNT_CACHE_SIZE,
+    ):
         """
         Initialize the tokenizer with the specified encoding.
 
         :param encoding: Encoding to use for the tokenizer.
+        :param num_threads: Default number of worker threads for batch operations.
+        :param count_cache_size: Max number of token counts to memoize, 0 disables it.
         :raises ValueError: If the specified encoding is not supported.
         """
-        try:
-            self.tokenizer = tiktoken.get_encoding(encoding)
-        except Exception as e:
-            raise ValueError(f"Initialization error with encoding '{encoding}': {e}")
+        if num_threads < 1:
+            raise ValueError(f"Number of threads must be ≥ 1. Given: {num_threads}.")
+        self.encoding = encoding
+        self.num_threads = num_threads
+        self.count_cache = LRUCache(maxsize=count_cache_size)
+        self.tokenizer = TokenizerRegistry.get_encoder(encoding)
 
     def tokenize_text(self, text: str) -> List[List[int]]:
         """
@@ -74,3 +291,150 @@ class Tokenizer(AbstractTokenizer):
             return self.tokenizer.decode(tokens)
         except Exception as e:
             raise RuntimeError(f"Decoding error: {e}")
+
+    def tokenize_text_with_offsets(self, text: str) -> Tuple[List[int], List[int]]:
+        """
+        Tokenize the provided text and locate each token in it.
+
+        :param text: Text to tokenize.
+        :return: A tuple of token IDs and the character offset where each token starts.
+        :raises RuntimeError: If tokenization fails.
+        """
+        tokens = self._encode_counted(text)
+        return tokens, self.token_offsets(text, tokens)
+
+    def token_offsets(self, text: str, tokens: List[int]) -> List[int]:
+        """
+        Locate already encoded tokens in the text they were encoded from.
+
+        :param text: The text the tokens were encoded from.
+        :param tokens: Token IDs of the text.
+        :return: The character offset where each token starts.
+        :raises RuntimeError: If decoding fails.
+        """
+        try:
+            if not tokens:
+                return []
+            # For ASCII text byte and character offsets are the same.
+            if text.isascii():
+                token_bytes = self.tokenizer.decode_tokens_bytes(tokens[:-1])
+                return list(accumulate(map(len, token_bytes), initial=0))
+            return self.tokenizer.decode_with_offsets(tokens)[1]
+        except Exception as e:
+            raise RuntimeError(f"Decoding error: {e}")
+
+    def encode_text(self, text: str) -> EncodedText:
+        """
+        Encode the provided text with token offsets for cutting it on token positions.
+
+        :param text: Text to encode.
+        :return: The text with its tokens and their offsets.
+        :raises RuntimeError: If tokenization fails.
+        """
+        return EncodedText(text, *self.tokenize_text_with_offsets(text))
+
+    def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """
+        Cut the provided text down to its first `max_tokens` tokens.
+        Texts already within the limit, as told by the token count cache, are not encoded;
+        other texts are encoded once and cut where the first dropped token starts.
+
+        :param text: Text to truncate.
+        :param max_tokens: The maximum number of tokens to keep.
+        :return: The longest prefix of the text within the limit.
+        :raises RuntimeError: If tokenization fails.
+        """
+        key = text_digest(text)
+        count = self.count_cache.get(key)
+        if count is not None and count <= max_tokens:
+            return text
+        tokens = self._encode_counted(text, key)
+        if len(tokens) <= max_tokens:
+            return text
+        encoded = EncodedText(text, tokens, self.token_offsets(text, tokens))
+        return encoded.truncate(max_tokens)
+
+    def slice_tokens(self, text: str, start: int, end: int = None) -> str:
+        """
+        Get the part of the provided text covered by tokens `start:end`.
+
+        :param text: Text to slice.
+        :param start: The index of the first token.
+        :param end: The index after the last token, defaults to the end of the text.
+        :return: The part of the original text.
+        :raises RuntimeError: If tokenization fails.
+        """
+        return self.encode_text(text).slice(start, end)
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens of the provided text, memoized by the text digest.
+
+        :param text: Text whose tokens should be counted.
+        :return: The number of tokens.
+        :raises RuntimeError: If tokenization fails.
+        """
+        key = text_digest(text)
+        count = self.count_cache.get(key)
+        if count is None:
+            count = len(self._encode_counted(text, key))
+        return count
+
+    def _encode_counted(self, text: str, key: bytes = None) -> List[int]:
+        """
+        Tokenize the provided text and memoize its token count,
+        so a text encoded for offsets or cuts is counted without encoding it again.
+        """
+        tokens = self.tokenize_text(text)
+        self.count_cache.set(text_digest(text) if key is None else key, len(tokens))
+        return tokens
+
+    def tokenize_batch(
+        self, texts: List[str], num_threads: int = None
+    ) -> List[List[int]]:
+        """
+        Tokenize the provided texts with tiktoken's parallel batch encoder.
+
+        :param texts: Texts to tokenize.
+        :param num_threads: Number of worker threads, defaults to `num_threads`.
+        :return: A list of lists of token IDs, in input order.
+        :raises RuntimeError: If tokenization fails.
+        """
+        num_threads = self.num_threads if num_threads is None else num_threads
+        try:
+            # A thread pool only adds overhead when there is nothing to run in parallel.
+            if num_threads == 1:
+                return [self.tokenizer.encode(text) for text in texts]
+            return self.tokenizer.encode_batch(list(texts), num_threads=num_threads)
+        except Exception as e:
+            raise RuntimeError(f"Batch tokenization error: {e}")
+
+    def count_tokens_batch(
+        self, texts: List[str], num_threads: int = None
+    ) -> List[int]:
+        """
+        Count the tokens of the provided texts.
+        Memoized counts are reused, the rest go through tiktoken's parallel batch encoder.
+
+        :param texts: Texts whose tokens should be counted.
+        :param num_threads: Number of worker threads, defaults to `num_threads`.
+        :return: A list of token counts, in input order.
+        :raises RuntimeError: If tokenization fails.
+        """
+        keys = [text_digest(text) for text in texts]
+        counts = [self.count_cache.get(key) for key in keys]
+
+        missed = [idx for idx, count in enumerate(counts) if count is None]
+        if missed:
+            tokens = self.tokenize_batch([texts[idx] for idx in missed], num_threads)
+            for idx, text_tokens in zip(missed, tokens):
+                counts[idx] = len(text_tokens)
+                self.count_cache.set(keys[idx], counts[idx])
+
+        return counts
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Get the hit/miss statistics of the token count cache.
+        """
+        return self.count_cache.info()
@@ -0,0 +1,517 @@
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Sequence
+
+import numpy as np
+
+from openaiapp.chunks import ChunkCollection
+from openaiapp.embedding_stores import (
+    AbstractEmbeddingStore,
+    EmbeddingStore,
+    IVFFlatIndex,
+    top_k,
+)
+
+MANIFEST_FILE = "MANIFEST.json"
+LOCK_FILE = "LOCK"
+SEGMENT_PREFIX = "segment-"
+TMP_PREFIX = ".tmp-"
+IVF_DIR = "ivf"
+
+
+class Segment(NamedTuple):
+    """
+    An immutable segment of the vector database, memory-mapped read-only,
+    with the mask and the indices of its rows not deleted as of the opened version,
+    and the IVFFlatIndex of its rows when one was built with the segment.
+    """
+
+    name: str
+    chunks: ChunkCollection
+    store: EmbeddingStore
+    live: np.ndarray
+    rows: np.ndarray
+    ivf: IVFFlatIndex = None
+
+
+class VectorDBReader(AbstractEmbeddingStore):
+    """
+    Read-only snapshot of an on-disk vector database, safe to open from many processes.
+
+    The database directory holds immutable segments, each a memory-mapped float32 matrix
+    of normalized embeddings next to its chunk texts, token counts and URLs,
+    and a manifest listing the committed segments and their deleted rows.
+    A reader sees the version committed when it was opened, whatever writers do since;
+    `refresh` opens the latest version. Indices run over the live chunks of all segments, in order.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open the latest committed version of the database.
+
+        :param path: The database directory; a missing one opens as an empty database.
+        """
+        self.path = path
+        self.version, self.dim, self.segments = 0, None, []
+        # A compaction may remove segments between reading the manifest and mapping them.
+        for _ in range(3):
+            try:
+                self._open()
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            self._open()
+
+        sizes = [len(segment.rows) for segment in self.segments]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.n_tokens = (
+            np.concatenate(
+                [segment.chunks.n_tokens[segment.live] for segment in self.segments]
+            )
+            if self.segments
+            else np.empty(0, dtype=np.int32)
+        )
+
+    def refresh(self) -> "VectorDBReader":
+        """
+        Get a reader of the latest committed version, this reader when it is still the latest.
+
+        :return: The up to date VectorDBReader.
+        """
+        manifest = _read_manifest(self.path)
+        if manifest["version"] == self.version:
+            return self
+        return VectorDBReader(self.path)
+
+    def similarities(self, query: Sequence[float]) -> np.ndarray:
+        """
+        Compute the cosine similarity of the query to every live chunk.
+
+        :param query: The query embedding.
+        :return: A float32 array with one similarity per live chunk.
+        """
+        if not self.segments:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate(
+            [
+                segment.store.similarities(query)[segment.rows]
+                for segment in self.segments
+            ]
+        )
+
+    def search(self, query: Sequence[float], k: int = None) -> np.ndarray:
+        """
+        Find the indices of the live chunks most similar to the query.
+
+        :param query: The query embedding.
+        :param k: The number of indices to return, all of them by default.
+        :return: The indices ordered from the most to the least similar, ties by index.
+        """
+        return top_k(self.similarities(query), k)
+
+    def search_approximate(
+        self, query: Sequence[float], k: int, n_probe: int = IVFFlatIndex.N_PROBE
+    ) -> np.ndarray:
+        """
+        Find the indices of the live chunks most similar to the query, searching
+        the segments that have an IVFFlatIndex through it and the others exactly.
+
+        :param query: The query embedding.
+        :param k: The number of indices to return.
+        :param n_probe: The number of index lists searched per segment.
+        :return: The indices ordered from the most to the least similar, ties by index.
+        """
+        indices, scores = [], []
+        for position, segment in enumerate(self.segments):
+            if segment.ivf is None:
+                segment_scores = segment.store.similarities(query)[segment.rows]
+                local = top_k(segment_scores, k)
+                segment_scores = segment_scores[local]
+            else:
+                # Deleted rows are still indexed, so as many more candidates are searched.
+                n_deleted = len(segment.live) - len(segment.rows)
+                rows = segment.ivf.search(query, k=k + n_deleted, n_probe=n_probe)
+                rows = rows[segment.live[rows]][:k]
+                prepared = segment.store.prepare_query(query)
+                segment_scores = segment.store.matrix[rows] @ prepared
+                local = np.searchsorted(segment.rows, rows)
+            indices.append(self.offsets[position] + local)
+            scores.append(segment_scores)
+        if not indices:
+            return np.empty(0, dtype=np.int64)
+        indices, scores = np.concatenate(indices), np.concatenate(scores)
+        return indices[np.lexsort((indices, -scores))][:k]
+
+    def approximate(self, n_probe: int = IVFFlatIndex.N_PROBE) -> "ApproximateSearch":
+        """
+        Get a view of this reader whose top-k searches are approximate.
+
+        :param n_probe: The number of index lists searched per segment.
+        :return: A new ApproximateSearch over this reader.
+        """
+        return ApproximateSearch(self, n_probe)
+
+    def get_text(self, index: int) -> str:
+        """
+        Get the text of the live chunk at the index.
+        """
+        segment, row = self._locate(index)
+        return segment.chunks.get_text(row)
+
+    def get_url(self, index: int) -> str:
+        """
+        Get the source URL of the live chunk at the index.
+        """
+        segment, row = self._locate(index)
+        return segment.chunks.urls[segment.chunks.url_ids[row]]
+
+    def collection(self) -> ChunkCollection:
+        """
+        Copy the live chunks with their normalized embeddings into one ChunkCollection.
+
+        :return: A new ChunkCollection.
+        """
+        return ChunkCollection.concat(
+            [segment.chunks.take(segment.rows) for segment in self.segments]
+        )
+
+    def _open(self):
+        """
+        Read the manifest and map its segments.
+        """
+        manifest = _read_manifest(self.path)
+        self.version, self.dim = manifest["version"], manifest["dim"]
+        self.segments = [
+            _open_segment(self.path, entry) for entry in manifest["segments"]
+        ]
+
+    def _locate(self, index: int):
+        """
+        Map an index over the live chunks to its segment and row in the segment.
+        """
+        if not 0 <= index < len(self):
+            raise IndexError("Chunk index out of range.")
+        position = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        segment = self.segments[position]
+        return segment, int(segment.rows[index - self.offsets[position]])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+
+class ApproximateSearch(AbstractEmbeddingStore):
+    """
+    A read-only view of a VectorDBReader searching the top `k` chunks approximately
+    through the IVFFlatIndex persisted with each large segment. Searches without `k`
+    and similarities are exact.
+    """
+
+    def __init__(self, reader: VectorDBReader, n_probe: int = IVFFlatIndex.N_PROBE):
+        """
+        Initialize the view.
+
+        :param reader: The vector database reader.
+        :param n_probe: The number of index lists searched per segment.
+        :raises ValueError: If n_probe is not positive.
+        """
+        if n_probe < 1:
+            raise ValueError(f"Number of probed lists must be ≥ 1. Given: {n_probe}.")
+        self.reader = reader
+        self.n_probe = n_probe
+
+    def similarities(self, query: Sequence[float]) -> np.ndarray:
+        return self.reader.similarities(query)
+
+    def search(self, query: Sequence[float], k: int = None) -> np.ndarray:
+        if k is None:
+            return self.reader.search(query)
+        return self.reader.search_approximate(query, k, n_probe=self.n_probe)
+
+    def __len__(self) -> int:
+        return len(self.reader)
+
+
+class VectorDBWriter:
+    """
+    Appends segments to an on-disk vector database with atomic commits.
+
+    A segment is written to a temporary directory and renamed into place, then the new
+    manifest replaces the old one in a single rename, which is the commit point:
+    a crash at any step leaves the previous version intact. Writers of one database
+    are serialized by a file lock. Once there are more than `MAX_SEGMENTS` segments
+    they are merged into one, dropping deleted rows.
+    Segments of at least `ivf_min_size` chunks are written with an IVFFlatIndex,
+    trained once by the writer and memory-mapped by readers for approximate search.
+    """
+
+    MAX_SEGMENTS = 16
+    IVF_MIN_SIZE = 20000
+
+    def __init__(
+        self,
+        path: str,
+        max_segments: int = MAX_SEGMENTS,
+        ivf_min_size: int = IVF_MIN_SIZE,
+    ):
+        """
+        Initialize the writer, creating the database directory when missing.
+
+        :param path: The database directory.
+        :param max_segments: The number of segments above which they are compacted.
+        :param ivf_min_size: The number of chunks from which a segment gets an IVFFlatIndex,
+            None to write no indexes.
+        :raises ValueError: If the max segments is not positive.
+        """
+        if max_segments < 1:
+            raise ValueError(f"Max segments must be ≥ 1. Given: {max_segments}.")
+        self.path = path
+        self.max_segments = max_segments
+        self.ivf_min_size = ivf_min_size
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, chunks: ChunkCollection, replace_sources: bool = False) -> int:
+        """
+        Commit the embedded chunks as a new segment, normalizing their embeddings.
+
+        :param chunks: The chunks with their embeddings attached.
+        :param replace_sources: Whether stored chunks of the same URLs are deleted.
+        :return: The committed version.
+        :raises ValueError: If the chunks have no embeddings or their dimensions differ.
+        """
+        if chunks.embeddings is None:
+            raise ValueError("The chunk collection has no embeddings.")
+        with self._lock():
+            manifest = _read_manifest(self.path)
+            dim = chunks.embeddings.shape[1]
+            if manifest["dim"] is not None and manifest["dim"] != dim:
+                raise ValueError(
+                    f"Embeddings must have {manifest['dim']} dimensions. Given: {dim}."
+                )
+            version = manifest["version"] + 1
+            segments = manifest["segments"]
+            if replace_sources:
+                segments = self._delete_sources(segments, set(chunks.urls), version)
+            if len(chunks):
+                segments = segments + [{"name": self._write_segment(chunks, version)}]
+            self._commit(version, dim, segments)
+
+            if len(segments) > self.max_segments:
+                return self._compact()
+            return version
+
+    def delete(self, urls: Sequence[str]) -> int:
+        """
+        Commit the deletion of the stored chunks of the URLs.
+        Nothing is committed when none of the URLs has live chunks.
+
+        :param urls: The source URLs whose chunks are deleted.
+        :return: The committed version, the current one when nothing was deleted.
+        """
+        with self._lock():
+            manifest = _read_manifest(self.path)
+            version = manifest["version"] + 1
+            segments = self._delete_sources(manifest["segments"], set(urls), version)
+            if segments == manifest["segments"]:
+                return manifest["version"]
+            self._commit(version, manifest["dim"], segments)
+            return version
+
+    def compact(self) -> int:
+        """
+        Merge all segments into one, dropping deleted rows.
+
+        :return: The committed version.
+        """
+        with self._lock():
+            return self._compact()
+
+    def _compact(self) -> int:
+        """
+        Merge the segments, the writer lock being held.
+        """
+        reader = VectorDBReader(self.path)
+        version = reader.version + 1
+        segments = []
+        if len(reader):
+            segments = [{"name": self._write_segment(reader.collection(), version)}]
+        self._commit(version, reader.dim, segments)
+        # Readers that mapped the old segments keep them until they are closed.
+        for segment in reader.segments:
+            shutil.rmtree(os.path.join(self.path, segment.name), ignore_errors=True)
+        return version
+
+    def _delete_sources(
+        self, segments: List[dict], urls: set, version: int
+    ) -> List[dict]:
+        """
+        Write new deletion masks for the segment rows of the URLs.
+        Masks are new files, so readers of older versions are unaffected.
+        """
+        updated = []
+        for entry in segments:
+            segment = _open_segment(self.path, entry)
+            url_ids = [
+                url_id for url_id, url in enumerate(segment.chunks.urls) if url in urls
+            ]
+            deleted = ~segment.live | np.isin(segment.chunks.url_ids, url_ids)
+            if (deleted != ~segment.live).any():
+                name = f"deleted-{version:06d}.npy"
+                _save_array(os.path.join(self.path, entry["name"], name), deleted)
+                entry = {"name": entry["name"], "deleted": name}
+            updated.append(entry)
+        return updated
+
+    def _write_segment(self, chunks: ChunkCollection, version: int) -> str:
+        """
+        Write the chunks as a segment directory, renamed into place once complete.
+        """
+        name = f"{SEGMENT_PREFIX}{version:06d}"
+        tmp_dir = os.path.join(self.path, f"{TMP_PREFIX}{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        vectors = EmbeddingStore.from_embeddings(chunks.embeddings).matrix
+        _save_array(os.path.join(tmp_dir, "vectors.npy"), vectors)
+        if self.ivf_min_size is not None and len(vectors) >= self.ivf_min_size:
+            ivf_dir = os.path.join(tmp_dir, IVF_DIR)
+            IVFFlatIndex.from_store(EmbeddingStore(vectors)).save(ivf_dir)
+            for file_name in os.listdir(ivf_dir):
+                _fsync_file(os.path.join(ivf_dir, file_name))
+        _save_array(os.path.join(tmp_dir, "text_offsets.npy"), chunks.text_offsets)
+        _save_array(os.path.join(tmp_dir, "n_tokens.npy"), chunks.n_tokens)
+        _save_array(os.path.join(tmp_dir, "url_ids.npy"), chunks.url_ids)
+        _write_file(os.path.join(tmp_dir, "texts.bin"), bytes(chunks.text_blob))
+        _write_file(
+            os.path.join(tmp_dir, "urls.json"), json.dumps(chunks.urls).encode()
+        )
+        os.rename(tmp_dir, os.path.join(self.path, name))
+        return name
+
+    def _commit(self, version: int, dim: int, segments: List[dict]):
+        """
+        Atomically replace the manifest.
+        """
+        manifest = {"version": version, "dim": dim, "segments": segments}
+        tmp_path = os.path.join(self.path, f"{TMP_PREFIX}{MANIFEST_FILE}")
+        _write_file(tmp_path, json.dumps(manifest).encode())
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILE))
+        _fsync_directory(self.path)
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        """
+        Hold the exclusive writer lock of the database, then clear leftovers of crashed writers.
+        """
+        with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._remove_uncommitted()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _remove_uncommitted(self):
+        """
+        Remove temporary files and segments that no committed manifest lists.
+        """
+        committed = {entry["name"] for entry in _read_manifest(self.path)["segments"]}
+        for name in os.listdir(self.path):
+            if name.startswith(TMP_PREFIX) or (
+                name.startswith(SEGMENT_PREFIX) and name not in committed
+            ):
+                path = os.path.join(self.path, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+
+
+def _read_manifest(path: str) -> dict:
+    """
+    Read the committed manifest of the database, an empty one when there is none.
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"version": 0, "dim": None, "segments": []}
+
+
+def _open_segment(path: str, entry: dict) -> Segment:
+    """
+    Map a segment read-only, with its deletion mask when it has one.
+    """
+    directory = os.path.join(path, entry["name"])
+    with open(os.path.join(directory, "urls.json")) as file:
+        urls = json.load(file)
+    text_blob = b""
+    if os.path.getsize(os.path.join(directory, "texts.bin")):
+        with open(os.path.join(directory, "texts.bin"), "rb") as file:
+            text_blob = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+    chunks = ChunkCollection(
+        text_blob=text_blob,
+        text_offsets=np.load(
+            os.path.join(directory, "text_offsets.npy"), mmap_mode="r"
+        ),
+        n_tokens=np.load(os.path.join(directory, "n_tokens.npy"), mmap_mode="r"),
+        url_ids=np.load(os.path.join(directory, "url_ids.npy"), mmap_mode="r"),
+        urls=urls,
+        embeddings=vectors,
+    )
+    live = np.ones(len(chunks), dtype=bool)
+    if entry.get("deleted"):
+        live = ~np.load(os.path.join(directory, entry["deleted"]))
+    ivf_dir = os.path.join(directory, IVF_DIR)
+    return Segment(
+        name=entry["name"],
+        chunks=chunks,
+        store=EmbeddingStore(vectors),
+        live=live,
+        rows=np.flatnonzero(live),
+        ivf=IVFFlatIndex.load(ivf_dir) if os.path.isdir(ivf_dir) else None,
+    )
+
+
+def _save_array(path: str, array: np.ndarray):
+    """
+    Save an array as a `.npy` file flushed to disk.
+    """
+    with open(path, "wb") as file:
+        np.save(file, array)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _fsync_file(path: str):
+    """
+    Flush a file already written to disk.
+    """
+    with open(path, "rb") as file:
+        os.fsync(file.fileno())
+
+
+def _write_file(path: str, data: bytes):
+    """
+    Write bytes to a file flushed to disk.
+    """
+    with open(path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _fsync_directory(path: str):
+    """
+    Flush a directory's entries, so renames in it survive a crash.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
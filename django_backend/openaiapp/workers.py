@@ -0,0 +1,221 @@
+import os
+import socket
+import time
+from typing import Iterable, List
+
+from django.db import transaction
+from django.utils import timezone
+
+from pandas import DataFrame
+
+from openaiapp.embeddings import DataFrameEmbeddings
+from openaiapp.models import EmbeddingJob
+from openaiapp.text_preparators import TextPreparatory
+from openaiapp.vector_db import VectorDBWriter
+
+
+def enqueue_documents(
+    documents: Iterable[dict],
+    text_preparatory: TextPreparatory,
+    max_tokens: int,
+    engine: str,
+) -> int:
+    """
+    Chunk crawled or saved `{url, text}` documents and queue their chunks for embedding.
+    Only tokenization runs here; the embeddings are created and published
+    to the vector database by the `embedding_worker` command.
+
+    :param documents: The documents to enqueue, one per source URL.
+    :param text_preparatory: Splits the documents into chunks.
+    :param max_tokens: The maximum number of tokens per chunk.
+    :param engine: The embedding engine the chunks are embedded with.
+    :return: The number of chunk jobs created or requeued.
+    """
+    documents = list(documents)
+    # Sources left without chunks, e.g. emptied articles, are queued for removal.
+    EmbeddingJob.objects.enqueue_removals(
+        [doc.get("url") for doc in documents if not doc.get("text")], engine=engine
+    )
+    return EmbeddingJob.objects.enqueue_chunks(
+        text_preparatory.iter_chunks(
+            [doc for doc in documents if doc.get("text")], max_tokens
+        ),
+        engine=engine,
+    )
+
+
+def publish_sources(sources: Iterable[str], engine: str, vector_db_path: str) -> int:
+    """
+    Replace the chunks of the sources in the vector database with their embedded jobs.
+    Sources with jobs still pending or running are left for the worker to publish
+    once they are done, and sources without embedded jobs are deleted.
+
+    :param sources: The sources to publish.
+    :param engine: The embedding engine of the jobs.
+    :param vector_db_path: The vector database directory.
+    :return: The number of sources published.
+    """
+    sources = set(sources)
+    settled = sources - EmbeddingJob.objects.busy_sources(engine, sources)
+    if not settled:
+        return 0
+
+    writer = VectorDBWriter(vector_db_path)
+    collection = EmbeddingJob.objects.done_collection(engine, sources=settled)
+    if len(collection):
+        writer.append(collection, replace_sources=True)
+    removed = settled.difference(collection.urls)
+    if removed:
+        writer.delete(sorted(removed))
+    return len(settled)
+
+
+class EmbeddingWorker:
+    """
+    Embeds queued chunks in batches claimed from the EmbeddingJob table.
+
+    Each batch is sent through the embeddings object, so the request concurrency
+    and rate limits are those of an AsyncDataFrameEmbeddings, and cached embeddings
+    are not requested again. Failed jobs are retried up to `max_attempts` claims.
+    With a vector database path, the sources of a batch are published to it
+    as soon as all of their jobs are settled.
+    """
+
+    BATCH_SIZE = 256
+    LOCK_TIMEOUT = 600
+    MAX_ATTEMPTS = 5
+    POLL_INTERVAL = 5.0
+
+    def __init__(
+        self,
+        embeddings_object: DataFrameEmbeddings,
+        batch_size: int = BATCH_SIZE,
+        lock_timeout: float = LOCK_TIMEOUT,
+        max_attempts: int = MAX_ATTEMPTS,
+        worker_id: str = None,
+        vector_db_path: str = None,
+    ):
+        """
+        Initialize the worker.
+
+        :param embeddings_object: Creates the embeddings of a batch of chunks.
+        :param batch_size: The maximum number of jobs claimed at once.
+        :param lock_timeout: The number of seconds after which a claimed job is reclaimed.
+        :param max_attempts: The number of claims after which a failing job is given up.
+        :param worker_id: The identifier recorded on claimed jobs, host and PID by default.
+        :param vector_db_path: The vector database directory finished sources are published to,
+            None to leave the embeddings in the job table only.
+        :raises ValueError: If the batch size or the max attempts is not positive.
+        """
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be ≥ 1. Given: {batch_size}.")
+        if max_attempts < 1:
+            raise ValueError(f"Max attempts must be ≥ 1. Given: {max_attempts}.")
+        self.embeddings_object = embeddings_object
+        self.batch_size = batch_size
+        self.lock_timeout = lock_timeout
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.vector_db_path = vector_db_path
+
+    def run_once(self) -> int:
+        """
+        Claim one batch of jobs, embed it, store the results and publish the settled sources.
+        Publish jobs have nothing to embed and are deleted once claimed.
+
+        :return: The number of jobs claimed, 0 when the queue is empty.
+        """
+        jobs = EmbeddingJob.objects.claim(
+            self.batch_size, self.worker_id, self.lock_timeout
+        )
+        if not jobs:
+            return 0
+
+        chunk_jobs = [job for job in jobs if job.text]
+        if chunk_jobs:
+            self._embed(chunk_jobs)
+
+        # Jobs reclaimed or deleted since the claim are left to their newer owner.
+        now = timezone.now()
+        with transaction.atomic(using=EmbeddingJob.objects.db):
+            for job in chunk_jobs:
+                EmbeddingJob.objects.filter(
+                    id=job.id, status=EmbeddingJob.RUNNING, locked_by=self.worker_id
+                ).update(
+                    status=job.status,
+                    embedding=job.embedding,
+                    error=job.error,
+                    locked_by="",
+                    locked_at=None,
+                    modified_at=now,
+                )
+            EmbeddingJob.objects.filter(
+                id__in=[job.id for job in jobs if not job.text],
+                status=EmbeddingJob.RUNNING,
+                locked_by=self.worker_id,
+            ).delete()
+
+        if self.vector_db_path:
+            by_engine = {}
+            for job in jobs:
+                by_engine.setdefault(job.engine, set()).add(job.source)
+            for engine, sources in by_engine.items():
+                publish_sources(sources, engine, self.vector_db_path)
+        return len(jobs)
+
+    def _embed(self, jobs: List[EmbeddingJob]):
+        """
+        Embed the texts of the jobs, setting their embedding, status and error.
+        """
+        df = DataFrame(
+            {
+                "text": [job.text for job in jobs],
+                "n_tokens": [job.n_tokens for job in jobs],
+            }
+        )
+        errors = {}
+        try:
+            embeddings = self.embeddings_object.create_embeddings(df)["embeddings"]
+            for failure in getattr(self.embeddings_object, "failures", []):
+                errors[failure.index] = failure.error
+        except RuntimeError as e:
+            embeddings = [None] * len(jobs)
+            errors = {idx: str(e) for idx in range(len(jobs))}
+
+        for idx, (job, embedding) in enumerate(zip(jobs, embeddings)):
+            if embedding is not None:
+                job.set_embedding(embedding)
+                job.status, job.error = EmbeddingJob.DONE, ""
+            else:
+                job.status = (
+                    EmbeddingJob.FAILED
+                    if job.attempts >= self.max_attempts
+                    else EmbeddingJob.PENDING
+                )
+                job.error = errors.get(idx, "No embedding was returned.")
+
+    def run(
+        self,
+        poll_interval: float = POLL_INTERVAL,
+        max_batches: int = None,
+        stop_when_empty: bool = False,
+    ) -> int:
+        """
+        Process batches until stopped, sleeping `poll_interval` seconds while the queue is empty.
+
+        :param poll_interval: The number of seconds between polls of an empty queue.
+        :param max_batches: The number of batches after which to stop, unlimited when None.
+        :param stop_when_empty: Whether to stop once the queue is empty instead of polling.
+        :return: The number of jobs processed.
+        """
+        processed = batches = 0
+        while max_batches is None or batches < max_batches:
+            claimed = self.run_once()
+            if claimed:
+                processed += claimed
+                batches += 1
+            elif stop_when_empty:
+                break
+            else:
+                time.sleep(poll_interval)
+        return processed